@@ -0,0 +1,56 @@
+# answer_tallies.py - Cached per-question answer counts for the admin dashboard
+#
+# The GROUP BY over every response is too heavy to run per request, so the
+# encoded result is cached: per process with a single worker, in a shared
+# snapshot refreshed by cache_refresher.py with several.
+import os
+import threading
+import time
+import logging
+from typing import Dict, Tuple
+
+from sqlalchemy.orm import Session
+
+import crud
+import shared_cache
+from responses import dumps
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Tallies may lag new submissions by up to this long
+TALLY_TTL_SECONDS = float(os.getenv("TALLY_CACHE_TTL", "30"))
+
+_lock = threading.Lock()
+_state = {"body": None, "loaded_at": 0.0}
+
+shared = shared_cache.SharedSnapshot("tallies")
+
+
+def _encode(db: Session) -> Dict[str, bytes]:
+    started = time.perf_counter()
+    body = dumps(crud.get_answer_tallies(db))
+    logger.info(f"Computed answer tallies in {(time.perf_counter() - started) * 1000:.0f}ms")
+    return {"identity": body}
+
+
+def publish(db: Session):
+    """Recompute the shared snapshot (run by cache_refresher)"""
+    return shared.refresh(lambda: _encode(db))
+
+
+def get_tallies_body(db: Session) -> Tuple[bytes, float]:
+    """(encoded tallies, age in seconds)"""
+    if shared_cache.SHARED_CACHE_ENABLED:
+        snapshot = shared.read()
+        if snapshot is None or snapshot.age() >= TALLY_TTL_SECONDS:
+            snapshot = shared.refresh(lambda: _encode(db), max_age=TALLY_TTL_SECONDS)
+        return snapshot.part("identity"), snapshot.age()
+
+    with _lock:
+        age = time.monotonic() - _state["loaded_at"]
+        if _state["body"] is None or age >= TALLY_TTL_SECONDS:
+            _state["body"] = _encode(db)["identity"]
+            _state["loaded_at"] = time.monotonic()
+            age = 0.0
+        return _state["body"], age
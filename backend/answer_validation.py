@@ -0,0 +1,139 @@
+# answer_validation.py - Submission checks compiled once per questionnaire snapshot
+#
+# The questionnaire is turned into a dict of small per-question rules (allowed
+# option values and labels as frozensets, required flag, selection bounds), so
+# a submission is checked in one pass over its answers before any database work.
+# The client sends option labels, older clients sent values; both are accepted.
+# Questions without stored options have them piped in on the client (P7, P9d,
+# P11, ...), so only the shape of their answers is checked. Required questions
+# aren't enforced: the client sends '' or [] for every question skip logic
+# left out, so an empty answer is indistinguishable from a skipped one.
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, NamedTuple, Optional
+
+from crud import decode_if_needed
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+MAX_REPORTED_ERRORS = 20
+# Snapshots never change, so rules are kept until pushed out by newer ones
+RULES_CACHE_SIZE = 8
+
+
+class Rule(NamedTuple):
+    question_type: str
+    allowed: Optional[frozenset]  # option values and labels; None when options are piped in
+    required: bool
+    min_selections: int
+    max_selections: int  # 0 means no limit
+
+
+_lock = threading.Lock()
+_compiled: "OrderedDict[str, Dict[str, Rule]]" = OrderedDict()  # snapshot id -> rules
+
+
+def compile_rules(questions: List[Dict[str, Any]]) -> Dict[str, Rule]:
+    rules = {}
+    for question in questions:
+        options = question.get("options") or []
+        allowed = None
+        if options:
+            allowed = frozenset(str(option[key]) for option in options for key in ("value", "label"))
+        rules[question["id"]] = Rule(
+            question_type=question["questionType"],
+            allowed=allowed,
+            required=question.get("isRequired") is not False,
+            min_selections=question.get("minSelections") or 0,
+            max_selections=question.get("maxSelections") or 0,
+        )
+    return rules
+
+
+def get_rules(snapshot_id: str, questions: List[Dict[str, Any]]) -> Dict[str, Rule]:
+    """Rules for a questionnaire snapshot, compiled on first use"""
+    rules = _compiled.get(snapshot_id)
+    if rules is not None:
+        return rules
+    with _lock:
+        rules = _compiled.get(snapshot_id)
+        if rules is None:
+            rules = compile_rules(questions)
+            _compiled[snapshot_id] = rules
+            while len(_compiled) > RULES_CACHE_SIZE:
+                _compiled.popitem(last=False)
+            logger.info(f"Compiled answer rules for {len(rules)} questions (snapshot {snapshot_id[:12]})")
+        return rules
+
+
+def _is_empty(answer) -> bool:
+    if isinstance(answer, str):
+        return not answer.strip()
+    return answer is None or answer == []
+
+
+def _is_option(allowed: frozenset, item) -> bool:
+    # Numbers from older clients, and values sent JSON-quoted
+    return item in allowed or str(decode_if_needed(item)) in allowed
+
+
+def check_answer(rule: Rule, answer) -> Optional[str]:
+    """Why answer doesn't fit rule, or None when it does"""
+    if _is_empty(answer):
+        return None
+
+    if rule.question_type == "MA":
+        if not isinstance(answer, list):
+            # Piped questions may send a combined string (P11's "a:1,5|b:3")
+            if rule.allowed is None and isinstance(answer, str):
+                return None
+            return "expected a list of selections"
+        count = len(answer)
+        if rule.max_selections and count > rule.max_selections:
+            return f"at most {rule.max_selections} selections allowed, got {count}"
+        # Same as the client, which only holds required questions to the minimum
+        if rule.required and count < rule.min_selections:
+            return f"at least {rule.min_selections} selections required, got {count}"
+        if rule.allowed is None:
+            if any(isinstance(item, (list, dict)) for item in answer):
+                return "selections must be single values"
+            return None
+        try:
+            # One C-level set check for the usual case, the slow path only on a miss
+            if rule.allowed.issuperset(answer):
+                return None
+        except TypeError:
+            return "selections must be single values"
+        for item in answer:
+            if not _is_option(rule.allowed, item):
+                return f"unknown option {item!r}"
+        return None
+
+    if isinstance(answer, (list, dict, bool)):
+        return "expected a single answer"
+    if rule.question_type == "SA" and rule.allowed is not None and not _is_option(rule.allowed, answer):
+        return f"unknown option {answer!r}"
+    return None
+
+
+def validate_answers(rules: Dict[str, Rule], answers: Dict[str, Any]) -> List[Dict[str, str]]:
+    """Errors for answers, in the shape FastAPI uses for its own 422 details"""
+    errors = []
+    for question_id, answer in answers.items():
+        rule = rules.get(question_id)
+        message = "unknown question" if rule is None else check_answer(rule, answer)
+        if message is not None:
+            errors.append({"loc": ["body", "answers", question_id], "msg": message, "type": "value_error"})
+            if len(errors) >= MAX_REPORTED_ERRORS:
+                break
+    return errors
+
+
+def validate_submission(rules: Dict[str, Rule], submission) -> List[Dict[str, str]]:
+    errors = validate_answers(rules, submission.answers)
+    for question_id in submission.audio:
+        if question_id not in rules:
+            errors.append({"loc": ["body", "audio", question_id], "msg": "unknown question", "type": "value_error"})
+    return errors[:MAX_REPORTED_ERRORS]
@@ -0,0 +1,175 @@
+# audio_processing.py - Vectorised analysis of 16 kHz mono LINEAR16 buffers
+import os
+from typing import List, Tuple
+
+import numpy as np
+
+SAMPLE_RATE = 16000
+FRAME_MS = 30
+# Width of the moving window used to find the quietest point to cut at
+QUIET_WINDOW_MS = 300
+
+
+def pcm_to_float(pcm: bytes) -> np.ndarray:
+    """View s16le bytes as float32 samples in [-1, 1)"""
+    return np.frombuffer(pcm, dtype="<i2").astype(np.float32) / 32768.0
+
+
+def frame_rms(samples: np.ndarray, frame_length: int) -> np.ndarray:
+    """RMS energy per non-overlapping frame (a trailing partial frame is dropped)"""
+    frame_count = len(samples) // frame_length
+    if frame_count == 0:
+        return np.zeros(0, dtype=np.float32)
+    frames = samples[:frame_count * frame_length].reshape(frame_count, frame_length)
+    return np.sqrt(np.mean(np.square(frames), axis=1))
+
+
+def split_at_silence(
+    pcm: bytes,
+    max_segment_seconds: float,
+    min_segment_seconds: float,
+    sample_rate: int = SAMPLE_RATE,
+) -> List[Tuple[int, int]]:
+    """
+    Split a clip into (start_sample, end_sample) ranges no longer than
+    max_segment_seconds. Each cut is placed at the quietest stretch between
+    min_segment_seconds and max_segment_seconds after the previous cut, which
+    in speech is almost always a pause between words.
+    """
+    total = len(pcm) // 2
+    max_samples = int(max_segment_seconds * sample_rate)
+    if total <= max_samples:
+        return [(0, total)]
+
+    frame_length = sample_rate * FRAME_MS // 1000
+    energy = frame_rms(pcm_to_float(pcm), frame_length)
+    window = max(1, QUIET_WINDOW_MS // FRAME_MS)
+    smoothed = np.convolve(energy, np.ones(window, dtype=np.float32) / window, mode="same")
+
+    min_frames = int(min_segment_seconds * 1000 / FRAME_MS)
+    max_frames = int(max_segment_seconds * 1000 / FRAME_MS)
+
+    bounds = []
+    start_frame = 0
+    total_frames = len(energy)
+    while (total - start_frame * frame_length) > max_samples:
+        lo = start_frame + min_frames
+        hi = min(start_frame + max_frames, total_frames)
+        cut = lo + int(np.argmin(smoothed[lo:hi])) if hi > lo else hi
+        bounds.append((start_frame * frame_length, cut * frame_length))
+        start_frame = cut
+    bounds.append((start_frame * frame_length, total))
+    return bounds
+
+
+# Voice-activity trimming and loudness normalisation before recognition
+PREPROCESS_ENABLED = os.getenv("AUDIO_PREPROCESS", "true").lower() in ("1", "true", "yes")
+PREPROCESS_SETTINGS = {
+    "enabled": PREPROCESS_ENABLED,
+    # Frames quieter than this are never speech
+    "vad_floor_dbfs": float(os.getenv("VAD_FLOOR_DBFS", "-50")),
+    # Speech must be this far above the estimated noise floor
+    "vad_margin_db": float(os.getenv("VAD_MARGIN_DB", "10")),
+    # Kept around every speech frame so word onsets and tails survive
+    "vad_padding_ms": int(os.getenv("VAD_PADDING_MS", "200")),
+    # Pauses between speech longer than this are shortened to it
+    "max_pause_ms": int(os.getenv("VAD_MAX_PAUSE_MS", "500")),
+    "target_rms_dbfs": float(os.getenv("TARGET_RMS_DBFS", "-20")),
+    "peak_ceiling_dbfs": float(os.getenv("PEAK_CEILING_DBFS", "-1")),
+    "max_gain_db": float(os.getenv("MAX_GAIN_DB", "20")),
+}
+
+
+def to_dbfs(values: np.ndarray) -> np.ndarray:
+    return 20 * np.log10(np.maximum(values, 1e-10))
+
+
+class PreprocessedAudio:
+    """Result of preprocess(): the PCM to recognise and how it maps back to the upload"""
+
+    def __init__(self, pcm: bytes, original_seconds: float, kept_frames: np.ndarray = None, gain_db: float = 0.0):
+        self.pcm = pcm
+        self.original_seconds = original_seconds
+        self.seconds = len(pcm) / 2 / SAMPLE_RATE
+        self.seconds_removed = max(0.0, original_seconds - self.seconds)
+        self.gain_db = gain_db
+        # Original frame index of every frame kept, None when nothing was cut
+        self._kept_frames = kept_frames
+
+    def to_original(self, seconds: float) -> float:
+        """Map an offset in the processed audio back to the uploaded clip"""
+        if self._kept_frames is None or len(self._kept_frames) == 0:
+            return seconds
+        index = min(int(seconds * 1000 / FRAME_MS), len(self._kept_frames) - 1)
+        remainder = seconds - index * FRAME_MS / 1000
+        return round(self._kept_frames[index] * FRAME_MS / 1000 + remainder, 2)
+
+
+def speech_frames(energy_db: np.ndarray, settings: dict) -> np.ndarray:
+    """Boolean speech mask per frame, padded on both sides of every speech run"""
+    noise_floor = np.percentile(energy_db, 20)
+    loud = np.percentile(energy_db, 95)
+    # Stay below the loud parts even when there's hardly any pause to learn noise from
+    threshold = max(settings["vad_floor_dbfs"], min(noise_floor + settings["vad_margin_db"], loud - 20))
+    speech = energy_db > threshold
+
+    padding = settings["vad_padding_ms"] // FRAME_MS
+    if padding:
+        kernel = np.ones(2 * padding + 1, dtype=np.int32)
+        speech = np.convolve(speech.astype(np.int32), kernel, mode="same") > 0
+    return speech
+
+
+def compact_silence(speech: np.ndarray, max_pause_frames: int) -> np.ndarray:
+    """
+    Frames to keep: every speech frame, no leading or trailing silence, and at
+    most max_pause_frames of each pause (half from each end of it).
+    """
+    keep = speech.copy()
+    edges = np.diff(np.concatenate(([1], speech.astype(np.int8), [1])))
+    starts = np.flatnonzero(edges == -1)
+    ends = np.flatnonzero(edges == 1)
+    head = max_pause_frames // 2
+    for start, end in zip(starts, ends):
+        if start == 0 or end == len(speech):
+            continue
+        keep[start:min(end, start + head)] = True
+        keep[max(start, end - (max_pause_frames - head)):end] = True
+    return keep
+
+
+def preprocess(pcm: bytes, settings: dict = None) -> PreprocessedAudio:
+    """
+    Trim leading/trailing silence, shorten long pauses and normalise loudness
+    of 16 kHz mono LINEAR16 audio. Clips with no detectable speech are
+    returned untouched so the recogniser still gets to decide.
+    """
+    settings = settings or PREPROCESS_SETTINGS
+    samples = pcm_to_float(pcm)
+    original_seconds = len(samples) / SAMPLE_RATE
+    frame_length = SAMPLE_RATE * FRAME_MS // 1000
+    energy = frame_rms(samples, frame_length)
+    if not settings["enabled"] or len(energy) == 0:
+        return PreprocessedAudio(pcm, original_seconds)
+
+    speech = speech_frames(to_dbfs(energy), settings)
+    if not speech.any():
+        return PreprocessedAudio(pcm, original_seconds)
+
+    keep = compact_silence(speech, settings["max_pause_ms"] // FRAME_MS)
+    sample_mask = np.repeat(keep, frame_length)
+    # Samples after the last whole frame follow that frame
+    sample_mask = np.concatenate((sample_mask, np.full(len(samples) - len(sample_mask), keep[-1])))
+    kept = samples[sample_mask]
+
+    # Normalise speech RMS to the target without pushing peaks past the ceiling
+    speech_rms = float(np.sqrt(np.mean(np.square(energy[speech]))))
+    peak = float(np.max(np.abs(kept))) if len(kept) else 0.0
+    gain_db = settings["target_rms_dbfs"] - float(to_dbfs(np.array([speech_rms]))[0])
+    if peak > 0:
+        gain_db = min(gain_db, settings["peak_ceiling_dbfs"] - float(to_dbfs(np.array([peak]))[0]))
+    gain_db = min(gain_db, settings["max_gain_db"])
+    kept = np.clip(kept * (10 ** (gain_db / 20)), -1.0, 32767 / 32768)
+
+    processed = (kept * 32768).astype("<i2").tobytes()
+    return PreprocessedAudio(processed, original_seconds, np.flatnonzero(keep), round(gain_db, 2))
@@ -0,0 +1,395 @@
+# audio_storage.py - Pluggable, content-addressed storage for voice recordings
+import abc
+import asyncio
+import datetime
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional
+from urllib.parse import unquote, urlparse
+
+from fastapi import UploadFile
+
+import metrics
+
+# Set up logging
+logger = logging.getLogger("audio_storage")
+
+# "firebase" (default), "local" for offline development or "memory" for benchmarks
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "firebase").lower()
+LOCAL_STORAGE_DIR = os.getenv("LOCAL_STORAGE_DIR", "./local_storage")
+
+# Chunk size for hashing and streaming uploads, must be a multiple of 256 KiB
+UPLOAD_CHUNK_SIZE = int(os.getenv("AUDIO_UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+# Hard cap on a single recording, enforced while streaming
+MAX_AUDIO_UPLOAD_BYTES = int(os.getenv("MAX_AUDIO_UPLOAD_BYTES", str(25 * 1024 * 1024)))
+# Blocking storage calls run on this bounded pool, never on the event loop
+STORAGE_WORKERS = int(os.getenv("STORAGE_UPLOAD_WORKERS", "4"))
+# Seconds between background storage health checks
+HEALTH_CHECK_INTERVAL = float(os.getenv("STORAGE_HEALTH_CHECK_INTERVAL", "60"))
+# How long a failed backend resolution is reported before the next attempt
+STORAGE_RETRY_SECONDS = float(os.getenv("STORAGE_RETRY_SECONDS", "30"))
+
+RECORDINGS_PREFIX = "recordings/"
+SIGNED_URL_EXPIRATION = datetime.timedelta(days=7)
+
+CONTENT_TYPE_EXTENSIONS = {
+    "audio/wav": ".wav",
+    "audio/x-wav": ".wav",
+    "audio/wave": ".wav",
+    "audio/webm": ".webm",
+    "audio/ogg": ".ogg",
+    "audio/mpeg": ".mp3",
+    "audio/mp4": ".m4a",
+}
+
+_storage_executor = ThreadPoolExecutor(max_workers=STORAGE_WORKERS, thread_name_prefix="storage")
+
+
+class AudioTooLargeError(ValueError):
+    """Raised when an upload exceeds MAX_AUDIO_UPLOAD_BYTES"""
+
+
+class _CappedReader:
+    """File wrapper that counts bytes as they are read and enforces the cap"""
+
+    def __init__(self, file_obj, limit: int):
+        self._file = file_obj
+        self._limit = limit
+        self.bytes_read = 0
+
+    def read(self, size: int = -1):
+        data = self._file.read(size)
+        # Track the furthest position so retried chunks aren't counted twice
+        self.bytes_read = max(self.bytes_read, self._file.tell())
+        if self.bytes_read > self._limit:
+            raise AudioTooLargeError(f"Audio upload exceeds {self._limit} bytes")
+        return data
+
+    def tell(self):
+        return self._file.tell()
+
+    def seek(self, offset, whence=0):
+        return self._file.seek(offset, whence)
+
+
+def hash_stream(file_obj, limit: int = MAX_AUDIO_UPLOAD_BYTES):
+    """SHA-256 and size of a seekable stream, read chunk by chunk under the size cap"""
+    digest = hashlib.sha256()
+    size = 0
+    file_obj.seek(0)
+    while True:
+        chunk = file_obj.read(UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            break
+        size += len(chunk)
+        if size > limit:
+            raise AudioTooLargeError(f"Audio upload exceeds {limit} bytes")
+        digest.update(chunk)
+    file_obj.seek(0)
+    return digest.hexdigest(), size
+
+
+def content_key(sha256: str, content_type: Optional[str]) -> str:
+    extension = CONTENT_TYPE_EXTENSIONS.get((content_type or "").split(";")[0].strip(), ".wav")
+    return f"{RECORDINGS_PREFIX}{sha256}{extension}"
+
+
+def key_from_url(url: Optional[str]) -> Optional[str]:
+    """Storage key inside a signed or local playback URL, None for blob: or foreign URLs"""
+    if not url:
+        return None
+    path = unquote(urlparse(url).path)
+    index = path.find(RECORDINGS_PREFIX)
+    return path[index:] if index != -1 else None
+
+
+class StorageBackend(abc.ABC):
+    """
+    Interface for recording storage. Implementations provide the blocking
+    primitives; the async upload flow and content addressing live here.
+    """
+
+    name = "base"
+
+    def __init__(self):
+        self.health = {"healthy": None, "checked_at": None, "error": None}
+
+    @abc.abstractmethod
+    def exists(self, key: str) -> bool:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def put_file(self, file_obj, key: str, content_type: Optional[str], metadata: Optional[Dict] = None):
+        """Stream file_obj (positioned at 0) to key"""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get_bytes(self, key: str) -> bytes:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def list_keys(self, prefix: str = RECORDINGS_PREFIX) -> Iterator[str]:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def sign_url(self, key: str, expiration: datetime.timedelta = SIGNED_URL_EXPIRATION) -> str:
+        raise NotImplementedError
+
+    def sign_urls(self, keys: List[str], expiration: datetime.timedelta = SIGNED_URL_EXPIRATION) -> Dict[str, str]:
+        """Sign many keys at once; backends override this when they can batch"""
+        return {key: self.sign_url(key, expiration) for key in keys}
+
+    @abc.abstractmethod
+    def probe(self) -> bool:
+        """Cheap reachability check used by check_health"""
+        raise NotImplementedError
+
+    def check_health(self):
+        """Blocking probe of the backend, result cached on self.health"""
+        started = time.perf_counter()
+        try:
+            healthy = self.probe()
+            error = None if healthy else f"{self.name} storage is not reachable"
+        except Exception as e:
+            healthy = False
+            error = str(e)
+        metrics.observe("storage.health_check.seconds", time.perf_counter() - started)
+        metrics.set_gauge("storage.healthy", 1 if healthy else 0)
+        self.health = {
+            "backend": self.name,
+            "healthy": healthy,
+            "checked_at": datetime.datetime.utcnow().isoformat(),
+            "error": error,
+        }
+        return self.health
+
+    def store_file(self, file_obj, content_type: Optional[str], metadata: Optional[Dict] = None) -> Dict:
+        """
+        Blocking upload flow: hash the spooled file, skip the transfer if that
+        content is already stored, otherwise stream it under its hash key
+        """
+        sha256, size = hash_stream(file_obj)
+        key = content_key(sha256, content_type)
+
+        if self.exists(key):
+            metrics.increment("storage.upload.deduplicated")
+            logger.info(f"Recording {key} already stored, skipping transfer")
+            deduplicated = True
+        else:
+            reader = _CappedReader(file_obj, MAX_AUDIO_UPLOAD_BYTES)
+            started = time.perf_counter()
+            self.put_file(reader, key, content_type, metadata)
+            elapsed = time.perf_counter() - started
+
+            metrics.increment("storage.upload.count")
+            metrics.increment("storage.upload.bytes", size)
+            metrics.observe("storage.upload.seconds", elapsed)
+            if elapsed > 0:
+                metrics.observe("storage.upload.throughput_mib_s", size / elapsed / (1024 * 1024))
+            logger.info(f"Uploaded {size} bytes to {key} in {elapsed:.2f}s")
+            deduplicated = False
+
+        with metrics.timed("storage.sign_url.seconds"):
+            url = self.sign_url(key)
+
+        return {"key": key, "url": url, "sha256": sha256, "size": size, "deduplicated": deduplicated}
+
+    async def upload_audio(self, file_obj: UploadFile, user_id: str = "anonymous", question_id: str = "unknown"):
+        """
+        Upload a recording and return its storage details
+
+        Returns:
+            dict: key, url, sha256, size and deduplicated, or None if upload failed
+
+        Raises:
+            AudioTooLargeError: if the file is bigger than MAX_AUDIO_UPLOAD_BYTES
+        """
+        # Reject early when the client told us the size
+        if file_obj.size is not None and file_obj.size > MAX_AUDIO_UPLOAD_BYTES:
+            metrics.increment("storage.upload.rejected_too_large")
+            raise AudioTooLargeError(f"Audio upload exceeds {MAX_AUDIO_UPLOAD_BYTES} bytes")
+
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                _storage_executor,
+                self.store_file,
+                file_obj.file,
+                file_obj.content_type,
+                {"user_id": user_id, "question_id": question_id},
+            )
+        except AudioTooLargeError:
+            metrics.increment("storage.upload.rejected_too_large")
+            raise
+        except Exception as e:
+            import traceback
+            metrics.increment("storage.upload.errors")
+            logger.error(f"Error uploading audio to {self.name} storage: {e}")
+            logger.error(traceback.format_exc())
+            return None
+
+
+class LocalStorageBackend(StorageBackend):
+    """Filesystem stand-in for offline development and load testing"""
+
+    name = "local"
+
+    def __init__(self, root: str = LOCAL_STORAGE_DIR):
+        super().__init__()
+        self.root = os.path.abspath(root)
+        os.makedirs(self.root, exist_ok=True)
+        logger.info(f"Using local audio storage at {self.root}")
+
+    def path_for(self, key: str) -> str:
+        path = os.path.abspath(os.path.join(self.root, key))
+        if not path.startswith(self.root + os.sep):
+            raise ValueError(f"Invalid storage key: {key}")
+        return path
+
+    def exists(self, key: str) -> bool:
+        return os.path.isfile(self.path_for(key))
+
+    def put_file(self, file_obj, key: str, content_type: Optional[str], metadata: Optional[Dict] = None):
+        path = self.path_for(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temp file and rename so readers never see partial objects
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as out:
+                shutil.copyfileobj(file_obj, out, UPLOAD_CHUNK_SIZE)
+            os.replace(temp_path, path)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+
+    def get_bytes(self, key: str) -> bytes:
+        with open(self.path_for(key), "rb") as f:
+            return f.read()
+
+    def list_keys(self, prefix: str = RECORDINGS_PREFIX) -> Iterator[str]:
+        base = self.path_for(prefix.rstrip("/")) if prefix.strip("/") else self.root
+        if not os.path.isdir(base):
+            return
+        for dirpath, _, filenames in os.walk(base):
+            for filename in sorted(filenames):
+                if filename.endswith(".part"):
+                    continue
+                yield os.path.relpath(os.path.join(dirpath, filename), self.root).replace(os.sep, "/")
+
+    def sign_url(self, key: str, expiration: datetime.timedelta = SIGNED_URL_EXPIRATION) -> str:
+        return f"/api/storage/local/{key}"
+
+    def probe(self) -> bool:
+        return os.path.isdir(self.root) and os.access(self.root, os.W_OK)
+
+
+# Process-wide backend, resolved once and shared by every request
+_backend: Optional[StorageBackend] = None
+_backend_error: Optional[str] = None
+_backend_failed_at = 0.0
+_backend_lock = threading.Lock()
+
+
+def _create_backend() -> StorageBackend:
+    if STORAGE_BACKEND == "local":
+        return LocalStorageBackend()
+    if STORAGE_BACKEND == "memory":
+        from fake_services import MemoryStorageBackend
+        return MemoryStorageBackend()
+    if STORAGE_BACKEND == "firebase":
+        # Imported lazily so local mode works without firebase_admin installed
+        from firebase_audio import create_firebase_backend
+        return create_firebase_backend()
+    raise RuntimeError(f"Unknown STORAGE_BACKEND '{STORAGE_BACKEND}', expected firebase, local or memory")
+
+
+def get_storage_backend() -> StorageBackend:
+    """
+    Return the shared storage backend, creating it on first use.
+
+    A failed resolution is remembered for STORAGE_RETRY_SECONDS, so requests
+    fail fast instead of retrying configuration on every upload, then the next
+    call (or the health monitor) tries again.
+    """
+    global _backend, _backend_error, _backend_failed_at
+    if _backend is not None:
+        return _backend
+
+    with _backend_lock:
+        if _backend is not None:
+            return _backend
+        if _backend_error is not None and time.monotonic() - _backend_failed_at < STORAGE_RETRY_SECONDS:
+            raise RuntimeError(_backend_error)
+        try:
+            _backend = _create_backend()
+            _backend_error = None
+            metrics.increment("storage.service.created")
+            return _backend
+        except Exception as e:
+            _backend_error = str(e)
+            _backend_failed_at = time.monotonic()
+            metrics.increment("storage.service.errors")
+            logger.error(f"Storage backend unavailable: {_backend_error}")
+            raise RuntimeError(_backend_error)
+
+
+def set_storage_backend(backend: Optional[StorageBackend]):
+    """Install a specific backend instance (benchmarks, tools)"""
+    global _backend, _backend_error
+    with _backend_lock:
+        _backend = backend
+        _backend_error = None
+
+
+def reset_storage_backend():
+    """Forget the cached backend (or cached failure) so the next call resolves again"""
+    set_storage_backend(None)
+
+
+def get_storage_health():
+    """Cached health of the storage backend, never blocks on the network"""
+    if _backend is not None:
+        return _backend.health
+    return {
+        "backend": STORAGE_BACKEND,
+        "healthy": False,
+        "checked_at": None,
+        "error": _backend_error or "Storage backend not initialised",
+    }
+
+
+async def initialize_storage():
+    """Resolve the backend off the event loop at startup and take a first health reading"""
+    loop = asyncio.get_running_loop()
+    try:
+        backend = await loop.run_in_executor(_storage_executor, get_storage_backend)
+        await loop.run_in_executor(_storage_executor, backend.check_health)
+        logger.info(f"Storage ready: {backend.health}")
+    except Exception as e:
+        logger.warning(f"Storage unavailable at startup: {e}")
+
+
+async def run_health_monitor(interval: float = HEALTH_CHECK_INTERVAL):
+    """
+    Refresh the cached health state in the background for the life of the app.
+    While the backend couldn't be resolved, each round tries again, so a
+    transient failure at startup doesn't disable uploads until a restart.
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            backend = _backend
+            if backend is None:
+                backend = await loop.run_in_executor(_storage_executor, get_storage_backend)
+                logger.info(f"Storage backend {backend.name} resolved after an earlier failure")
+            await loop.run_in_executor(_storage_executor, backend.check_health)
+        except Exception as e:
+            logger.error(f"Storage health check failed: {e}")
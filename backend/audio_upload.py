@@ -0,0 +1,58 @@
+# audio_upload.py - Voice recording upload route
+#
+# Kept apart from main so the pipeline benchmark can serve the real handler
+# without importing the database layer.
+import logging
+
+from fastapi import APIRouter, File, Form, UploadFile
+from fastapi.responses import JSONResponse
+
+from audio_storage import AudioTooLargeError, get_storage_backend
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+router = APIRouter(tags=["audio"])
+
+
+@router.post("/api/upload-audio")
+async def upload_audio(
+    file: UploadFile = File(...),
+    question_id: str = Form(...),
+    user_id: str = Form("anonymous"),
+):
+    """Upload audio file to the configured storage backend and return the URL"""
+
+    try:
+        # Shared backend, resolved once per process
+        try:
+            storage_backend = get_storage_backend()
+        except Exception as storage_init_error:
+            error_details = str(storage_init_error)
+            logger.error(f"Storage initialization error: {error_details}")
+            return {"success": False, "error": f"Storage initialization error: {error_details}"}
+        
+        # Upload with detailed error handling
+        try:
+            stored = await storage_backend.upload_audio(file, user_id, question_id)
+            if stored:
+                logger.info(
+                    f"Audio upload for {question_id} from {user_id}: {stored['key']}",
+                    extra={"content_type": file.content_type, "size": file.size, "deduplicated": stored["deduplicated"]},
+                )
+                return {"success": True, **stored}
+            else:
+                logger.error(f"Audio upload for {question_id} from {user_id} failed - no URL returned")
+                return {"success": False, "error": "Upload failed - no URL returned"}
+        except AudioTooLargeError as too_large:
+            logger.warning(f"Rejected audio upload for {question_id} from {user_id}: {too_large}")
+            return JSONResponse(status_code=413, content={"success": False, "error": str(too_large)})
+        except Exception as upload_error:
+            error_details = str(upload_error)
+            logger.error(f"Storage upload error: {error_details}")
+            return {"success": False, "error": f"Storage upload error: {error_details}"}
+            
+    except Exception as e:
+        error_details = str(e)
+        logger.exception(f"Unexpected error in upload endpoint: {error_details}")
+        return {"success": False, "error": f"Server error: {error_details}"}
@@ -190,4 +190,29 @@ def get_customer_survey_data(db: Session, customer_id: str):
             "amount": float(latest_purchase.amount),
             "store_location": latest_purchase.store_location
         } if latest_purchase else None
-    }
\ No newline at end of file
+    }
+
+def get_auth_credential(db: Session, username: str):
+    return db.query(AuthCredential).filter(AuthCredential.username == username).first()
+
+def build_customer_survey_data(customer, auth_cred=None, latest_purchase=None):
+    """Shape already-loaded rows like get_customer_survey_data, without querying"""
+    return {
+        "customer_id": customer.customer_id,
+        "first_name": customer.first_name,
+        "last_name": customer.last_name,
+        "income_range": customer.income_range,
+        "marital_status": customer.marital_status,
+        "has_children": customer.has_children,
+        "province": customer.province,
+        "role": auth_cred.role if auth_cred else "user",
+        "latest_purchase": {
+            "purchase_id": latest_purchase.purchase_id,
+            "brand": latest_purchase.brand,
+            "product_type": latest_purchase.product_type,
+            "product_name": latest_purchase.product_name,
+            "purchase_date": latest_purchase.purchase_date,
+            "amount": float(latest_purchase.amount),
+            "store_location": latest_purchase.store_location
+        } if latest_purchase else None
+    }
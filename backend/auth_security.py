@@ -95,7 +95,9 @@ def get_current_active_user(current_user = Depends(get_current_user)):
 def require_role(required_role: str):
     """Dependency to check for specific role"""
     def role_checker(current_user = Depends(get_current_active_user)):
-        if current_user.role != required_role:
+        # The role lives on the customer's credentials, not the customer row
+        credentials = current_user.auth_credentials
+        if credentials is None or credentials.role != required_role:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail=f"Insufficient permissions. {required_role} role required."
@@ -0,0 +1,124 @@
+# bench_audio_conversion.py - Per-clip latency and peak RSS of audio conversion
+#
+# Compares the old temp-file ffmpeg pipeline with the in-memory pipe/passthrough
+# pipeline in audio_conversion. Each mode runs in its own subprocess so peak RSS
+# figures are not polluted by the other mode.
+#
+#   cd backend && python -m benchmarks.bench_audio_conversion [--corpus DIR] [--seconds 30]
+import argparse
+import array
+import json
+import math
+import os
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from audio_conversion import to_linear16, wav_bytes
+
+MODES = ["tempfile", "pipe"]
+
+
+def synthetic_clip(seconds: float, sample_rate: int, channels: int) -> bytes:
+    """Speech-band tone with noise, as a 16-bit PCM WAV"""
+    samples = array.array("h")
+    for i in range(int(seconds * sample_rate)):
+        value = 8000 * math.sin(2 * math.pi * 220 * i / sample_rate) + random.randint(-600, 600)
+        samples.extend([int(value)] * channels)
+    return wav_bytes(samples.tobytes(), sample_rate=sample_rate, channels=channels)
+
+
+def load_corpus(corpus_dir, seconds):
+    if corpus_dir:
+        clips = {}
+        for name in sorted(os.listdir(corpus_dir)):
+            with open(os.path.join(corpus_dir, name), "rb") as f:
+                clips[name] = f.read()
+        return clips
+    return {
+        f"wav_16k_mono_{seconds}s": synthetic_clip(seconds, 16000, 1),
+        f"wav_44k_stereo_{seconds}s": synthetic_clip(seconds, 44100, 2),
+    }
+
+
+def legacy_tempfile_convert(content: bytes) -> bytes:
+    """The previous pipeline: upload -> temp file -> ffmpeg -> temp WAV -> read back"""
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as temp_file:
+        original_path = temp_file.name
+        temp_file.write(content)
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as converted_file:
+        converted_path = converted_file.name
+    try:
+        subprocess.run(
+            ["ffmpeg", "-i", original_path, "-ar", "16000", "-ac", "1", "-acodec", "pcm_s16le",
+             "-af", "volume=2.0", "-f", "wav", "-y", converted_path],
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True, timeout=30,
+        )
+        with open(converted_path, "rb") as f:
+            return f.read()
+    finally:
+        os.unlink(original_path)
+        os.unlink(converted_path)
+
+
+def run_worker(mode: str, corpus_dir, seconds: float, iterations: int):
+    convert = legacy_tempfile_convert if mode == "tempfile" else to_linear16
+    clips = load_corpus(corpus_dir, seconds)
+    results = {}
+    for name, content in clips.items():
+        timings = []
+        try:
+            for _ in range(iterations):
+                started = time.perf_counter()
+                convert(content)
+                timings.append(time.perf_counter() - started)
+        except Exception as e:
+            results[name] = {"bytes": len(content), "error": str(e)}
+            continue
+        results[name] = {
+            "bytes": len(content),
+            "median_ms": round(statistics.median(timings) * 1000, 2),
+            "min_ms": round(min(timings) * 1000, 2),
+        }
+    # ru_maxrss is in KiB on Linux
+    results["_peak_rss_kib"] = {
+        "self": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "children": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    }
+    print(json.dumps(results))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark temp-file vs in-memory audio conversion")
+    parser.add_argument("--corpus", help="Directory of audio clips, synthetic WAVs if omitted")
+    parser.add_argument("--seconds", type=float, default=30, help="Length of synthetic clips")
+    parser.add_argument("--iterations", type=int, default=5)
+    parser.add_argument("--worker", choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        run_worker(args.worker, args.corpus, args.seconds, args.iterations)
+        return 0
+
+    report = {}
+    for mode in MODES:
+        command = [sys.executable, "-m", "benchmarks.bench_audio_conversion", "--worker", mode,
+                   "--seconds", str(args.seconds), "--iterations", str(args.iterations)]
+        if args.corpus:
+            command += ["--corpus", args.corpus]
+        process = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        if process.returncode != 0:
+            report[mode] = {"error": process.stderr.strip().splitlines()[-1] if process.stderr else "failed"}
+        else:
+            report[mode] = json.loads(process.stdout.strip().splitlines()[-1])
+
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,140 @@
+# bench_audio_pipeline.py - End-to-end upload + transcribe throughput and stage latencies
+#
+# Drives concurrent clients through the real /api/upload-audio storage flow and
+# the /api/transcribe route, queue, conversion, preprocessing and recognition
+# code, in process over ASGI. Google Speech and the bucket are replaced by the
+# fakes in fake_services unless --live is given, so the numbers measure our own
+# pipeline plus the injected service latency.
+#
+#   cd backend && python -m benchmarks.bench_audio_pipeline --clips 200 --concurrency 16
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+STAGES = [
+    "storage.upload.seconds",
+    "transcription.stage.queue_wait.seconds",
+    "transcription.stage.convert.seconds",
+    "transcription.stage.preprocess.seconds",
+    "transcription.stage.recognize.seconds",
+    "transcription.job.seconds",
+]
+
+
+def configure_fakes(args):
+    """Must run before the services are imported, they read their settings at import"""
+    if args.live:
+        return
+    os.environ["SPEECH_BACKEND"] = "fake"
+    os.environ["STORAGE_BACKEND"] = "memory"
+    os.environ["FAKE_SPEECH_LATENCY"] = str(args.speech_latency)
+    os.environ["FAKE_SPEECH_ERROR_RATE"] = str(args.speech_error_rate)
+    os.environ["FAKE_STORAGE_LATENCY"] = str(args.storage_latency)
+
+
+def build_app():
+    """The app's upload and transcription routes, without main's database import"""
+    from fastapi import FastAPI
+
+    from audio_upload import router as audio_upload_router
+    from google_speech_service_improved import setup_improved_speech_routes
+
+    app = FastAPI()
+    setup_improved_speech_routes(app)
+    app.include_router(audio_upload_router)
+    return app
+
+
+def make_clip(index: int, min_seconds: float, max_seconds: float) -> bytes:
+    """Unique synthetic answer so neither storage dedup nor the transcript cache kicks in"""
+    from audio_conversion import wav_bytes
+    from benchmarks.bench_long_recognition import synthetic_speech
+
+    rng = np.random.default_rng(index)
+    return wav_bytes(synthetic_speech(rng.uniform(min_seconds, max_seconds), seed=index))
+
+
+async def run_traffic(args):
+    import httpx
+
+    import metrics
+    from google_speech_service_improved import transcription_queue
+
+    metrics.reset()
+    clips = [make_clip(i, args.min_seconds, args.max_seconds) for i in range(args.clips)]
+    app = build_app()
+    await transcription_queue.start()
+
+    latencies = {"upload": [], "transcribe": [], "end_to_end": []}
+    statuses = {}
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def one_clip(client, index, clip):
+        async with semaphore:
+            started = time.perf_counter()
+            upload = await client.post(
+                "/api/upload-audio",
+                files={"file": (f"clip_{index}.wav", clip, "audio/wav")},
+                data={"question_id": "OE1", "user_id": f"bench_{index}"},
+            )
+            uploaded = time.perf_counter()
+            transcription = await client.post(
+                "/api/transcribe",
+                files={"file": (f"clip_{index}.wav", clip, "audio/wav")},
+                params={"language": "th-TH"},
+            )
+            finished = time.perf_counter()
+
+        latencies["upload"].append(uploaded - started)
+        latencies["transcribe"].append(finished - uploaded)
+        latencies["end_to_end"].append(finished - started)
+        status = transcription.json().get("status", str(transcription.status_code)) \
+            if transcription.status_code == 200 else str(transcription.status_code)
+        if not upload.json().get("success"):
+            status = f"upload_failed/{status}"
+        statuses[status] = statuses.get(status, 0) + 1
+
+    transport = httpx.ASGITransport(app=app)
+    started = time.perf_counter()
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=300) as client:
+        await asyncio.gather(*(one_clip(client, i, clip) for i, clip in enumerate(clips)))
+    elapsed = time.perf_counter() - started
+    await transcription_queue.stop()
+
+    timings = metrics.snapshot()["timings"]
+    ms = lambda summary: {k: round(v * 1000, 1) for k, v in summary.items() if k in ("p50", "p95", "p99", "max")}
+    return {
+        "clips": args.clips,
+        "concurrency": args.concurrency,
+        "elapsed_seconds": round(elapsed, 2),
+        "clips_per_second": round(args.clips / elapsed, 2),
+        "statuses": statuses,
+        "request_ms": {name: ms(metrics.summarize(values)) for name, values in latencies.items()},
+        "stage_ms": {name: ms(timings[name]) for name in STAGES if name in timings},
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the upload + transcription pipeline end to end")
+    parser.add_argument("--clips", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=16, help="Simultaneous clients")
+    parser.add_argument("--min-seconds", type=float, default=3)
+    parser.add_argument("--max-seconds", type=float, default=20)
+    parser.add_argument("--speech-latency", type=float, default=0.3, help="Fake Speech base latency")
+    parser.add_argument("--speech-error-rate", type=float, default=0.0, help="Fraction of fake Speech calls that fail")
+    parser.add_argument("--storage-latency", type=float, default=0.02, help="Fake bucket round-trip latency")
+    parser.add_argument("--live", action="store_true", help="Use the configured Google Speech and storage")
+    args = parser.parse_args(argv)
+
+    configure_fakes(args)
+    print(json.dumps(asyncio.run(run_traffic(args)), indent=2, ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
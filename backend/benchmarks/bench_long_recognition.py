@@ -0,0 +1,86 @@
+# bench_long_recognition.py - Wall-clock recognition time against clip length
+#
+# Compares recognising the silence-split segments of a clip one after another
+# with the concurrent fan-out in recognition.recognize_pcm. Without --live the
+# Speech API is simulated by a sleep proportional to segment length, which is
+# how the real service behaves closely enough to show the scaling.
+#
+#   cd backend && python -m benchmarks.bench_long_recognition [--lengths 30 60 120 300] [--live]
+import argparse
+import json
+import sys
+import time
+
+import numpy as np
+
+import recognition
+from audio_processing import SAMPLE_RATE, split_at_silence
+
+
+def synthetic_speech(seconds: float, seed: int = 0) -> bytes:
+    """Bursts of tone separated by short pauses, as raw s16le samples"""
+    rng = np.random.default_rng(seed)
+    chunks = []
+    total = 0
+    while total < seconds * SAMPLE_RATE:
+        burst = int(rng.uniform(1.0, 4.0) * SAMPLE_RATE)
+        pause = int(rng.uniform(0.2, 0.8) * SAMPLE_RATE)
+        t = np.arange(burst) / SAMPLE_RATE
+        chunks.append(0.3 * np.sin(2 * np.pi * rng.uniform(150, 300) * t))
+        chunks.append(rng.normal(0, 0.005, pause))
+        total += burst + pause
+    samples = np.concatenate(chunks)[:int(seconds * SAMPLE_RATE)]
+    return (samples * 32767).astype("<i2").tobytes()
+
+
+def simulated_recognizer(base_latency: float, realtime_factor: float):
+    def recognize(pcm: bytes, language: str, request_id: str):
+        time.sleep(base_latency + len(pcm) / 2 / SAMPLE_RATE * realtime_factor)
+        return f"segment {request_id}"
+    return recognize
+
+
+def sequential(pcm: bytes, language: str, recognize_segment):
+    bounds = split_at_silence(pcm, recognition.SYNC_RECOGNIZE_MAX_SECONDS, recognition.MIN_SEGMENT_SECONDS)
+    return [recognize_segment(pcm[start * 2:end * 2], language, f"seq_{i}") for i, (start, end) in enumerate(bounds)]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark sequential vs parallel long-clip recognition")
+    parser.add_argument("--lengths", type=float, nargs="+", default=[30, 60, 120, 300, 600])
+    parser.add_argument("--language", default="th-TH")
+    parser.add_argument("--live", action="store_true", help="Call the real Speech API (needs credentials)")
+    parser.add_argument("--base-latency", type=float, default=0.4, help="Simulated per-request latency")
+    parser.add_argument("--realtime-factor", type=float, default=0.1, help="Simulated seconds per audio second")
+    args = parser.parse_args(argv)
+
+    recognize_segment = (
+        recognition.recognize_linear16 if args.live
+        else simulated_recognizer(args.base_latency, args.realtime_factor)
+    )
+
+    report = []
+    for seconds in args.lengths:
+        pcm = synthetic_speech(seconds)
+        started = time.perf_counter()
+        sequential(pcm, args.language, recognize_segment)
+        sequential_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        _, segments, _ = recognition.recognize_pcm(pcm, args.language, "bench", recognize_segment=recognize_segment)
+        parallel_seconds = time.perf_counter() - started
+
+        report.append({
+            "clip_seconds": seconds,
+            "segments": max(1, len(segments)),
+            "sequential_seconds": round(sequential_seconds, 3),
+            "parallel_seconds": round(parallel_seconds, 3),
+            "speedup": round(sequential_seconds / parallel_seconds, 2) if parallel_seconds else None,
+        })
+
+    print(json.dumps({"fanout": recognition.RECOGNITION_FANOUT, "live": args.live, "runs": report}, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,113 @@
+# bench_serialization.py - Per-request cost of encoding the hot GET payloads
+#
+# Questions: the previous path (schemas.Question per row -> jsonable_encoder ->
+# json.dumps) against serializers.question_to_dict + responses.dumps, and the
+# pre-encoded body the questionnaire cache now serves. Admin responses: stdlib
+# json.dumps against responses.dumps for the /api/admin/responses page shape.
+#
+#   cd backend && python -m benchmarks.bench_serialization [--questions 120] [--submissions 100]
+import argparse
+import json
+import sys
+import timeit
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from fastapi.encoders import jsonable_encoder
+
+import schemas
+from responses import dumps, orjson
+from serializers import question_to_dict, questions_to_list
+
+
+def stdlib_dumps(content) -> bytes:
+    """What ThaiJSONResponse.render did before"""
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+
+def legacy_question(db_question):
+    """crud.prepare_question_for_response, inlined so the benchmark needs no database"""
+    return schemas.Question(
+        id=db_question.id,
+        questionType=db_question.question_type,
+        questionText=db_question.question_text,
+        questionSubtext=db_question.question_subtext,
+        options=db_question.options,
+        logic=db_question.logic,
+        isRequired=db_question.is_required,
+        displayOrder=db_question.display_order,
+        minSelections=db_question.min_selections,
+        maxSelections=db_question.max_selections,
+    )
+
+
+def fake_questions(count: int):
+    return [
+        SimpleNamespace(
+            id=f"Q{i}",
+            question_type=("SA", "MA", "OE")[i % 3],
+            question_text=f"คุณซื้อผลิตภัณฑ์ของแบรนด์ใดบ่อยที่สุด ข้อที่ {i}",
+            question_subtext="เลือกได้หลายคำตอบ",
+            options=[{"value": str(v), "label": f"ตัวเลือกที่ {v}"} for v in range(1, 9)],
+            logic=[{"condition": "equals", "value": "1", "jumpToQuestion": f"Q{i + 2}"}],
+            is_required=True,
+            display_order=i,
+            min_selections=0,
+            max_selections=3,
+        )
+        for i in range(count)
+    ]
+
+
+def fake_submissions(count: int, answers_per_submission: int):
+    started = datetime(2024, 1, 1)
+    return [
+        {
+            "id": f"sub_{i:08d}",
+            "timestamp": (started + timedelta(minutes=i)).isoformat(),
+            "answers": {f"Q{q}": f"คำตอบแบบเปิด ข้อ {q} ของผู้ตอบ {i}" for q in range(answers_per_submission)},
+            "audio": {"Q5": {"key": f"recordings/{i:064x}.webm", "transcript": "ชอบเพราะราคาดี", "url": None}},
+        }
+        for i in range(count)
+    ]
+
+
+def bench(func, number: int) -> float:
+    """Best-of-5 microseconds per call"""
+    return round(min(timeit.repeat(func, number=number, repeat=5)) / number * 1e6, 1)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark JSON serialization of the hot GET endpoints")
+    parser.add_argument("--questions", type=int, default=120)
+    parser.add_argument("--submissions", type=int, default=100)
+    parser.add_argument("--answers", type=int, default=40, help="Answers per submission")
+    parser.add_argument("--number", type=int, default=200, help="Calls per timing run")
+    args = parser.parse_args(argv)
+
+    rows = fake_questions(args.questions)
+    legacy_body = stdlib_dumps(jsonable_encoder([legacy_question(q) for q in rows]))
+    fast_body = dumps(questions_to_list(rows))
+    if json.loads(legacy_body) != json.loads(fast_body):
+        raise SystemExit("question_to_dict output differs from the schema path")
+
+    submissions = fake_submissions(args.submissions, args.answers)
+    report = {
+        "orjson": orjson is not None,
+        "questions_us": {
+            "schema_jsonable_json": bench(lambda: stdlib_dumps(jsonable_encoder([legacy_question(q) for q in rows])), args.number),
+            "direct_dict_dumps": bench(lambda: dumps([question_to_dict(q) for q in rows]), args.number),
+            "preencoded_body": bench(lambda: bytes(fast_body), args.number),
+        },
+        "admin_responses_us": {
+            "json_dumps": bench(lambda: stdlib_dumps(submissions), args.number),
+            "dumps": bench(lambda: dumps(submissions), args.number),
+        },
+        "payload_bytes": {"questions": len(fast_body), "admin_responses": len(dumps(submissions))},
+    }
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
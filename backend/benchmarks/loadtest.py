@@ -0,0 +1,358 @@
+# loadtest.py - Respondent-journey load test against a running instance
+#
+# Each virtual user repeats the real survey flow: login, /api/auth/me,
+# /api/questions, optionally records voice answers (upload + transcribe), then
+# /api/submit with answers generated from the question definitions, following
+# their skip logic. Concurrency ramps through the given stages and every stage
+# reports throughput, p50/p95/p99 per endpoint and error rates as JSON, so runs
+# can be diffed against a saved baseline.
+#
+#   cd backend && uvicorn main:app --port 8000 --workers 4   (local database)
+#   python -m benchmarks.loadtest seed --users 500
+#   python -m benchmarks.loadtest run --stages 10:30,25:30,50:60 --output results.json
+#   python -m benchmarks.loadtest compare baseline.json results.json
+import argparse
+import asyncio
+import json
+import logging
+import random
+import sys
+import time
+from typing import Dict, List, Optional
+
+import metrics
+
+LOADTEST_PREFIX = "LOADTEST"
+LOADTEST_PASSWORD = "loadtest"
+
+ENDPOINTS = ["login", "auth_me", "questions", "upload_audio", "transcribe", "submit", "journey"]
+
+OPEN_ENDED_ANSWERS = [
+    "ชอบเพราะใส่สบายและราคาไม่แพง",
+    "ทรงสวย ผ้าหนา ใส่ได้นาน",
+    "ซื้อตามเพื่อนแนะนำ พนักงานบริการดี",
+    "ไม่ค่อยมีไซส์ที่ต้องการ อยากให้มีสีมากกว่านี้",
+]
+
+
+def seed_users(count: int, prefix: str = LOADTEST_PREFIX) -> int:
+    """Create (or reset) count customers with active credentials user{i}/loadtest"""
+    import models
+    from database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        for i in range(count):
+            customer_id = f"{prefix}{i:06d}"
+            if db.query(models.Customer).filter(models.Customer.customer_id == customer_id).first() is None:
+                db.add(models.Customer(
+                    customer_id=customer_id,
+                    first_name=f"Load{i}",
+                    last_name="Test",
+                    email=f"loadtest{i}@example.com",
+                    province=("Bangkok", "Chiang Mai", "Nonthaburi")[i % 3],
+                ))
+            credential = db.query(models.AuthCredential).filter(
+                models.AuthCredential.username == username_for(i, prefix)
+            ).first()
+            if credential is None:
+                credential = models.AuthCredential(username=username_for(i, prefix), customer_id=customer_id)
+                db.add(credential)
+            credential.password_hash = LOADTEST_PASSWORD
+            credential.active = True
+            credential.role = "user"
+        db.commit()
+    finally:
+        db.close()
+    return count
+
+
+def username_for(index: int, prefix: str = LOADTEST_PREFIX) -> str:
+    return f"{prefix.lower()}_{index:06d}"
+
+
+def generate_answers(questions: List[Dict], rng: random.Random) -> Dict[str, object]:
+    """
+    Answers for one respondent, walking the questions in display order and
+    taking the jumps their logic describes, like the survey client does
+    """
+    by_id = {question["id"]: question for question in questions}
+    ordered = sorted(questions, key=lambda question: question.get("displayOrder") or 0)
+    position = {question["id"]: index for index, question in enumerate(ordered)}
+
+    answers = {}
+    index = 0
+    while index < len(ordered):
+        question = ordered[index]
+        options = [option["value"] for option in question.get("options") or [] if option.get("value") is not None]
+        question_type = question.get("questionType")
+        if question_type == "MA" and options:
+            low = max(1, question.get("minSelections") or 1)
+            high = min(len(options), question.get("maxSelections") or len(options))
+            answer = rng.sample(options, rng.randint(min(low, high), high))
+        elif question_type == "SA" and options:
+            answer = rng.choice(options)
+        else:
+            answer = rng.choice(OPEN_ENDED_ANSWERS)
+        answers[question["id"]] = answer
+
+        index += 1
+        chosen = answer if isinstance(answer, list) else [answer]
+        for rule in question.get("logic") or []:
+            if rule.get("condition") == "equals" and (rule.get("value") in chosen or rule.get("value") == "any"):
+                target = rule.get("jumpToQuestion")
+                if target == "END":
+                    index = len(ordered)
+                elif target in by_id:
+                    index = position[target]
+                break
+    return answers
+
+
+def make_recording(seed: int) -> bytes:
+    from audio_conversion import wav_bytes
+    from benchmarks.bench_long_recognition import synthetic_speech
+
+    return wav_bytes(synthetic_speech(4 + seed % 8, seed=seed))
+
+
+class Recorder:
+    """Latencies and outcomes of one stage"""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {name: [] for name in ENDPOINTS}
+        self.errors: Dict[str, Dict[str, int]] = {name: {} for name in ENDPOINTS}
+
+    def record(self, endpoint: str, seconds: float, error: Optional[str] = None):
+        self.latencies[endpoint].append(seconds)
+        if error:
+            counts = self.errors[endpoint]
+            counts[error] = counts.get(error, 0) + 1
+
+    def report(self, elapsed: float) -> Dict:
+        endpoints = {}
+        for name in ENDPOINTS:
+            values = self.latencies[name]
+            if not values:
+                continue
+            errors = sum(self.errors[name].values())
+            summary = metrics.summarize(values)
+            endpoints[name] = {
+                "requests": len(values),
+                "requests_per_second": round(len(values) / elapsed, 2),
+                "errors": errors,
+                "error_rate": round(errors / len(values), 4),
+                "errors_by_type": self.errors[name],
+                **{f"{key}_ms": round(summary[key] * 1000, 1) for key in ("p50", "p95", "p99", "max")},
+            }
+        return endpoints
+
+
+async def timed_request(recorder: Recorder, endpoint: str, send, check=None):
+    """Send one request and record it; returns the response or None on failure"""
+    started = time.perf_counter()
+    try:
+        response = await send()
+    except Exception as e:
+        recorder.record(endpoint, time.perf_counter() - started, type(e).__name__)
+        return None
+    elapsed = time.perf_counter() - started
+    error = None
+    if response.status_code >= 400:
+        error = str(response.status_code)
+    elif check is not None and not check(response):
+        error = "bad_body"
+    recorder.record(endpoint, elapsed, error)
+    return None if error else response
+
+
+async def journey(client, recorder: Recorder, user_index: int, args, rng: random.Random, recordings: List[bytes]) -> bool:
+    started = time.perf_counter()
+    login = await timed_request(recorder, "login", lambda: client.post(
+        "/api/auth/login", json={"username": username_for(user_index, args.prefix), "password": LOADTEST_PASSWORD}
+    ), check=lambda r: "access_token" in r.json())
+    if login is None:
+        return False
+    headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+    await asyncio.sleep(args.think_time)
+
+    if await timed_request(recorder, "auth_me", lambda: client.get("/api/auth/me", headers=headers)) is None:
+        return False
+    questions = await timed_request(recorder, "questions", lambda: client.get("/api/questions", headers=headers))
+    if questions is None:
+        return False
+    await asyncio.sleep(args.think_time)
+
+    definitions = questions.json()
+    answers = generate_answers(definitions, rng)
+    audio = {}
+    if recordings and rng.random() < args.voice_fraction:
+        open_ended = [q["id"] for q in definitions if q.get("questionType") == "OE" and q["id"] in answers]
+        for question_id in open_ended[:args.voice_answers]:
+            clip = rng.choice(recordings)
+            uploaded = await timed_request(recorder, "upload_audio", lambda: client.post(
+                "/api/upload-audio",
+                files={"file": ("answer.wav", clip, "audio/wav")},
+                data={"question_id": question_id, "user_id": username_for(user_index, args.prefix)},
+            ), check=lambda r: r.json().get("success"))
+            transcribed = await timed_request(recorder, "transcribe", lambda: client.post(
+                "/api/transcribe", files={"file": ("answer.wav", clip, "audio/wav")}, params={"language": "th-TH"},
+            ), check=lambda r: r.json().get("status") == "success")
+            if uploaded is None or transcribed is None:
+                continue
+            transcript = transcribed.json().get("transcript") or ""
+            answers[question_id] = transcript
+            audio[question_id] = {"key": uploaded.json().get("key"), "transcript": transcript}
+            await asyncio.sleep(args.think_time)
+
+    submitted = await timed_request(recorder, "submit", lambda: client.post(
+        "/api/submit", json={"answers": answers, "audio": audio}, headers=headers
+    ))
+    recorder.record("journey", time.perf_counter() - started, None if submitted is not None else "incomplete")
+    return submitted is not None
+
+
+async def run_stage(client, concurrency: int, seconds: float, args, recordings: List[bytes]) -> Dict:
+    recorder = Recorder()
+    deadline = time.perf_counter() + seconds
+    counts = {"completed": 0, "failed": 0}
+
+    async def virtual_user(worker: int):
+        rng = random.Random(args.seed * 100003 + concurrency * 1009 + worker)
+        while time.perf_counter() < deadline:
+            ok = await journey(client, recorder, rng.randrange(args.users), args, rng, recordings)
+            counts["completed" if ok else "failed"] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(virtual_user(worker) for worker in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    total = counts["completed"] + counts["failed"]
+    return {
+        "concurrency": concurrency,
+        "elapsed_seconds": round(elapsed, 2),
+        "journeys": counts,
+        "journeys_per_second": round(counts["completed"] / elapsed, 2),
+        "journey_error_rate": round(counts["failed"] / total, 4) if total else 0.0,
+        "endpoints": recorder.report(elapsed),
+    }
+
+
+def parse_stages(text: str):
+    """'10:30,25:30' -> [(10, 30.0), (25, 30.0)], concurrency:seconds per stage"""
+    stages = []
+    for part in text.split(","):
+        concurrency, _, seconds = part.partition(":")
+        stages.append((int(concurrency), float(seconds or 30)))
+    return stages
+
+
+async def run_load(args) -> Dict:
+    import httpx
+
+    # One log line per request would drown the stage summaries
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    recordings = [make_recording(seed) for seed in range(8)] if args.voice_fraction > 0 else []
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    stages = []
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout, limits=limits) as client:
+        for concurrency, seconds in parse_stages(args.stages):
+            result = await run_stage(client, concurrency, seconds, args, recordings)
+            print(
+                f"[{concurrency} users] {result['journeys_per_second']} journeys/s, "
+                f"journey error rate {result['journey_error_rate']:.2%}",
+                file=sys.stderr,
+            )
+            stages.append(result)
+    return {
+        "base_url": args.base_url,
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "settings": {
+            "users": args.users,
+            "think_time": args.think_time,
+            "voice_fraction": args.voice_fraction,
+            "voice_answers": args.voice_answers,
+            "seed": args.seed,
+        },
+        "stages": stages,
+    }
+
+
+def compare(baseline: Dict, current: Dict, tolerance: float) -> Dict:
+    """
+    Per stage and endpoint: p95 and error rate changes. A regression is a p95
+    more than tolerance slower, or a higher error rate.
+    """
+    rows, regressions = [], 0
+    baseline_stages = {stage["concurrency"]: stage for stage in baseline["stages"]}
+    for stage in current["stages"]:
+        before = baseline_stages.get(stage["concurrency"])
+        if before is None:
+            continue
+        for name, now in stage["endpoints"].items():
+            then = before["endpoints"].get(name)
+            if then is None:
+                continue
+            change = (now["p95_ms"] - then["p95_ms"]) / then["p95_ms"] if then["p95_ms"] else 0.0
+            regressed = change > tolerance or now["error_rate"] > then["error_rate"]
+            regressions += regressed
+            rows.append({
+                "concurrency": stage["concurrency"],
+                "endpoint": name,
+                "p95_ms": [then["p95_ms"], now["p95_ms"]],
+                "p95_change": round(change, 3),
+                "error_rate": [then["error_rate"], now["error_rate"]],
+                "regressed": regressed,
+            })
+    return {"tolerance": tolerance, "regressions": regressions, "endpoints": rows}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the respondent journey against a running instance")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    seed_parser = subparsers.add_parser("seed", help="Create the load-test respondents in the configured database")
+    seed_parser.add_argument("--users", type=int, default=200)
+    seed_parser.add_argument("--prefix", default=LOADTEST_PREFIX)
+
+    run_parser = subparsers.add_parser("run", help="Ramp virtual users through the given stages")
+    run_parser.add_argument("--base-url", default="http://localhost:8000")
+    run_parser.add_argument("--stages", default="5:30,10:30,25:30,50:30", help="concurrency:seconds, comma separated")
+    run_parser.add_argument("--users", type=int, default=200, help="Seeded respondents to log in as")
+    run_parser.add_argument("--prefix", default=LOADTEST_PREFIX)
+    run_parser.add_argument("--think-time", type=float, default=0.0, help="Seconds between steps of a journey")
+    run_parser.add_argument("--voice-fraction", type=float, default=0.0, help="Share of journeys that record voice answers")
+    run_parser.add_argument("--voice-answers", type=int, default=1, help="Voice answers per recording journey")
+    run_parser.add_argument("--timeout", type=float, default=60)
+    run_parser.add_argument("--seed", type=int, default=1)
+    run_parser.add_argument("--output", help="Also write the results to this file")
+
+    compare_parser = subparsers.add_parser("compare", help="Compare a run against a baseline")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative p95 increase")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "seed":
+        print(json.dumps({"seeded": seed_users(args.users, args.prefix)}))
+        return 0
+
+    if args.command == "compare":
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        with open(args.current, encoding="utf-8") as f:
+            current = json.load(f)
+        result = compare(baseline, current, args.tolerance)
+        print(json.dumps(result, indent=2))
+        return 1 if result["regressions"] else 0
+
+    results = json.dumps(asyncio.run(run_load(args)), indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(results)
+    print(results)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
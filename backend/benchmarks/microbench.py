@@ -0,0 +1,306 @@
+# microbench.py - Microbenchmarks of the backend hot functions with stored baselines
+#
+# Every case runs at several generated fixture sizes and reports the best and
+# median microseconds per call. --save writes the results as the baseline;
+# later runs compare against it and exit non-zero when a case got slower than
+# --threshold. Database cases run on in-memory SQLite unless DATABASE_URL is set.
+#
+#   cd backend && python -m benchmarks.microbench [--case crud] [--save]
+import os
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+import argparse
+import json
+import logging
+import platform
+import random
+import shutil
+import statistics
+import sys
+import timeit
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from typing import Callable, Dict, List
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baselines", "microbench.json")
+DEFAULT_THRESHOLD = 0.15
+
+THAI_ANSWERS = ["ชอบมาก", "ใส่สบาย ราคาไม่แพง", "ผ้าหนา ทรงสวย", "ซื้อให้ลูก"]
+
+# name -> (setup(size) returning the callable to time, sizes)
+CASES: Dict[str, tuple] = {}
+
+
+class SkipCase(Exception):
+    """Raised by a setup whose requirements (e.g. ffmpeg) are missing"""
+
+
+def case(name: str, sizes: List[int]):
+    def register(setup: Callable[[int], Callable[[], object]]):
+        CASES[name] = (setup, sizes)
+        return setup
+    return register
+
+
+def submission_answers(count: int, rng: random.Random) -> Dict[str, object]:
+    """SA values, MA lists and open-ended Thai text, some JSON-quoted like older clients sent"""
+    answers = {}
+    for i in range(count):
+        kind = i % 4
+        if kind == 0:
+            answers[f"Q{i}"] = str(rng.randint(1, 8))
+        elif kind == 1:
+            answers[f"Q{i}"] = [f'"{v}"' for v in rng.sample(range(1, 9), 3)]
+        elif kind == 2:
+            answers[f"Q{i}"] = rng.choice(THAI_ANSWERS)
+        else:
+            answers[f"Q{i}"] = json.dumps(rng.choice(THAI_ANSWERS))
+    return answers
+
+
+@case("crud.create_submission", [10, 50, 200])
+def bench_create_submission(size: int):
+    import crud
+    import models
+    import schemas
+    from database import SessionLocal, engine
+
+    models.Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    # Responses reference questions, so the question rows have to exist
+    for i in range(size):
+        if db.get(models.Question, f"Q{i}") is None:
+            db.add(models.Question(id=f"Q{i}", question_type="SA", question_text=f"Q{i}", display_order=i))
+    db.commit()
+    submission = schemas.SubmissionCreate(answers=submission_answers(size, random.Random(size)))
+    return lambda: crud.create_submission(db, submission)
+
+
+@case("crud.format_submission_for_api", [10, 50, 200])
+def bench_format_submission(size: int):
+    import crud
+
+    rng = random.Random(size)
+    responses = []
+    for i in range(size):
+        text = rng.choice(THAI_ANSWERS)
+        # Every other answer arrives escaped, which takes the unicode_escape path
+        answer = json.dumps(text) if i % 2 else text
+        responses.append(SimpleNamespace(
+            question_id=f"Q{i}",
+            answer_data=answer,
+            audio_key=f"recordings/{i:064x}.webm" if i % 10 == 0 else None,
+            transcript=text if i % 10 == 0 else None,
+        ))
+    submission = SimpleNamespace(id="sub_bench", timestamp=datetime(2024, 1, 1), snapshot_id=None, responses=responses)
+    return lambda: crud.format_submission_for_api(submission)
+
+
+def question_row(options: int):
+    return SimpleNamespace(
+        id="Q1",
+        question_type="MA",
+        question_text="คุณซื้อผลิตภัณฑ์ของแบรนด์ใดบ่อยที่สุด",
+        question_subtext="เลือกได้หลายคำตอบ",
+        # Stored as JSON text by older rows, which prepare_question_for_response parses
+        options=json.dumps([{"value": str(v), "label": f"ตัวเลือกที่ {v}"} for v in range(options)]),
+        logic=json.dumps([{"condition": "equals", "value": "1", "jumpToQuestion": "Q3"}]),
+        is_required=True,
+        display_order=1,
+        min_selections=1,
+        max_selections=3,
+    )
+
+
+@case("crud.prepare_question_for_response", [4, 20, 100])
+def bench_prepare_question(size: int):
+    import crud
+
+    row = question_row(size)
+    return lambda: crud.prepare_question_for_response(row)
+
+
+@case("schemas.Question.model_validate", [4, 20, 100])
+def bench_question_validate(size: int):
+    import schemas
+
+    payload = {
+        "id": "Q1",
+        "questionType": "MA",
+        "questionText": "คุณซื้อผลิตภัณฑ์ของแบรนด์ใดบ่อยที่สุด",
+        "options": [{"value": str(v), "label": f"ตัวเลือกที่ {v}"} for v in range(size)],
+        "logic": [{"condition": "equals", "value": "1", "jumpToQuestion": "Q3"}],
+        "isRequired": True,
+        "displayOrder": 1,
+        "minSelections": 1,
+        "maxSelections": 3,
+    }
+    return lambda: schemas.Question.model_validate(payload)
+
+
+@case("answer_validation.validate_answers", [20, 50, 200])
+def bench_validate_answers(size: int):
+    from answer_validation import compile_rules, validate_answers
+
+    rng = random.Random(size)
+    questions, answers = [], {}
+    for i in range(size):
+        kind = ("SA", "MA", "OE")[i % 3]
+        options = [{"value": str(v), "label": f"ตัวเลือกที่ {v}"} for v in range(1, 9)] if kind != "OE" else []
+        questions.append({"id": f"Q{i}", "questionType": kind, "options": options, "isRequired": True,
+                          "minSelections": 1 if kind == "MA" else 0, "maxSelections": 3 if kind == "MA" else 0})
+        # Labels, as the survey client sends them
+        if kind == "SA":
+            answers[f"Q{i}"] = rng.choice(options)["label"]
+        elif kind == "MA":
+            answers[f"Q{i}"] = [option["label"] for option in rng.sample(options, 3)]
+        else:
+            answers[f"Q{i}"] = rng.choice(THAI_ANSWERS)
+    rules = compile_rules(questions)
+    assert not validate_answers(rules, answers)
+    return lambda: validate_answers(rules, answers)
+
+
+@case("auth_security.create_access_token", [1])
+def bench_create_token(size: int):
+    # auth_crud and auth_security import each other; load them in the app's order
+    import auth_crud  # noqa: F401
+    from auth_security import create_access_token
+
+    claims = {"sub": "loadtest_000001", "customer_id": "LOADTEST000001", "role": "user"}
+    return lambda: create_access_token(claims, timedelta(minutes=30))
+
+
+@case("auth_security.verify_token", [1])
+def bench_verify_token(size: int):
+    from fastapi import HTTPException
+
+    import auth_crud  # noqa: F401
+    from auth_security import create_access_token, verify_token
+
+    token = create_access_token({"sub": "loadtest_000001", "customer_id": "LOADTEST000001"}, timedelta(minutes=30))
+    error = HTTPException(status_code=401)
+    return lambda: verify_token(token, error)
+
+
+def synthetic_clip(seconds: int, sample_rate: int, channels: int) -> bytes:
+    import numpy as np
+
+    from audio_conversion import wav_bytes
+    from benchmarks.bench_long_recognition import synthetic_speech
+
+    pcm = np.frombuffer(synthetic_speech(seconds, seed=seconds), dtype=np.int16)
+    # Resample by index and duplicate channels, fine for conversion timing
+    resampled = pcm[(np.arange(seconds * sample_rate) * 16000 // sample_rate).clip(max=len(pcm) - 1)]
+    return wav_bytes(np.repeat(resampled, channels).tobytes(), sample_rate=sample_rate, channels=channels)
+
+
+@case("audio_conversion.to_linear16.passthrough", [5, 30, 120])
+def bench_passthrough(size: int):
+    from audio_conversion import to_linear16
+
+    clip = synthetic_clip(size, 16000, 1)
+    return lambda: to_linear16(clip)
+
+
+@case("audio_conversion.to_linear16.ffmpeg", [5, 30, 120])
+def bench_ffmpeg(size: int):
+    from audio_conversion import to_linear16
+
+    if shutil.which("ffmpeg") is None:
+        raise SkipCase("ffmpeg not found")
+    # 44.1 kHz stereo can't be passed through, so this measures the ffmpeg pipe
+    clip = synthetic_clip(size, 44100, 2)
+    return lambda: to_linear16(clip)
+
+
+def measure(func: Callable[[], object], repeat: int, min_time: float) -> Dict[str, float]:
+    timer = timeit.Timer(func)
+    number, elapsed = timer.autorange()
+    # autorange stops at 0.2s; scale up to min_time per repeat
+    number = max(1, int(number * max(1.0, min_time / max(elapsed, 1e-9))))
+    runs = [seconds / number * 1e6 for seconds in timer.repeat(repeat=repeat, number=number)]
+    return {"best_us": round(min(runs), 2), "median_us": round(statistics.median(runs), 2), "calls": number}
+
+
+def run_suite(selected: List[str], repeat: int, min_time: float) -> Dict[str, Dict]:
+    results = {}
+    for name in selected:
+        setup, sizes = CASES[name]
+        for size in sizes:
+            key = f"{name}[{size}]"
+            try:
+                func = setup(size)
+            except SkipCase as e:
+                results[key] = {"skipped": str(e)}
+                print(f"{key:<50} skipped: {e}", file=sys.stderr)
+                continue
+            results[key] = measure(func, repeat, min_time)
+            print(f"{key:<50} {results[key]['best_us']:>12.2f} us", file=sys.stderr)
+    return results
+
+
+def machine() -> Dict[str, str]:
+    return {"python": platform.python_version(), "platform": platform.platform(), "processor": platform.machine()}
+
+
+def compare(baseline: Dict, results: Dict[str, Dict], threshold: float) -> Dict:
+    """Cases whose best time grew by more than threshold over the baseline"""
+    rows, regressions = [], []
+    for key, result in results.items():
+        before = baseline["results"].get(key)
+        if before is None or "best_us" not in before or "best_us" not in result:
+            continue
+        change = (result["best_us"] - before["best_us"]) / before["best_us"]
+        rows.append({"case": key, "baseline_us": before["best_us"], "best_us": result["best_us"], "change": round(change, 3)})
+        if change > threshold:
+            regressions.append(key)
+    return {
+        "threshold": threshold,
+        "same_machine": baseline.get("machine") == machine(),
+        "regressions": regressions,
+        "cases": rows,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Microbenchmark backend hot functions against a stored baseline")
+    parser.add_argument("--case", action="append", default=[], help="Run cases whose name contains this (repeatable)")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save", action="store_true", help="Store the results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="Allowed relative slowdown")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--min-time", type=float, default=0.2, help="Seconds per timing repeat")
+    parser.add_argument("--keep-logging", action="store_true", help="Leave INFO logging on inside the measured code")
+    args = parser.parse_args(argv)
+
+    if not args.keep_logging:
+        logging.disable(logging.INFO)
+    selected = [name for name in CASES if not args.case or any(part in name for part in args.case)]
+    results = run_suite(selected, args.repeat, args.min_time)
+    report = {"machine": machine(), "recorded_at": datetime.now().isoformat(timespec="seconds"), "results": results}
+
+    exit_code = 0
+    if args.save:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        previous = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline, encoding="utf-8") as f:
+                previous = json.load(f).get("results", {})
+        # Partial runs only replace the cases they measured
+        report["results"] = {**previous, **results}
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+            f.write("\n")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            report["comparison"] = compare(json.load(f), results, args.threshold)
+        exit_code = 1 if report["comparison"]["regressions"] else 0
+
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,480 @@
+# bulk_loader.py - Streaming CRM sync for customers, credentials and purchases
+import argparse
+import codecs
+import csv
+import io
+import json
+import logging
+import random
+import sys
+import time
+from datetime import datetime
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from database import engine
+import logging_setup
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 50000
+MAX_REPORTED_ERRORS = 100
+
+TRUE_VALUES = {"1", "true", "t", "yes", "y"}
+FALSE_VALUES = {"0", "false", "f", "no", "n"}
+
+
+# Column converters used by chunk validation. Each returns the value to COPY
+# (as text) or raises ValueError with a readable message.
+def _text(value):
+    return value.strip() if isinstance(value, str) else str(value)
+
+def _boolean(value):
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    lowered = _text(value).lower()
+    if lowered in TRUE_VALUES:
+        return "true"
+    if lowered in FALSE_VALUES:
+        return "false"
+    raise ValueError(f"not a boolean: {value!r}")
+
+def _timestamp(value):
+    text = _text(value)
+    try:
+        return datetime.fromisoformat(text.replace("Z", "+00:00")).isoformat()
+    except ValueError:
+        raise ValueError(f"not an ISO timestamp: {value!r}")
+
+def _amount(value):
+    text = _text(value)
+    try:
+        float(text)
+    except ValueError:
+        raise ValueError(f"not a number: {value!r}")
+    return text
+
+
+# Load specification per target table. "key" is the upsert conflict column,
+# "unique" lists the table's other UNIQUE columns, "required" columns must be
+# present and non-empty, everything else is optional.
+TABLE_SPECS = {
+    "customers": {
+        "table": "customers",
+        "key": "customer_id",
+        "columns": {
+            "customer_id": _text,
+            "first_name": _text,
+            "last_name": _text,
+            "email": _text,
+            "phone": _text,
+            "province": _text,
+            "district": _text,
+            "income_range": _text,
+            "marital_status": _text,
+            "has_children": _boolean,
+        },
+        "unique": ("email",),
+        "required": {"customer_id", "first_name", "last_name", "email", "province"},
+        "parent": None,
+    },
+    "auth_credentials": {
+        "table": "auth_credentials",
+        # auth_credentials has no unique customer_id, username is its natural key
+        "key": "username",
+        "columns": {
+            "customer_id": _text,
+            "username": _text,
+            "password_hash": _text,
+            "active": _boolean,
+            "role": _text,
+        },
+        "required": {"customer_id", "username", "password_hash"},
+        "parent": "customers",
+    },
+    "purchases": {
+        "table": "purchases",
+        "key": "purchase_id",
+        "columns": {
+            "purchase_id": _text,
+            "customer_id": _text,
+            "brand": _text,
+            "product_type": _text,
+            "product_name": _text,
+            "purchase_date": _timestamp,
+            "amount": _amount,
+            "store_location": _text,
+        },
+        "required": {"purchase_id", "customer_id", "brand", "product_type", "purchase_date", "amount"},
+        "parent": "customers",
+    },
+}
+
+
+class LoadStats:
+    """Running counters for one load, reported as progress and as the final result"""
+
+    def __init__(self, entity: str):
+        self.entity = entity
+        self.rows_read = 0
+        self.rows_valid = 0
+        self.rows_upserted = 0
+        self.rows_orphaned = 0
+        self.rows_invalid = 0
+        self.rows_conflicting = 0
+        self.batches = 0
+        self.errors: List[Dict] = []
+        self.started_at = time.perf_counter()
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started_at
+
+    @property
+    def rows_per_second(self) -> float:
+        elapsed = self.elapsed
+        return self.rows_read / elapsed if elapsed > 0 else 0.0
+
+    def as_dict(self) -> Dict:
+        return {
+            "entity": self.entity,
+            "rows_read": self.rows_read,
+            "rows_valid": self.rows_valid,
+            "rows_upserted": self.rows_upserted,
+            "rows_orphaned": self.rows_orphaned,
+            "rows_invalid": self.rows_invalid,
+            "rows_conflicting": self.rows_conflicting,
+            "batches": self.batches,
+            "elapsed_seconds": round(self.elapsed, 3),
+            "rows_per_second": round(self.rows_per_second, 1),
+            "errors": self.errors,
+        }
+
+
+def log_progress(stats: LoadStats):
+    logger.info(
+        f"[{stats.entity}] batch {stats.batches}: {stats.rows_read} read, "
+        f"{stats.rows_upserted} upserted, {stats.rows_invalid} invalid, "
+        f"{stats.rows_conflicting} conflicting, {stats.rows_orphaned} orphaned ({stats.rows_per_second:,.0f} rows/s)"
+    )
+
+
+# Record readers - both stream line by line, nothing is materialised
+def iter_csv(stream: io.TextIOBase) -> Iterator[Dict]:
+    for row in csv.DictReader(stream):
+        yield row
+
+def iter_ndjson(stream: io.TextIOBase) -> Iterator[Dict]:
+    for line_number, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError as e:
+            # Surface as an invalid row rather than aborting the whole load
+            yield {"__error__": f"line {line_number}: invalid JSON ({e.msg})"}
+
+READERS = {"csv": iter_csv, "ndjson": iter_ndjson, "jsonl": iter_ndjson}
+
+
+def detect_format(filename: str) -> str:
+    extension = filename.rsplit(".", 1)[-1].lower() if "." in filename else ""
+    if extension not in READERS:
+        raise ValueError(f"Unsupported file format '{extension}', expected csv or ndjson")
+    return extension
+
+
+def _chunks(records: Iterable[Dict], size: int) -> Iterator[List[Dict]]:
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _report(stats: LoadStats, row_number: int, error: str):
+    if len(stats.errors) < MAX_REPORTED_ERRORS:
+        stats.errors.append({"row": row_number, "error": error})
+
+
+def validate_chunk(spec: Dict, records: List[Dict], first_row: int, stats: LoadStats) -> List[Tuple[int, List[Optional[str]]]]:
+    """Validate and normalise a chunk, returning (row number, row) with rows in spec column order"""
+    columns = spec["columns"]
+    required = spec["required"]
+    valid_rows = []
+
+    for offset, record in enumerate(records):
+        row_number = first_row + offset
+        try:
+            if "__error__" in record:
+                raise ValueError(record["__error__"])
+
+            row = []
+            for column, convert in columns.items():
+                value = record.get(column)
+                if value is None or (isinstance(value, str) and not value.strip()):
+                    if column in required:
+                        raise ValueError(f"missing required column '{column}'")
+                    row.append(None)
+                else:
+                    row.append(convert(value))
+            valid_rows.append((row_number, row))
+        except ValueError as e:
+            stats.rows_invalid += 1
+            _report(stats, row_number, str(e))
+
+    return valid_rows
+
+
+def reject_conflicts(cursor, spec: Dict, rows: List[Tuple[int, List[Optional[str]]]], stats: LoadStats) -> List[List[Optional[str]]]:
+    """
+    Drop rows that would break one of the table's other UNIQUE columns: a
+    value already stored under another key, or the same value for two keys in
+    the chunk (the first one keeps it). A single such row would otherwise fail
+    the batch's INSERT and abort the load.
+    """
+    columns = list(spec["columns"])
+    key_index = columns.index(spec["key"])
+    # Last row per key wins, as in the upsert, so only those rows claim values
+    latest = {row[key_index]: (row_number, row) for row_number, row in rows}
+
+    for column in spec.get("unique", ()):
+        index = columns.index(column)
+        values = list({row[index] for _, row in latest.values() if row[index] is not None})
+        if not values:
+            continue
+        cursor.execute(
+            f"SELECT {column}, {spec['key']} FROM {spec['table']} WHERE {column} = ANY(%s)",
+            (values,),
+        )
+        owners = dict(cursor.fetchall())
+        for key, (row_number, row) in list(latest.items()):
+            value = row[index]
+            if value is None:
+                continue
+            owner = owners.setdefault(value, key)
+            if owner != key:
+                del latest[key]
+                stats.rows_conflicting += 1
+                _report(stats, row_number, f"{column} {value!r} already belongs to {spec['key']} {owner!r}")
+
+    return [row for _, row in latest.values()]
+
+
+def _staging_name(spec: Dict) -> str:
+    return f"_stage_{spec['table']}"
+
+
+def _create_staging(cursor, spec: Dict):
+    columns = ", ".join(spec["columns"])
+    cursor.execute(
+        f"CREATE TEMP TABLE IF NOT EXISTS {_staging_name(spec)} AS "
+        f"SELECT {columns} FROM {spec['table']} WITH NO DATA"
+    )
+    cursor.execute(f"ALTER TABLE {_staging_name(spec)} ADD COLUMN IF NOT EXISTS _seq BIGSERIAL")
+    cursor.execute(f"TRUNCATE {_staging_name(spec)}")
+
+
+def _copy_rows(cursor, spec: Dict, rows: List[List[Optional[str]]]):
+    """COPY a validated chunk into the staging table through an in-memory CSV buffer"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        # Empty unquoted fields are NULL in COPY's CSV format
+        writer.writerow(["" if value is None else value for value in row])
+    buffer.seek(0)
+    columns = ", ".join(spec["columns"])
+    cursor.copy_expert(f"COPY {_staging_name(spec)} ({columns}) FROM STDIN WITH (FORMAT csv)", buffer)
+
+
+def _upsert_staging(cursor, spec: Dict) -> Dict[str, int]:
+    """Set-based upsert from staging into the target table, last row per key wins"""
+    staging = _staging_name(spec)
+    key = spec["key"]
+    columns = list(spec["columns"])
+    column_list = ", ".join(columns)
+    updates = ", ".join(f"{c} = EXCLUDED.{c}" for c in columns if c != key)
+
+    orphan_filter = ""
+    orphaned = 0
+    if spec["parent"]:
+        # Rows pointing at unknown customers would fail the FK for the whole batch
+        orphan_filter = "WHERE EXISTS (SELECT 1 FROM customers c WHERE c.customer_id = s.customer_id)"
+        cursor.execute(
+            f"SELECT COUNT(*) FROM {staging} s "
+            f"WHERE NOT EXISTS (SELECT 1 FROM customers c WHERE c.customer_id = s.customer_id)"
+        )
+        orphaned = cursor.fetchone()[0]
+
+    cursor.execute(
+        f"INSERT INTO {spec['table']} ({column_list}) "
+        f"SELECT DISTINCT ON ({key}) {column_list} FROM {staging} s {orphan_filter} "
+        f"ORDER BY {key}, _seq DESC "
+        f"ON CONFLICT ({key}) DO UPDATE SET {updates}"
+    )
+    upserted = cursor.rowcount
+    cursor.execute(f"TRUNCATE {staging}")
+    return {"upserted": upserted, "orphaned": orphaned}
+
+
+def load_records(
+    entity: str,
+    records: Iterable[Dict],
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    progress: Optional[Callable[[LoadStats], None]] = log_progress,
+) -> LoadStats:
+    """
+    Stream records into the given entity table
+
+    Records are validated in chunks of batch_size, copied into a temporary
+    staging table and merged into the target with a single INSERT ... ON
+    CONFLICT per chunk. Each chunk is committed on its own so a failure late
+    in a multi-million row file keeps the earlier batches.
+    """
+    if entity not in TABLE_SPECS:
+        raise ValueError(f"Unknown entity '{entity}', expected one of {', '.join(TABLE_SPECS)}")
+    if engine is None:
+        raise RuntimeError("Database engine is not available")
+    if engine.dialect.name != "postgresql":
+        # COPY and the staging tables are Postgres features
+        raise RuntimeError(f"Bulk loading needs PostgreSQL, the configured database is {engine.dialect.name}")
+
+    spec = TABLE_SPECS[entity]
+    stats = LoadStats(entity)
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        _create_staging(cursor, spec)
+        connection.commit()
+
+        for chunk in _chunks(records, batch_size):
+            first_row = stats.rows_read + 1
+            stats.rows_read += len(chunk)
+            numbered_rows = validate_chunk(spec, chunk, first_row, stats)
+            stats.rows_valid += len(numbered_rows)
+            if numbered_rows:
+                try:
+                    rows = reject_conflicts(cursor, spec, numbered_rows, stats)
+                    if rows:
+                        _copy_rows(cursor, spec, rows)
+                        result = _upsert_staging(cursor, spec)
+                        stats.rows_upserted += result["upserted"]
+                        stats.rows_orphaned += result["orphaned"]
+                    connection.commit()
+                except Exception:
+                    connection.rollback()
+                    raise
+            stats.batches += 1
+            if progress:
+                progress(stats)
+
+        cursor.close()
+    finally:
+        connection.close()
+
+    logger.info(
+        f"[{entity}] load finished: {stats.rows_upserted} rows upserted in "
+        f"{stats.elapsed:.1f}s ({stats.rows_per_second:,.0f} rows/s)"
+    )
+    return stats
+
+
+def load_stream(entity: str, stream, fmt: str, batch_size: int = DEFAULT_BATCH_SIZE, progress=log_progress) -> LoadStats:
+    """Load a binary or text stream in the given format (csv or ndjson)"""
+    if fmt not in READERS:
+        raise ValueError(f"Unsupported file format '{fmt}', expected csv or ndjson")
+    if not isinstance(stream, io.TextIOBase):
+        # UploadFile's SpooledTemporaryFile isn't a full IOBase before Python 3.11
+        stream = codecs.getreader("utf-8-sig")(stream)
+    return load_records(entity, READERS[fmt](stream), batch_size=batch_size, progress=progress)
+
+
+# Synthetic data for the rows/sec benchmark
+BENCH_PREFIX = "BENCH"
+BENCH_PROVINCES = ["Bangkok", "Nonthaburi", "Chiang Mai", "Khon Kaen", "Phuket"]
+BENCH_BRANDS = ["Mc Jeans", "Levi's", "Lee", "Wrangler", "Uniqlo"]
+
+def generate_customers(count: int) -> Iterator[Dict]:
+    for i in range(count):
+        yield {
+            "customer_id": f"{BENCH_PREFIX}{i:08d}",
+            "first_name": f"Bench{i}",
+            "last_name": "Customer",
+            "email": f"bench{i}@example.com",
+            "phone": f"08{i % 100000000:08d}",
+            "province": BENCH_PROVINCES[i % len(BENCH_PROVINCES)],
+            "income_range": str(i % 6 + 1),
+            "has_children": "true" if i % 2 else "false",
+        }
+
+def generate_purchases(count: int, customers: int) -> Iterator[Dict]:
+    for i in range(count):
+        yield {
+            "purchase_id": f"{BENCH_PREFIX}P{i:09d}",
+            "customer_id": f"{BENCH_PREFIX}{random.randrange(customers):08d}",
+            "brand": BENCH_BRANDS[i % len(BENCH_BRANDS)],
+            "product_type": "Jeans",
+            "purchase_date": f"2024-{i % 12 + 1:02d}-{i % 28 + 1:02d}T10:00:00",
+            "amount": f"{990 + i % 1000}.00",
+        }
+
+def cleanup_benchmark():
+    from sqlalchemy import text
+    with engine.begin() as connection:
+        pattern = {"pattern": f"{BENCH_PREFIX}%"}
+        connection.execute(text("DELETE FROM purchases WHERE purchase_id LIKE :pattern"), pattern)
+        connection.execute(text("DELETE FROM customers WHERE customer_id LIKE :pattern"), pattern)
+
+def run_benchmark(rows: int, batch_size: int, cleanup: bool = True) -> Dict:
+    customers = max(1, rows // 10)
+    results = {
+        "customers": load_records("customers", generate_customers(customers), batch_size).as_dict(),
+        "purchases": load_records("purchases", generate_purchases(rows, customers), batch_size).as_dict(),
+    }
+    if cleanup:
+        cleanup_benchmark()
+    for result in results.values():
+        result.pop("errors")
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk load CRM exports into the survey database")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    load_parser = subparsers.add_parser("load", help="Load a CSV or NDJSON file")
+    load_parser.add_argument("entity", choices=list(TABLE_SPECS))
+    load_parser.add_argument("path", help="File to load, '-' for stdin")
+    load_parser.add_argument("--format", choices=list(READERS), help="Defaults to the file extension")
+    load_parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+
+    bench_parser = subparsers.add_parser("bench", help="Measure rows/sec with synthetic data")
+    bench_parser.add_argument("--rows", type=int, default=100000, help="Number of purchases to load")
+    bench_parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    bench_parser.add_argument("--keep", action="store_true", help="Keep the synthetic rows afterwards")
+
+    args = parser.parse_args(argv)
+    logging_setup.configure_logging()
+
+    if args.command == "bench":
+        print(json.dumps(run_benchmark(args.rows, args.batch_size, cleanup=not args.keep), indent=2))
+        return 0
+
+    if args.path == "-":
+        fmt = args.format or "csv"
+        stats = load_stream(args.entity, sys.stdin, fmt, args.batch_size)
+    else:
+        fmt = args.format or detect_format(args.path)
+        with open(args.path, "r", encoding="utf-8-sig", newline="") as f:
+            stats = load_stream(args.entity, f, fmt, args.batch_size)
+
+    print(json.dumps(stats.as_dict(), indent=2, ensure_ascii=False))
+    return 0 if stats.rows_invalid == 0 and stats.rows_conflicting == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,63 @@
+# cache_refresher.py - Keeps the shared questionnaire and tally snapshots fresh
+#
+# Started once by start.sh next to the uvicorn workers when WEB_CONCURRENCY > 1.
+# Workers then read the snapshots without touching the database; they only
+# reload one themselves if this process falls behind.
+#
+#   cd backend && WEB_CONCURRENCY=4 python cache_refresher.py [--once]
+import os
+
+# One connection is all the refresher needs, the rest of the budget goes to the workers
+os.environ.setdefault("DB_POOL_SIZE", "1")
+os.environ.setdefault("DB_MAX_OVERFLOW", "0")
+
+import argparse
+import logging
+import sys
+import time
+
+import logging_setup
+
+# Before the database import so its connection messages are captured
+logging_setup.configure_logging()
+
+import answer_tallies
+import questionnaire_cache
+from database import SessionLocal
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Well inside the worker-side TTLs, so workers never find a stale snapshot
+REFRESH_INTERVAL_SECONDS = float(os.getenv("SHARED_CACHE_REFRESH", "15"))
+
+
+def refresh_once():
+    db = SessionLocal()
+    try:
+        for cache in (questionnaire_cache, answer_tallies):
+            try:
+                cache.publish(db)
+            except Exception as e:
+                db.rollback()
+                logger.error(f"Refreshing {cache.__name__} failed: {str(e)}")
+    finally:
+        db.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Refresh the shared questionnaire and tally snapshots")
+    parser.add_argument("--once", action="store_true", help="Publish once and exit")
+    parser.add_argument("--interval", type=float, default=REFRESH_INTERVAL_SECONDS)
+    args = parser.parse_args(argv)
+
+    logger.info(f"Refreshing shared snapshots every {args.interval}s")
+    while True:
+        refresh_once()
+        if args.once:
+            return 0
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,126 @@
+# compression.py - Negotiated gzip/brotli response compression
+import gzip
+import os
+from typing import Dict, Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+import metrics
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Responses smaller than this aren't worth the CPU or the extra header
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+# Per-request levels favour speed; precompressed payloads use the maximum
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "5"))
+
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/", "application/javascript")
+
+
+def supported_encodings():
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def negotiate(accept_encoding: Optional[str]) -> Optional[str]:
+    """Best encoding the client accepts (brotli preferred), None for identity"""
+    if not accept_encoding:
+        return None
+    accepted = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+    for encoding in supported_encodings():
+        if accepted.get(encoding, accepted.get("*", 0)) > 0:
+            return encoding
+    return None
+
+
+def compress(body: bytes, encoding: str, best: bool = False) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=11 if best else BROTLI_QUALITY)
+    # mtime=0 keeps the output byte-identical for identical input
+    return gzip.compress(body, compresslevel=9 if best else GZIP_LEVEL, mtime=0)
+
+
+def precompress(body: bytes) -> Dict[Optional[str], bytes]:
+    """Every encoding of a cacheable body, compressed once at maximum ratio"""
+    variants = {None: body}
+    for encoding in supported_encodings():
+        variants[encoding] = compress(body, encoding, best=True)
+    return variants
+
+
+def encoded_headers(encoding: Optional[str]) -> Dict[str, str]:
+    headers = {"Vary": "Accept-Encoding"}
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return headers
+
+
+class CompressionMiddleware:
+    """
+    Compresses complete responses above COMPRESSION_MIN_SIZE with the encoding
+    negotiated from Accept-Encoding. Responses that already carry a
+    Content-Encoding (precompressed payloads), streamed bodies (SSE, NDJSON
+    transcription results) and binary content pass through untouched.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate(Headers(scope=scope).get("accept-encoding"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        state = {"start": None, "passthrough": False}
+
+        async def send_compressed(message: Message):
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                state["passthrough"] = (
+                    "content-encoding" in headers
+                    or not headers.get("content-type", "").startswith(COMPRESSIBLE_TYPES)
+                )
+                # Held back until the first body chunk shows whether to compress
+                state["start"] = message
+                return
+
+            start = state["start"]
+            if message["type"] != "http.response.body" or start is None:
+                # Later chunks of a stream, which is sent uncompressed as it comes
+                await send(message)
+                return
+            state["start"] = None
+
+            body = message.get("body", b"")
+            if not state["passthrough"] and not message.get("more_body", False) and len(body) >= self.minimum_size:
+                compressed = compress(body, encoding)
+                metrics.increment("compression.responses")
+                metrics.increment("compression.bytes_saved", len(body) - len(compressed))
+                headers = MutableHeaders(raw=start["headers"])
+                headers["Content-Encoding"] = encoding
+                headers["Content-Length"] = str(len(compressed))
+                headers.add_vary_header("Accept-Encoding")
+                message = dict(message, body=compressed)
+            await send(start)
+            await send(message)
+
+        await self.app(scope, receive, send_compressed)
@@ -1,4 +1,5 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import DateTime, text
+from sqlalchemy.orm import Session, selectinload
 import uuid
 import json
 from datetime import datetime
@@ -7,9 +8,9 @@ import logging
 from fastapi.encoders import jsonable_encoder
 
 import models, schemas
+from audio_storage import key_from_url
 
 # Set up logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Question CRUD operations
@@ -51,10 +52,8 @@ def create_question(db: Session, question: schemas.QuestionCreate):
     return db_question
 
 def update_question(db: Session, question_id: str, question: schemas.QuestionUpdate):
-    print(f"Updating question {question_id} with data: {question.dict()}")
-    # Explicitly log to see if maxSelections is present in the update data
-    print(f"maxSelections value: {question.maxSelections}")
     logger.info(f"Updating question: {question_id}")
+    logger.debug(f"Question update data: {question.dict()}")
     try:
         db_question = db.query(models.Question).filter(models.Question.id == question_id).first()
         if db_question:
@@ -124,40 +123,39 @@ def update_question_order(db: Session, question_orders: List[schemas.QuestionOrd
 # Since we're handling the conversion on the frontend,
 # we can make the backend part simpler:
 
-def create_submission(db: Session, submission: schemas.SubmissionCreate):
-    logger.info("Creating new submission")
+def decode_if_needed(text):
+    """Unquote answers that older clients sent JSON-encoded"""
+    if isinstance(text, str):
+        # Check if it's a JSON-encoded string (starts and ends with quotes)
+        if (text.startswith('"') and text.endswith('"')) or \
+           (text.startswith("'") and text.endswith("'")) or \
+           (text.startswith('"""') and text.endswith('"""')):
+            try:
+                # Try to decode it
+                return json.loads(text)
+            except:
+                pass
+    return text
+
+def create_submission(db: Session, submission: schemas.SubmissionCreate, snapshot_id: str = None):
     try:
         # Create a unique ID for the submission
         submission_id = f"sub_{uuid.uuid4().hex[:10]}_{int(datetime.utcnow().timestamp())}"
         
-        # Log the submission data
-        logger.info(f"Submission ID: {submission_id}")
-        
         # Create the submission record
         db_submission = models.Submission(
             id=submission_id,
-            timestamp=datetime.utcnow()
+            timestamp=datetime.utcnow(),
+            snapshot_id=snapshot_id
         )
+        # Committed together with the responses below: one transaction, and the
+        # flush inserts the responses as a single batch after the submission row
         db.add(db_submission)
-        db.commit()
-        
-        # Helper function to decode JSON strings if needed
-        def decode_if_needed(text):
-            if isinstance(text, str):
-                # Check if it's a JSON-encoded string (starts and ends with quotes)
-                if (text.startswith('"') and text.endswith('"')) or \
-                   (text.startswith("'") and text.endswith("'")) or \
-                   (text.startswith('"""') and text.endswith('"""')):
-                    try:
-                        # Try to decode it
-                        return json.loads(text)
-                    except:
-                        pass
-            return text
         
         # Create individual responses for each question
         for question_id, answer in submission.answers.items():
-            response_id = f"res_{uuid.uuid4().hex[:8]}"
+            # Full 128 bits: 8 hex digits collide once the table holds tens of thousands of rows
+            response_id = f"res_{uuid.uuid4().hex}"
             
             # Process the answer based on its type
             final_answer = ""
@@ -177,21 +175,30 @@ def create_submission(db: Session, submission: schemas.SubmissionCreate):
                 final_answer = str(final_answer)
                 
             # Log for debugging
-            logger.info(f"Question {question_id}: Original answer: {answer}")
-            logger.info(f"Question {question_id}: Final answer: {final_answer}")
+            logger.debug(f"Question {question_id}: Original answer: {answer}, final answer: {final_answer}")
             
+            # Voice answers keep the recording and its transcript in their own columns
+            audio = submission.audio.get(question_id)
+            audio_key = None
+            transcript = None
+            if audio:
+                audio_key = audio.key or key_from_url(audio.url)
+                transcript = audio.transcript if audio.transcript is not None else final_answer
+
             # Create the response record
             db_response = models.Response(
                 id=response_id,
                 question_id=question_id,
                 submission_id=submission_id,
-                answer_data=final_answer
+                answer_data=final_answer,
+                transcript=transcript,
+                audio_key=audio_key
             )
             db.add(db_response)
         
         # Commit all responses
         db.commit()
-        logger.info("All responses committed successfully")
+        logger.info(f"Submission {submission_id} stored with {len(submission.answers)} responses")
         
         # Refresh the submission to get the related responses
         db.refresh(db_submission)
@@ -204,7 +211,15 @@ def create_submission(db: Session, submission: schemas.SubmissionCreate):
 
 def get_submissions(db: Session, skip: int = 0, limit: int = 100):
     logger.info("Fetching submissions")
-    return db.query(models.Submission).order_by(models.Submission.timestamp.desc()).offset(skip).limit(limit).all()
+    # Load the page's responses in one extra query instead of one per submission
+    return (
+        db.query(models.Submission)
+        .options(selectinload(models.Submission.responses))
+        .order_by(models.Submission.timestamp.desc())
+        .offset(skip)
+        .limit(limit)
+        .all()
+    )
 
 def get_submission(db: Session, submission_id: str):
     logger.info(f"Fetching submission: {submission_id}")
@@ -212,9 +227,10 @@ def get_submission(db: Session, submission_id: str):
 
 def format_submission_for_api(db_submission):
     """Format a submission with all its responses for API output"""
-    logger.info(f"Formatting submission for API: {db_submission.id}")
+    logger.debug(f"Formatting submission for API: {db_submission.id}")
     
     responses_dict = {}
+    audio_dict = {}
     
     for response in db_submission.responses:
         # Get the answer data directly
@@ -238,9 +254,122 @@ def format_submission_for_api(db_submission):
         # But for now, keeping it as a string is fine for display purposes
         
         responses_dict[response.question_id] = answer_data
+        if response.audio_key or response.transcript:
+            audio_dict[response.question_id] = {
+                "key": response.audio_key,
+                "transcript": response.transcript
+            }
     
     return {
         "id": db_submission.id,
         "timestamp": db_submission.timestamp.isoformat(),
-        "answers": responses_dict
-    }
\ No newline at end of file
+        "snapshot_id": db_submission.snapshot_id,
+        "answers": responses_dict,
+        "audio": audio_dict
+    }
+
+def _like_pattern(query: str) -> str:
+    """Substring pattern for ILIKE with the user's wildcards escaped"""
+    escaped = query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+def search_responses(db: Session, query: str, question_id: str = None, skip: int = 0, limit: int = 50):
+    """
+    Responses whose answer text or transcript contains query (case-insensitive),
+    newest first. On Postgres the pg_trgm GIN indexes from migration 004 keep
+    queries of three or more characters fast on large tables.
+    """
+    # SQLite has no ILIKE, but its LIKE is already case-insensitive for ASCII
+    like = "ILIKE" if db.get_bind().dialect.name == "postgresql" else "LIKE"
+    filters = [f"(r.answer_data {like} :pattern ESCAPE '\\' OR r.transcript {like} :pattern ESCAPE '\\')"]
+    params = {"pattern": _like_pattern(query), "limit": limit, "skip": skip}
+    if question_id:
+        filters.append("r.question_id = :question_id")
+        params["question_id"] = question_id
+
+    rows = db.execute(text(f"""
+        SELECT r.id, r.submission_id, r.question_id, r.answer_data, r.transcript, r.audio_key, s.timestamp
+        FROM responses r
+        JOIN submissions s ON s.id = r.submission_id
+        WHERE {" AND ".join(filters)}
+        ORDER BY s.timestamp DESC
+        LIMIT :limit OFFSET :skip
+    """).columns(timestamp=DateTime), params).mappings().all()
+
+    return [
+        {
+            "response_id": row["id"],
+            "submission_id": row["submission_id"],
+            "question_id": row["question_id"],
+            "answer": row["answer_data"],
+            "transcript": row["transcript"],
+            "audio_key": row["audio_key"],
+            "timestamp": row["timestamp"].isoformat() if row["timestamp"] else None,
+        }
+        for row in rows
+    ]
+
+def get_answer_tallies(db: Session):
+    """
+    Answer counts for the choice questions, aggregated in the database:
+    {question_id: {"responses": n, "answers": {value: count}}}. Multiple
+    choice answers are stored comma-joined and count once per selected value.
+    """
+    rows = db.execute(text("""
+        SELECT r.question_id, q.question_type, r.answer_data, COUNT(*) AS answer_count
+        FROM responses r
+        JOIN questions q ON q.id = r.question_id
+        WHERE q.question_type IN ('SA', 'MA')
+        GROUP BY r.question_id, q.question_type, r.answer_data
+    """)).mappings().all()
+
+    tallies = {}
+    for row in rows:
+        tally = tallies.setdefault(row["question_id"], {"responses": 0, "answers": {}})
+        tally["responses"] += row["answer_count"]
+        answer = row["answer_data"] or ""
+        values = answer.split(", ") if row["question_type"] == "MA" else [answer]
+        for value in values:
+            if value:
+                tally["answers"][value] = tally["answers"].get(value, 0) + row["answer_count"]
+    return tallies
+
+def prepare_question_for_response(db_question):
+    """Convert SQLAlchemy Question model to Pydantic Question schema."""
+    if db_question is None:
+        return None
+    
+    # Handle options field
+    options = db_question.options
+    if options and isinstance(options, str):
+        try:
+            options = json.loads(options)
+        except json.JSONDecodeError:
+            options = []
+    
+    # Handle logic field
+    logic = db_question.logic
+    if logic and isinstance(logic, str):
+        try:
+            logic = json.loads(logic)
+        except json.JSONDecodeError:
+            logic = []
+    
+    min_selections = 0
+    if hasattr(db_question, 'min_selections'):
+        min_selections = db_question.min_selections
+    
+    # Create Pydantic model with explicit field mapping
+    return schemas.Question(
+        id=db_question.id,
+        questionType=db_question.question_type,
+        questionText=db_question.question_text,
+        questionSubtext=db_question.question_subtext,
+        options=options,
+        logic=logic,
+        isRequired=db_question.is_required,
+        # Include displayOrder if it exists in your schema
+        displayOrder=getattr(db_question, 'display_order', 0),
+        minSelections=min_selections,
+        maxSelections=db_question.max_selections
+    )
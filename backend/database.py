@@ -1,6 +1,8 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
 import logging
 import traceback
 import time
@@ -10,7 +12,6 @@ from dotenv import load_dotenv
 load_dotenv()
 
 # Set up logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Database credentials
@@ -20,10 +21,63 @@ DB_HOST = os.getenv("DB_HOST", "localhost")
 DB_PORT = os.getenv("DB_PORT", "5432")
 DB_NAME = os.getenv("DB_NAME", "defaultdb")
 
-# For DigitalOcean managed PostgreSQL, use the simpler sslmode parameter
-DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+# DATABASE_URL wins over the DB_* parts, e.g. sqlite:///./survey.db,
+# sqlite:// (in-memory) or postgresql://survey@localhost/survey for a local
+# Postgres. The managed instance needs TLS; set DB_SSLMODE=disable locally.
+DATABASE_URL = os.getenv("DATABASE_URL") or f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+DB_SSLMODE = os.getenv("DB_SSLMODE", "require")
 
-logger.info(f"Connecting to database at {DB_HOST}:{DB_PORT}/{DB_NAME} as {DB_USER}")
+url = make_url(DATABASE_URL)
+DIALECT = url.get_backend_name()
+
+logger.info(f"Connecting to database at {url.render_as_string(hide_password=True)}")
+
+# Connections the server may hold across all processes. Each uvicorn worker
+# (WEB_CONCURRENCY, also uvicorn's default --workers) gets an equal share after
+# setting aside a few for the cache refresher, migrations and admin sessions.
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+DB_CONNECTION_BUDGET = int(os.getenv("DB_CONNECTION_BUDGET", "20"))
+DB_RESERVED_CONNECTIONS = int(os.getenv("DB_RESERVED_CONNECTIONS", "3"))
+
+def pool_settings(budget=DB_CONNECTION_BUDGET, workers=WEB_CONCURRENCY, reserved=DB_RESERVED_CONNECTIONS):
+    """pool_size/max_overflow for one process; DB_POOL_SIZE/DB_MAX_OVERFLOW override"""
+    share = max(2, (budget - reserved) // max(1, workers))
+    # Half kept open, half opened for bursts and closed again
+    pool_size = max(1, share // 2)
+    return {
+        "pool_size": int(os.getenv("DB_POOL_SIZE", pool_size)),
+        "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", share - pool_size)),
+    }
+
+def _is_memory_sqlite() -> bool:
+    return DIALECT == "sqlite" and url.database in (None, "", ":memory:")
+
+def engine_options():
+    """create_engine arguments for the configured dialect"""
+    if DIALECT == "sqlite":
+        options = {"connect_args": {"check_same_thread": False}}
+        if _is_memory_sqlite():
+            # One shared connection, otherwise every session gets its own empty database
+            options["poolclass"] = StaticPool
+        return options
+
+    options = {"pool_pre_ping": True, "pool_recycle": 1800, **pool_settings()}
+    if DIALECT == "postgresql" and "sslmode" not in url.query:
+        # For DigitalOcean, simply using sslmode=require is often more reliable
+        # than custom SSL contexts
+        options["connect_args"] = {"sslmode": DB_SSLMODE}
+    logger.info(f"Connection pool: {options['pool_size']} + {options['max_overflow']} overflow per process")
+    return options
+
+def _configure_sqlite(engine):
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        # SQLite leaves foreign keys off unless asked; WAL lets readers run alongside a writer
+        cursor.execute("PRAGMA foreign_keys=ON")
+        if not _is_memory_sqlite():
+            cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.close()
 
 def create_db_engine(max_retries=5, retry_delay=3):
     retries = 0
@@ -31,14 +85,9 @@ def create_db_engine(max_retries=5, retry_delay=3):
     
     while retries < max_retries:
         try:
-            # For DigitalOcean, simply using sslmode=require is often more reliable
-            # than custom SSL contexts
-            engine = create_engine(
-                DATABASE_URL,
-                connect_args={"sslmode": "require"},  # Direct sslmode parameter
-                pool_pre_ping=True,
-                pool_recycle=1800
-            )
+            engine = create_engine(url, **engine_options())
+            if DIALECT == "sqlite":
+                _configure_sqlite(engine)
             
             # Test the connection
             from sqlalchemy import text
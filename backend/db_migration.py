@@ -1,18 +1,23 @@
-from sqlalchemy import text
+from sqlalchemy import inspect, text
 import logging
 import json
 from datetime import datetime
 
 # Set up logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Define migrations with version numbers
+# Each migration may carry:
+#   "sql"          statements that run on every dialect
+#   "add_columns"  (table, column, definition) added when the column is missing
+#   "postgresql" / "sqlite"  statements that only run on that dialect
+# SQLite databases get their tables from the models (init_db), so the legacy
+# Postgres DDL in 001 has no SQLite counterpart.
 MIGRATIONS = [
     {
         "version": "001_initial_schema",
         "description": "Create initial tables if they don't exist",
-        "sql": [
+        "postgresql": [
             """
             CREATE TABLE IF NOT EXISTS questions (
                 id SERIAL PRIMARY KEY,
@@ -39,44 +44,103 @@ MIGRATIONS = [
     {
         "version": "002_add_min_selections",
         "description": "Add min_selections column to questions table",
-        "sql": [
-            """
-            DO $$
-            BEGIN
-                IF NOT EXISTS (
-                    SELECT column_name 
-                    FROM information_schema.columns 
-                    WHERE table_name = 'questions' AND column_name = 'min_selections'
-                ) THEN
-                    ALTER TABLE questions 
-                    ADD COLUMN min_selections INTEGER DEFAULT 0;
-                END IF;
-            END $$;
-            """
+        "add_columns": [
+            ("questions", "min_selections", "INTEGER DEFAULT 0"),
         ]
     },
     # Add more migrations here as needed
     {
         "version": "003_add_max_selections",
         "description": "Add max_selections column to questions table",
+        "add_columns": [
+            ("questions", "max_selections", "INTEGER DEFAULT 0"),
+        ]
+    },
+    {
+        "version": "004_response_transcripts_search",
+        "description": "Store transcripts and audio keys on responses, trigram indexes for answer search",
+        "add_columns": [
+            ("responses", "transcript", "TEXT"),
+            ("responses", "audio_key", "VARCHAR"),
+        ],
+        "sql": [
+            """
+            CREATE INDEX IF NOT EXISTS ix_responses_submission_id ON responses (submission_id);
+            """
+        ],
+        # Thai is written without spaces between words, so word-based
+        # tsvector search misses most matches; trigrams index substrings.
+        "postgresql": [
+            """
+            CREATE EXTENSION IF NOT EXISTS pg_trgm;
+            """,
+            """
+            CREATE INDEX IF NOT EXISTS ix_responses_answer_data_trgm
+                ON responses USING gin (answer_data gin_trgm_ops);
+            """,
+            """
+            CREATE INDEX IF NOT EXISTS ix_responses_transcript_trgm
+                ON responses USING gin (transcript gin_trgm_ops);
+            """
+        ]
+    },
+    {
+        "version": "005_questionnaire_snapshots",
+        "description": "Record the questionnaire snapshot each submission was answered against",
+        # The questionnaire_snapshots table itself comes from init_db, which runs first
+        "add_columns": [
+            ("submissions", "snapshot_id", "VARCHAR REFERENCES questionnaire_snapshots (id)"),
+        ],
         "sql": [
             """
-            DO $$
-            BEGIN
-                IF NOT EXISTS (
-                    SELECT column_name 
-                    FROM information_schema.columns 
-                    WHERE table_name = 'questions' AND column_name = 'max_selections'
-                ) THEN
-                    ALTER TABLE questions 
-                    ADD COLUMN max_selections INTEGER DEFAULT 0;
-                END IF;
-            END $$;
+            CREATE INDEX IF NOT EXISTS ix_submissions_snapshot_id ON submissions (snapshot_id);
             """
         ]
     }
 ]
 
+MIGRATIONS_TABLE = {
+    "postgresql": """
+        CREATE TABLE IF NOT EXISTS migrations (
+            id SERIAL PRIMARY KEY,
+            version VARCHAR(255) NOT NULL UNIQUE,
+            description TEXT,
+            applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            details JSONB
+        );
+    """,
+    "sqlite": """
+        CREATE TABLE IF NOT EXISTS migrations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            version VARCHAR(255) NOT NULL UNIQUE,
+            description TEXT,
+            applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            details TEXT
+        );
+    """,
+}
+
+def _add_column_statements(connection, migration):
+    """ALTER TABLE ... ADD COLUMN for the listed columns the table doesn't have yet"""
+    statements = []
+    inspector = inspect(connection)
+    for table, column, definition in migration.get("add_columns", []):
+        if not inspector.has_table(table):
+            continue
+        existing = {c["name"] for c in inspector.get_columns(table)}
+        if column not in existing:
+            statements.append(f"ALTER TABLE {table} ADD COLUMN {column} {definition};")
+    return statements
+
+def migration_statements(connection, migration):
+    """Statements to run for this migration on the connection's dialect"""
+    dialect = connection.dialect.name
+    return (
+        _add_column_statements(connection, migration)
+        + migration.get("sql", [])
+        + migration.get(dialect, [])
+    )
+
 def migrate_database(engine):
     """Execute database migrations with version tracking"""
     try:
@@ -84,15 +148,8 @@ def migrate_database(engine):
         
         with engine.connect() as connection:
             # Create migrations table if it doesn't exist
-            connection.execute(text("""
-                CREATE TABLE IF NOT EXISTS migrations (
-                    id SERIAL PRIMARY KEY,
-                    version VARCHAR(255) NOT NULL UNIQUE,
-                    description TEXT,
-                    applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
-                    details JSONB
-                );
-            """))
+            dialect = connection.dialect.name
+            connection.execute(text(MIGRATIONS_TABLE.get(dialect, MIGRATIONS_TABLE["postgresql"])))
             connection.commit()
             
             # Get already applied migrations
@@ -113,7 +170,8 @@ def migrate_database(engine):
                 logger.info(f"Applying migration {version}: {migration['description']}")
                 
                 # Execute all SQL statements for this migration
-                for sql in migration["sql"]:
+                statements = migration_statements(connection, migration)
+                for sql in statements:
                     try:
                         connection.execute(text(sql))
                         connection.commit()
@@ -124,7 +182,8 @@ def migrate_database(engine):
                 
                 # Record the migration
                 migration_details = {
-                    "sql_count": len(migration["sql"]),
+                    "sql_count": len(statements),
+                    "dialect": dialect,
                     "applied_by": "system",
                     "timestamp": datetime.now().isoformat()
                 }
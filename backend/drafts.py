@@ -0,0 +1,425 @@
+# drafts.py - Autosaved, in-progress survey answers
+#
+# The client PATCHes answers as the respondent moves through the survey, and
+# the final submit promotes the draft into a submission in one write. Drafts
+# are flat maps of field -> JSON value ("a:<question id>" for answers,
+# "v:<question id>" for recordings) in a key-value store that expires them
+# DRAFT_TTL_SECONDS after their last write:
+#
+#   memory  per-process store with a total memory cap (default, single worker)
+#   redis   a Redis-compatible server at REDIS_URL, shared by all workers
+#           (default with WEB_CONCURRENCY > 1)
+import abc
+import os
+import threading
+import time
+import uuid
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+import metrics
+from responses import dumps, loads
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+DRAFT_BACKEND = (os.getenv("DRAFT_BACKEND") or ("redis" if WEB_CONCURRENCY > 1 else "memory")).lower()
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+DRAFT_TTL_SECONDS = int(os.getenv("DRAFT_TTL_SECONDS", str(24 * 3600)))
+# Encoded size allowed for one draft, and for all drafts of the memory store
+DRAFT_MAX_BYTES = int(os.getenv("DRAFT_MAX_BYTES", str(256 * 1024)))
+DRAFT_MEMORY_LIMIT = int(os.getenv("DRAFT_MEMORY_LIMIT", str(64 * 1024 * 1024)))
+
+ANSWER_PREFIX = "a:"
+AUDIO_PREFIX = "v:"
+
+# Set while a submit promotes the draft, then replaced by the submission id,
+# so a second submit of the same draft can't create another submission
+STATE_FIELD = "_state"
+CLAIMED = b"claimed"
+
+
+class DraftTooLargeError(Exception):
+    """Raised when an update would take a draft past DRAFT_MAX_BYTES"""
+
+
+class DraftClaimedError(Exception):
+    """Raised when claiming a draft that another submit holds or already promoted"""
+
+    def __init__(self, submission_id: Optional[str]):
+        super().__init__(submission_id or "Draft is being submitted")
+        self.submission_id = submission_id  # None while that submit is still running
+
+
+class DraftStore(abc.ABC):
+    """
+    Interface for draft storage. Values are already encoded; None in an update
+    removes the field. Every write restarts the draft's expiry.
+    """
+
+    name = "base"
+
+    @abc.abstractmethod
+    def create(self, draft_id: str):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def update(self, draft_id: str, changes: Dict[str, Optional[bytes]]) -> bool:
+        """Apply changes; False when the draft doesn't exist (or expired)"""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get(self, draft_id: str) -> Optional[Dict[str, bytes]]:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def delete(self, draft_id: str):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def claim(self, draft_id: str) -> Optional[Dict[str, bytes]]:
+        """
+        Set STATE_FIELD to CLAIMED unless it's already set, in one step. Returns
+        the fields from before, None if the draft doesn't exist; the caller
+        holds the claim only if they came back without STATE_FIELD.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def release(self, draft_id: str):
+        """Drop the claim after a failed submit, so the draft can be submitted again"""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def mark_submitted(self, draft_id: str, submission_id: str):
+        """Replace the claimed draft with just its submission id until it expires"""
+        raise NotImplementedError
+
+
+def _submitted(fields: Dict[str, bytes]) -> bool:
+    return fields.get(STATE_FIELD, CLAIMED) != CLAIMED
+
+
+def _size(fields: Dict[str, bytes]) -> int:
+    return sum(len(name) + len(value) for name, value in fields.items())
+
+
+class MemoryDraftStore(DraftStore):
+    """
+    In-process store, also the local stand-in for Redis. Drafts are kept in
+    write order, so expired ones are always at the front; past
+    DRAFT_MEMORY_LIMIT the least recently written drafts are dropped.
+    """
+
+    name = "memory"
+
+    def __init__(self, ttl: float = DRAFT_TTL_SECONDS, memory_limit: int = DRAFT_MEMORY_LIMIT):
+        self.ttl = ttl
+        self.memory_limit = memory_limit
+        self._lock = threading.Lock()
+        # draft id -> [expires at (monotonic), encoded size, fields]
+        self._drafts: "OrderedDict[str, list]" = OrderedDict()
+        self._bytes = 0
+
+    def _drop(self, draft_id: str):
+        entry = self._drafts.pop(draft_id)
+        self._bytes -= entry[1]
+
+    def _purge(self, now: float):
+        while self._drafts:
+            draft_id, entry = next(iter(self._drafts.items()))
+            if entry[0] > now:
+                break
+            self._drop(draft_id)
+            metrics.increment("drafts.expired")
+        while self._bytes > self.memory_limit and len(self._drafts) > 1:
+            self._drop(next(iter(self._drafts)))
+            metrics.increment("drafts.evicted")
+        metrics.set_gauge("drafts.memory_bytes", self._bytes)
+
+    def _live(self, draft_id: str, now: float) -> Optional[list]:
+        entry = self._drafts.get(draft_id)
+        if entry is None or entry[0] <= now:
+            return None
+        return entry
+
+    def create(self, draft_id: str):
+        now = time.monotonic()
+        with self._lock:
+            self._drafts[draft_id] = [now + self.ttl, 0, {}]
+            self._purge(now)
+
+    def update(self, draft_id: str, changes: Dict[str, Optional[bytes]]) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._live(draft_id, now)
+            if entry is None or _submitted(entry[2]):
+                return False
+            fields = entry[2]
+            size = entry[1]
+            for name, value in changes.items():
+                if name in fields:
+                    size -= len(name) + len(fields[name])
+                if value is not None:
+                    size += len(name) + len(value)
+            if size > DRAFT_MAX_BYTES:
+                raise DraftTooLargeError(f"Draft would be {size} bytes, the limit is {DRAFT_MAX_BYTES}")
+            for name, value in changes.items():
+                if value is None:
+                    fields.pop(name, None)
+                else:
+                    fields[name] = value
+            self._bytes += size - entry[1]
+            entry[0], entry[1] = now + self.ttl, size
+            self._drafts.move_to_end(draft_id)
+            self._purge(now)
+            return True
+
+    def get(self, draft_id: str) -> Optional[Dict[str, bytes]]:
+        with self._lock:
+            entry = self._live(draft_id, time.monotonic())
+            if entry is None or _submitted(entry[2]):
+                return None
+            return {name: value for name, value in entry[2].items() if name != STATE_FIELD}
+
+    def delete(self, draft_id: str):
+        with self._lock:
+            if draft_id in self._drafts:
+                self._drop(draft_id)
+
+    def claim(self, draft_id: str) -> Optional[Dict[str, bytes]]:
+        with self._lock:
+            entry = self._live(draft_id, time.monotonic())
+            if entry is None:
+                return None
+            fields = dict(entry[2])
+            # Not counted in the entry's size, it only ever holds a few bytes
+            entry[2].setdefault(STATE_FIELD, CLAIMED)
+            return fields
+
+    def release(self, draft_id: str):
+        with self._lock:
+            entry = self._drafts.get(draft_id)
+            if entry is not None and entry[2].get(STATE_FIELD) == CLAIMED:
+                del entry[2][STATE_FIELD]
+
+    def mark_submitted(self, draft_id: str, submission_id: str):
+        with self._lock:
+            entry = self._drafts.get(draft_id)
+            if entry is not None:
+                self._bytes -= entry[1]
+                entry[1], entry[2] = 0, {STATE_FIELD: submission_id.encode()}
+
+
+class RedisDraftStore(DraftStore):
+    """
+    One hash per draft with a key TTL. Memory is bounded per draft by
+    DRAFT_MAX_BYTES and overall by the server's maxmemory (volatile-ttl
+    evicts the drafts closest to expiring first).
+    """
+
+    name = "redis"
+    SIZE_FIELD = "_bytes"
+
+    # Size check and write in one server-side step: concurrent PATCHes can't
+    # both pass the check, and a draft that expires in between isn't brought
+    # back holding only the latest fields. ARGV is the limit, the TTL, how many
+    # fields are set, then those name/value pairs, then the names to delete.
+    UPDATE_SCRIPT = """
+    local key = KEYS[1]
+    local size = redis.call('HGET', key, '_bytes')
+    if not size then
+        return {0, 0}
+    end
+    size = tonumber(size)
+    local removed_from = 4 + 2 * tonumber(ARGV[3])
+    for i = 4, removed_from - 1, 2 do
+        local old = redis.call('HSTRLEN', key, ARGV[i])
+        if old > 0 then
+            size = size - #ARGV[i] - old
+        end
+        size = size + #ARGV[i] + #ARGV[i + 1]
+    end
+    for i = removed_from, #ARGV do
+        local old = redis.call('HSTRLEN', key, ARGV[i])
+        if old > 0 then
+            size = size - #ARGV[i] - old
+        end
+    end
+    if size > tonumber(ARGV[1]) then
+        return {2, size}
+    end
+    if removed_from > 4 then
+        redis.call('HSET', key, unpack(ARGV, 4, removed_from - 1))
+    end
+    if removed_from <= #ARGV then
+        redis.call('HDEL', key, unpack(ARGV, removed_from))
+    end
+    redis.call('HSET', key, '_bytes', size)
+    redis.call('EXPIRE', key, ARGV[2])
+    return {1, size}
+    """
+    MISSING, SAVED, TOO_LARGE = 0, 1, 2
+
+    # Read and claim in one step; a key that's gone isn't recreated without a TTL
+    CLAIM_SCRIPT = """
+    local fields = redis.call('HGETALL', KEYS[1])
+    if #fields > 0 then
+        redis.call('HSETNX', KEYS[1], ARGV[1], ARGV[2])
+    end
+    return fields
+    """
+
+    def __init__(self, url: str = REDIS_URL, ttl: int = DRAFT_TTL_SECONDS):
+        # Imported lazily so the memory store works without redis installed
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self._update = self.client.register_script(self.UPDATE_SCRIPT)
+        self._claim = self.client.register_script(self.CLAIM_SCRIPT)
+
+    @staticmethod
+    def _key(draft_id: str) -> str:
+        return f"survey:draft:{draft_id}"
+
+    def create(self, draft_id: str):
+        key = self._key(draft_id)
+        with self.client.pipeline() as pipe:
+            pipe.hset(key, self.SIZE_FIELD, 0)
+            pipe.expire(key, self.ttl)
+            pipe.execute()
+
+    def update(self, draft_id: str, changes: Dict[str, Optional[bytes]]) -> bool:
+        mapping = [item for name, value in changes.items() if value is not None for item in (name, value)]
+        removed = [name for name, value in changes.items() if value is None]
+        status, size = self._update(
+            keys=[self._key(draft_id)],
+            args=[DRAFT_MAX_BYTES, self.ttl, len(mapping) // 2, *mapping, *removed],
+        )
+        if status == self.TOO_LARGE:
+            raise DraftTooLargeError(f"Draft would be {size} bytes, the limit is {DRAFT_MAX_BYTES}")
+        return status == self.SAVED
+
+    def get(self, draft_id: str) -> Optional[Dict[str, bytes]]:
+        fields = self.client.hgetall(self._key(draft_id))
+        # A submitted draft keeps only its state field
+        if self.SIZE_FIELD.encode() not in fields:
+            return None
+        return {name.decode(): value for name, value in fields.items() if not name.startswith(b"_")}
+
+    def delete(self, draft_id: str):
+        self.client.delete(self._key(draft_id))
+
+    def claim(self, draft_id: str) -> Optional[Dict[str, bytes]]:
+        flat = self._claim(keys=[self._key(draft_id)], args=[STATE_FIELD, CLAIMED])
+        if not flat:
+            return None
+        return {flat[i].decode(): flat[i + 1] for i in range(0, len(flat), 2) if flat[i] != self.SIZE_FIELD.encode()}
+
+    def release(self, draft_id: str):
+        self.client.hdel(self._key(draft_id), STATE_FIELD)
+
+    def mark_submitted(self, draft_id: str, submission_id: str):
+        key = self._key(draft_id)
+        with self.client.pipeline() as pipe:
+            pipe.delete(key)
+            pipe.hset(key, STATE_FIELD, submission_id)
+            pipe.expire(key, self.ttl)
+            pipe.execute()
+
+
+# Process-wide store, created on first use
+_store: Optional[DraftStore] = None
+_store_lock = threading.Lock()
+
+
+def _create_store() -> DraftStore:
+    if DRAFT_BACKEND == "memory":
+        if WEB_CONCURRENCY > 1:
+            # Saves and resumes would land on different workers and drafts would seem to vanish
+            raise RuntimeError(f"DRAFT_BACKEND=memory can't serve {WEB_CONCURRENCY} workers; use redis")
+        return MemoryDraftStore()
+    if DRAFT_BACKEND == "redis":
+        return RedisDraftStore()
+    raise RuntimeError(f"Unknown DRAFT_BACKEND '{DRAFT_BACKEND}', expected memory or redis")
+
+
+def get_draft_store() -> DraftStore:
+    global _store
+    if _store is not None:
+        return _store
+    with _store_lock:
+        if _store is None:
+            _store = _create_store()
+        return _store
+
+
+def set_draft_store(store: Optional[DraftStore]):
+    """Install a specific store instance (benchmarks, tools)"""
+    global _store
+    _store = store
+
+
+def create_draft() -> str:
+    draft_id = uuid.uuid4().hex
+    get_draft_store().create(draft_id)
+    metrics.increment("drafts.created")
+    return draft_id
+
+
+def save(draft_id: str, answers: Dict[str, Any], audio: Dict[str, Optional[Dict]]) -> bool:
+    """Store changed answers and recordings; None removes one. False if the draft is gone."""
+    changes: Dict[str, Optional[bytes]] = {}
+    for question_id, answer in answers.items():
+        changes[ANSWER_PREFIX + question_id] = None if answer is None else dumps(answer)
+    for question_id, recording in audio.items():
+        changes[AUDIO_PREFIX + question_id] = None if recording is None else dumps(recording)
+    if not changes:
+        return get_draft_store().get(draft_id) is not None
+    saved = get_draft_store().update(draft_id, changes)
+    if saved:
+        metrics.increment("drafts.answers_saved", len(changes))
+    return saved
+
+
+def load(draft_id: str) -> Optional[Dict[str, Dict[str, Any]]]:
+    """{"answers": ..., "audio": ...} for the draft, None if it doesn't exist"""
+    fields = get_draft_store().get(draft_id)
+    if fields is None:
+        return None
+    return _decode(fields)
+
+
+def _decode(fields: Dict[str, bytes]) -> Dict[str, Dict[str, Any]]:
+    draft = {"answers": {}, "audio": {}}
+    for name, value in fields.items():
+        if name.startswith(ANSWER_PREFIX):
+            draft["answers"][name[len(ANSWER_PREFIX):]] = loads(value)
+        elif name.startswith(AUDIO_PREFIX):
+            draft["audio"][name[len(AUDIO_PREFIX):]] = loads(value)
+    return draft
+
+
+def claim(draft_id: str) -> Optional[Dict[str, Dict[str, Any]]]:
+    """
+    Take the draft for promotion, like load(). Raises DraftClaimedError when
+    another submit got it first; release() or mark_submitted() must follow.
+    """
+    fields = get_draft_store().claim(draft_id)
+    if fields is None:
+        return None
+    state = fields.get(STATE_FIELD)
+    if state is not None:
+        raise DraftClaimedError(None if state == CLAIMED else state.decode())
+    return _decode(fields)
+
+
+def release(draft_id: str):
+    get_draft_store().release(draft_id)
+
+
+def mark_submitted(draft_id: str, submission_id: str):
+    get_draft_store().mark_submitted(draft_id, submission_id)
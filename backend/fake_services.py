@@ -0,0 +1,122 @@
+# fake_services.py - Local stand-ins for Google Speech and the recording bucket
+#
+# Used for offline development and benchmarks: SPEECH_BACKEND=fake makes the
+# Speech client pool hand out FakeSpeechClient, STORAGE_BACKEND=memory selects
+# MemoryStorageBackend. Both go through the same code paths as the real
+# services, with configurable latency and injected errors.
+import datetime
+import os
+import random
+import threading
+import time
+from typing import Dict, Iterator, Optional
+
+from audio_storage import RECORDINGS_PREFIX, SIGNED_URL_EXPIRATION, StorageBackend
+
+SAMPLE_RATE = 16000
+
+
+def _env_float(name: str, default: str) -> float:
+    return float(os.getenv(name, default))
+
+
+class _FakeTransport:
+    def close(self):
+        pass
+
+
+class FakeSpeechClient:
+    """
+    Answers recognize/streaming_recognize like SpeechClient, after a delay of
+    FAKE_SPEECH_LATENCY seconds plus FAKE_SPEECH_RTF seconds per audio second.
+    FAKE_SPEECH_ERROR_RATE of calls fail with ServiceUnavailable.
+    """
+
+    def __init__(self, latency: Optional[float] = None, realtime_factor: Optional[float] = None,
+                 error_rate: Optional[float] = None):
+        self.latency = _env_float("FAKE_SPEECH_LATENCY", "0.3") if latency is None else latency
+        self.realtime_factor = _env_float("FAKE_SPEECH_RTF", "0.05") if realtime_factor is None else realtime_factor
+        self.error_rate = _env_float("FAKE_SPEECH_ERROR_RATE", "0") if error_rate is None else error_rate
+        self.transport = _FakeTransport()
+
+    def _maybe_fail(self):
+        if self.error_rate and random.random() < self.error_rate:
+            from google.api_core.exceptions import ServiceUnavailable
+            raise ServiceUnavailable("Injected fake Speech failure")
+
+    @staticmethod
+    def _transcript(seconds: float) -> str:
+        return f"ข้อความทดสอบความยาว {seconds:.1f} วินาที"
+
+    def recognize(self, config=None, audio=None, **kwargs):
+        from google.cloud import speech
+
+        seconds = len(audio.content) / 2 / SAMPLE_RATE
+        time.sleep(self.latency + seconds * self.realtime_factor)
+        self._maybe_fail()
+        alternative = speech.SpeechRecognitionAlternative(transcript=self._transcript(seconds), confidence=0.9)
+        return speech.RecognizeResponse(results=[speech.SpeechRecognitionResult(alternatives=[alternative])])
+
+    def streaming_recognize(self, config=None, requests=None, **kwargs):
+        from google.cloud import speech
+
+        received = 0
+        for request in requests:
+            received += len(request.audio_content)
+            seconds = received / 2 / SAMPLE_RATE
+            alternative = speech.SpeechRecognitionAlternative(transcript=self._transcript(seconds))
+            yield speech.StreamingRecognizeResponse(results=[
+                speech.StreamingRecognitionResult(alternatives=[alternative], is_final=False)
+            ])
+        time.sleep(self.latency)
+        self._maybe_fail()
+        alternative = speech.SpeechRecognitionAlternative(transcript=self._transcript(received / 2 / SAMPLE_RATE))
+        yield speech.StreamingRecognizeResponse(results=[
+            speech.StreamingRecognitionResult(alternatives=[alternative], is_final=True)
+        ])
+
+
+class MemoryStorageBackend(StorageBackend):
+    """In-process bucket with FAKE_STORAGE_LATENCY seconds added to every remote call"""
+
+    name = "memory"
+
+    def __init__(self, latency: Optional[float] = None, error_rate: Optional[float] = None):
+        super().__init__()
+        self.latency = _env_float("FAKE_STORAGE_LATENCY", "0.02") if latency is None else latency
+        self.error_rate = _env_float("FAKE_STORAGE_ERROR_RATE", "0") if error_rate is None else error_rate
+        self._objects: Dict[str, bytes] = {}
+        self._lock = threading.Lock()
+
+    def _round_trip(self):
+        time.sleep(self.latency)
+        if self.error_rate and random.random() < self.error_rate:
+            raise ConnectionError("Injected fake storage failure")
+
+    def exists(self, key: str) -> bool:
+        self._round_trip()
+        with self._lock:
+            return key in self._objects
+
+    def put_file(self, file_obj, key: str, content_type: Optional[str], metadata: Optional[Dict] = None):
+        data = file_obj.read()
+        self._round_trip()
+        with self._lock:
+            self._objects[key] = data
+
+    def get_bytes(self, key: str) -> bytes:
+        self._round_trip()
+        with self._lock:
+            return self._objects[key]
+
+    def list_keys(self, prefix: str = RECORDINGS_PREFIX) -> Iterator[str]:
+        with self._lock:
+            keys = sorted(key for key in self._objects if key.startswith(prefix))
+        yield from keys
+
+    def sign_url(self, key: str, expiration: datetime.timedelta = SIGNED_URL_EXPIRATION) -> str:
+        expires = int(time.time() + expiration.total_seconds())
+        return f"memory://{key}?expires={expires}"
+
+    def probe(self) -> bool:
+        return True
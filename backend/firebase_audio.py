@@ -1,30 +1,36 @@
-import datetime
 import os
+import datetime
 import logging
-from fastapi import UploadFile
 import firebase_admin
 from firebase_admin import credentials, storage
 
+from audio_storage import StorageBackend, UPLOAD_CHUNK_SIZE, SIGNED_URL_EXPIRATION, RECORDINGS_PREFIX
+
 # Set up logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("firebase_audio")
 
-class FirebaseAudioService:
+SERVICE_ACCOUNT_FILENAME = "survey-impower-firebase-adminsdk-fbsvc-061ea178c1.json"
+
+
+class FirebaseAudioService(StorageBackend):
+    name = "firebase"
+
     def __init__(self, service_account_path, bucket_name):
         """
         Initialize Firebase service for audio uploads
-        
+
         Args:
             service_account_path: Path to the service account JSON file
             bucket_name: Name of the Firebase storage bucket
         """
+        super().__init__()
         self.service_account_path = service_account_path
         self.bucket_name = bucket_name
-        
+
         # Log path and bucket for debugging
         logger.info(f"Initializing Firebase with service account: {service_account_path}")
         logger.info(f"Using bucket: {bucket_name}")
-        
+
         # Check if already initialized to avoid multiple initializations
         if not firebase_admin._apps:
             try:
@@ -36,56 +42,82 @@ class FirebaseAudioService:
             except Exception as e:
                 logger.error(f"Error initializing Firebase: {e}")
                 raise
-    
-    async def upload_audio(self, file_obj: UploadFile, user_id: str = "anonymous", question_id: str = "unknown"):
-        """
-        Upload audio file to Firebase Storage and return the URL
-        
-        Args:
-            file_obj: FastAPI UploadFile object
-            user_id: Identifier for the user
-            question_id: Identifier for the question
-            
-        Returns:
-            str: URL to the uploaded file, or None if upload failed
-        """
+
+        # Bucket handle (and its HTTP session) is created once and reused
+        self.bucket = storage.bucket()
+
+        # Signing straight from the service-account key keeps URL generation a
+        # local RSA operation; without it the SDK may call the IAM API per URL
         try:
-            # Create unique filename
-            timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-            destination = f"recordings/{user_id}_{question_id}_{timestamp}.wav"
-            
-            logger.info(f"Uploading file to Firebase: {destination}")
-            logger.info(f"File content type: {file_obj.content_type}")
-            
-            # Get Firebase Storage bucket
-            bucket = storage.bucket()
-            blob = bucket.blob(destination)
-            
-            # Read the file content fully before uploading
-            file_obj.file.seek(0)
-            content = await file_obj.read()
-            logger.info(f"Read {len(content)} bytes from file")
-            
-            # Use upload_from_string instead of upload_from_file
-            logger.info("Using upload_from_string method")
-            blob.upload_from_string(
-                content,
-                content_type=file_obj.content_type
-            )
-            logger.info("Upload successful")
-            
-            # Generate URL with 7-day expiration
-            url = blob.generate_signed_url(
+            self.signing_credentials = credentials.Certificate(service_account_path).get_credential()
+        except Exception as e:
+            logger.warning(f"Falling back to SDK URL signing: {e}")
+            self.signing_credentials = None
+
+    def exists(self, key):
+        return self.bucket.blob(key).exists()
+
+    def put_file(self, file_obj, key, content_type, metadata=None):
+        blob = self.bucket.blob(key)
+        # Setting chunk_size makes the SDK use a resumable upload session and
+        # read the source chunk by chunk instead of all at once
+        blob.chunk_size = UPLOAD_CHUNK_SIZE
+        if metadata:
+            blob.metadata = metadata
+        blob.upload_from_file(file_obj, content_type=content_type, rewind=False)
+
+    def get_bytes(self, key):
+        return self.bucket.blob(key).download_as_bytes()
+
+    def list_keys(self, prefix=RECORDINGS_PREFIX):
+        for blob in self.bucket.list_blobs(prefix=prefix):
+            yield blob.name
+
+    def sign_url(self, key, expiration=SIGNED_URL_EXPIRATION):
+        return self.bucket.blob(key).generate_signed_url(
+            version="v4",
+            expiration=expiration,
+            method="GET",
+            credentials=self.signing_credentials
+        )
+
+    def sign_urls(self, keys, expiration=SIGNED_URL_EXPIRATION):
+        # One absolute expiry for the whole batch; blob handles are local objects
+        expires_at = datetime.datetime.now(datetime.timezone.utc) + expiration
+        return {
+            key: self.bucket.blob(key).generate_signed_url(
                 version="v4",
-                expiration=datetime.timedelta(days=7),
-                method="GET"
+                expiration=expires_at,
+                method="GET",
+                credentials=self.signing_credentials
             )
-            
-            logger.info(f"Generated signed URL: {url[:60]}...")
-            return url
-            
-        except Exception as e:
-            import traceback
-            logger.error(f"Error uploading audio to Firebase: {e}")
-            logger.error(traceback.format_exc())
-            return None
\ No newline at end of file
+            for key in keys
+        }
+
+    def probe(self):
+        return self.bucket.exists()
+
+
+def _service_account_candidates():
+    return [
+        os.environ.get("FIREBASE_SERVICE_ACCOUNT_PATH", ""),  # From environment variable
+        f"./service_accounts/{SERVICE_ACCOUNT_FILENAME}",  # Original path
+        f"../service_accounts/{SERVICE_ACCOUNT_FILENAME}",  # One directory up
+        f"./service-accounts/{SERVICE_ACCOUNT_FILENAME}",  # Alternative path with hyphen
+    ]
+
+
+def create_firebase_backend():
+    """Find the service account file and build the Firebase backend"""
+    bucket_name = os.environ.get("FIREBASE_BUCKET_NAME", "survey-impower.firebasestorage.app")
+    for path in _service_account_candidates():
+        if path and os.path.isfile(path):
+            logger.info(f"Found service account file at: {path}")
+            try:
+                return FirebaseAudioService(path, bucket_name)
+            except Exception as e:
+                logger.error(f"Failed to create Firebase service with path {path}: {str(e)}")
+
+    raise RuntimeError(
+        f"Firebase storage is not configured: no valid service account file found (cwd: {os.getcwd()})"
+    )
@@ -1,37 +1,67 @@
 # google_speech_service_improved.py - Simplified version
-from fastapi import APIRouter, UploadFile, File, HTTPException, BackgroundTasks
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, UploadFile, File, HTTPException, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.encoders import jsonable_encoder
+from fastapi.concurrency import run_in_threadpool
 import os
 import logging
-import tempfile
 import subprocess
 import json
+import queue
+import asyncio
+from datetime import datetime
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
 import uuid
 
+import anyio
+from starlette.requests import ClientDisconnect
+
+import metrics
+from audio_conversion import AudioConversionError, to_linear16
+from audio_processing import preprocess
+from recognition import STREAM_END, recognize_pcm, streaming_recognize
+from speech_client import SpeechNotConfiguredError, speech_clients
+from transcription_cache import cache_key, transcription_cache
+from transcription_jobs import COMPLETED, FAILED, TranscriptionQueue, QueueFullError
+
 # Configure logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Create router for transcription endpoints
 router = APIRouter()
 
 # Models for transcription responses
+class TranscriptSegment(BaseModel):
+    start: float  # seconds from the start of the clip
+    end: float
+    transcript: str
+
 class TranscriptionResponse(BaseModel):
     id: str
     transcript: str
     language: Optional[str] = None
     status: str = "completed"
+    segments: Optional[List[TranscriptSegment]] = None
+    cached: bool = False
+    audio_seconds_removed: Optional[float] = None  # silence trimmed before recognition
 
-# Background task to clean up temporary files
-def remove_temp_file(file_path: str):
-    try:
-        if os.path.exists(file_path):
-            os.unlink(file_path)
-            logger.info(f"Temp file removed: {file_path}")
-    except Exception as e:
-        logger.error(f"Error removing temp file: {e}")
+class TranscriptionJobStatus(BaseModel):
+    job_id: str
+    status: str  # queued, running, completed, failed
+    language: Optional[str] = None
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+    result: Optional[TranscriptionResponse] = None
+    error: Optional[str] = None
+
+# How long POST /transcribe waits for its job before falling back
+SYNC_TRANSCRIPTION_TIMEOUT = float(os.getenv("SYNC_TRANSCRIPTION_TIMEOUT", "60"))
+# Upper bound for long-polling a job status
+MAX_JOB_WAIT_SECONDS = 30
+SSE_KEEPALIVE_SECONDS = 15
+# Google closes a streaming session after about five minutes of audio
+MAX_STREAM_SECONDS = int(os.getenv("MAX_STREAM_SECONDS", "290"))
 
 # Check if ffmpeg is installed
 def is_ffmpeg_installed():
@@ -88,146 +118,258 @@ def convert_audio_for_google(input_path, output_path):
         logger.error(f"Error converting audio: {str(e)}")
         return False, str(e)
 
-# Main transcription endpoint
-# Replace the transcribe_audio endpoint in google_speech_service_improved.py
+# Blocking transcription pipeline - runs on the transcription worker pool,
+# never directly on the event loop
+def cached_transcription(key: str, request_id: str, count_miss: bool = True) -> Optional[TranscriptionResponse]:
+    """Previously recognised transcript for identical audio, language and config"""
+    cached = transcription_cache.get(key, count_miss=count_miss)
+    if cached is None:
+        return None
+    logger.info(f"Transcription cache hit for {request_id}")
+    return TranscriptionResponse(
+        id=request_id,
+        transcript=cached["transcript"],
+        language=cached["language"],
+        status="completed",
+        segments=[TranscriptSegment(**segment) for segment in cached["segments"]],
+        cached=True
+    )
+
+
+def run_transcription(content: bytes, language: str, request_id: str) -> TranscriptionResponse:
+    """
+    Full conversion and recognition for one clip, entirely in memory. Falls
+    back to a demo transcription when the audio or the Google API can't be used.
+    """
+    file_size = len(content)
+
+    # If file is very small, it might be empty or corrupted
+    if file_size < 100:
+        logger.warning(f"File is suspiciously small ({file_size} bytes)")
+        return get_demo_transcription(request_id, language)
+
+    key = cache_key(content, language)
+    cached = cached_transcription(key, request_id)
+    if cached is not None:
+        return cached
+
+    try:
+        with metrics.timed("transcription.stage.convert.seconds"):
+            audio_content = to_linear16(content)
+    except AudioConversionError as e:
+        logger.error(f"Audio conversion failed for {request_id}: {e}")
+        return get_demo_transcription(request_id, language)
+
+    # Trim silence and normalise loudness so fewer, clearer seconds are billed
+    with metrics.timed("transcription.stage.preprocess.seconds"):
+        audio = preprocess(audio_content)
+    metrics.observe("audio.preprocess.seconds_removed", audio.seconds_removed)
+    logger.info(
+        f"{request_id}: preprocessing removed {audio.seconds_removed:.1f}s of "
+        f"{audio.original_seconds:.1f}s, gain {audio.gain_db:+.1f} dB"
+    )
+
+    try:
+        with metrics.timed("transcription.stage.recognize.seconds"):
+            transcript, segments, failed = recognize_pcm(audio.pcm, language, request_id)
+    except Exception as e:
+        logger.error(f"Error during speech recognition: {str(e)}")
+        return get_demo_transcription(request_id, language)
+
+    if not transcript:
+        logger.warning("No speech detected")
+        return get_demo_transcription(request_id, language)
+
+    # Segment offsets refer to the compacted audio, report them against the upload
+    segments = [
+        dict(segment, start=audio.to_original(segment["start"]), end=audio.to_original(segment["end"]))
+        for segment in segments
+    ]
 
+    logger.info(f"Full transcription: '{transcript}'")
+    if failed:
+        # Return what was recognised, but let the next request try the whole clip again
+        logger.warning(f"{request_id}: {failed} segments failed, not caching the partial transcript")
+    else:
+        transcription_cache.put(key, language, transcript, segments)
+    return TranscriptionResponse(
+        id=request_id,
+        transcript=transcript,
+        language=language,
+        status="completed",
+        segments=[TranscriptSegment(**segment) for segment in segments],
+        audio_seconds_removed=round(audio.seconds_removed, 2)
+    )
+
+
+# Process-wide worker pool shared by the sync and job endpoints
+transcription_queue = TranscriptionQueue(run_transcription)
+
+
+def _queue_full_response(error: QueueFullError):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(error)},
+        headers={"Retry-After": str(error.retry_after)},
+    )
+
+
+# Main transcription endpoint - runs through the job queue and waits for the result
 @router.post("/transcribe", response_model=TranscriptionResponse)
 async def transcribe_audio(
-    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     language: str = "th-TH"
 ):
     """
-    Transcribe audio using Google Speech-to-Text, using a cleaner approach
-    based on Google's reference implementation
+    Transcribe audio using Google Speech-to-Text. The work is done by the
+    transcription worker pool; this request just waits for its job.
     """
     logger.info(f"Received transcription request - File: {file.filename}, Language: {language}")
-    
-    try:
-        # Create a unique request ID
-        request_id = f"req_{uuid.uuid4().hex[:8]}"
-        
-        # Save uploaded file to temp directory
-        with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(file.filename)[1]) as temp_file:
-            original_path = temp_file.name
-            content = await file.read()
-            temp_file.write(content)
-            file_size = len(content)
-            logger.info(f"Saved uploaded file ({file_size} bytes) to {original_path}")
-        
-        # Schedule cleanup of temp file
-        background_tasks.add_task(remove_temp_file, original_path)
-        
-        # If file is very small, it might be empty or corrupted
-        if file_size < 100:
-            logger.warning(f"File is suspiciously small ({file_size} bytes)")
-            return get_demo_transcription(request_id, language)
-        
-        # Create another temp file for converted audio
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as converted_file:
-            converted_path = converted_file.name
-            logger.info(f"Created output path for WAV: {converted_path}")
-        
-        # Schedule cleanup of converted file
-        background_tasks.add_task(remove_temp_file, converted_path)
-        
-        # Convert to WAV with proper format for Google Speech API
-        command = [
-            "ffmpeg",
-            "-i", original_path,         # Input file
-            "-ar", "16000",              # Sample rate: 16kHz (required by Google)
-            "-ac", "1",                  # Channels: mono (required by Google)
-            "-acodec", "pcm_s16le",      # Codec: PCM signed 16-bit little-endian (LINEAR16)
-            "-af", "volume=2.0",         # Boost volume to help speech detection
-            "-f", "wav",                 # Output format: WAV
-            "-y",                        # Overwrite output files without asking
-            converted_path               # Output file
-        ]
-        
-        # Run the conversion
-        process = subprocess.run(
-            command,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-            check=False,
-            timeout=30
+
+    content = await file.read()
+
+    # Identical audio never needs converting or recognising again
+    if len(content) >= 100:
+        request_id = f"req_{uuid.uuid4().hex[:12]}"
+        cached = await run_in_threadpool(
+            lambda: cached_transcription(cache_key(content, language), request_id, count_miss=False)
         )
-        
-        if process.returncode != 0:
-            logger.error(f"Audio conversion failed: {process.stderr}")
-            return get_demo_transcription(request_id, language)
-        
-        # Following Google's sample code more closely
+        if cached is not None:
+            return cached
+
+    try:
+        job = transcription_queue.submit(content, language)
+    except QueueFullError as e:
+        return _queue_full_response(e)
+
+    await transcription_queue.wait(job, timeout=SYNC_TRANSCRIPTION_TIMEOUT)
+    if job.result is None:
+        logger.error(f"Transcription job {job.id} did not finish: {job.status} {job.error or ''}")
+        return get_demo_transcription(job.id, language)
+    return job.result
+
+
+@router.post("/transcribe/jobs", status_code=202, response_model=TranscriptionJobStatus)
+async def submit_transcription_job(
+    file: UploadFile = File(...),
+    language: str = "th-TH"
+):
+    """Queue a clip for transcription and return its job id immediately"""
+    content = await file.read()
+    try:
+        job = transcription_queue.submit(content, language)
+    except QueueFullError as e:
+        return _queue_full_response(e)
+    return job.status_payload()
+
+
+@router.get("/transcribe/jobs/{job_id}", response_model=TranscriptionJobStatus)
+async def get_transcription_job(job_id: str, wait: float = 0):
+    """Job status; with wait > 0 the request long-polls until the job finishes"""
+    payload = await transcription_queue.lookup(job_id, wait=min(max(wait, 0), MAX_JOB_WAIT_SECONDS))
+    if payload is None:
+        raise HTTPException(status_code=404, detail="Transcription job not found")
+    return payload
+
+
+@router.get("/transcribe/jobs/{job_id}/events")
+async def transcription_job_events(job_id: str):
+    """Server-sent events stream that pushes the job status once it finishes"""
+    payload = await transcription_queue.lookup(job_id)
+    if payload is None:
+        raise HTTPException(status_code=404, detail="Transcription job not found")
+
+    async def event_stream():
+        status = payload
+        yield f"event: status\ndata: {json.dumps(jsonable_encoder(status), ensure_ascii=False)}\n\n"
+        while status["status"] not in (COMPLETED, FAILED):
+            latest = await transcription_queue.lookup(job_id, wait=SSE_KEEPALIVE_SECONDS)
+            if latest is None:
+                # Expired from the shared store while we waited
+                break
+            status = latest
+            if status["status"] not in (COMPLETED, FAILED):
+                yield ": keep-alive\n\n"
+        yield f"event: done\ndata: {json.dumps(jsonable_encoder(status), ensure_ascii=False)}\n\n"
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+
+class DuplexStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse that leaves receive() to the handler. The stock response
+    reads receive() to watch for disconnects, which would swallow the request
+    body chunks the handler is still consuming.
+    """
+
+    async def listen_for_disconnect(self, receive):
+        await anyio.sleep_forever()
+
+
+@router.post("/transcribe/stream")
+async def transcribe_stream(request: Request, language: str = "th-TH", interim: bool = True):
+    """
+    Live transcription. The request body is raw 16 kHz mono LINEAR16 audio
+    uploaded as it's captured (chunked transfer); the response streams one JSON
+    result per line as Google recognises it, interim results included.
+    """
+    loop = asyncio.get_running_loop()
+    audio_chunks = queue.Queue()
+    results = asyncio.Queue()
+    max_bytes = MAX_STREAM_SECONDS * 16000 * 2
+
+    def recognize():
         try:
-            from google.cloud import speech
-            from google.oauth2 import service_account
-            
-            # Set up credentials
-            creds_json = os.getenv("GOOGLE_CREDENTIALS_JSON", "")
-            if not creds_json:
-                logger.error("Google credentials not found in environment")
-                return get_demo_transcription(request_id, language)
-            
-            # Create client
-            creds_info = json.loads(creds_json)
-            credentials = service_account.Credentials.from_service_account_info(creds_info)
-            client = speech.SpeechClient(credentials=credentials)
-            
-            # Read audio file directly, matching Google's sample code
-            with open(converted_path, "rb") as audio_file:
-                audio_content = audio_file.read()
-            
-            # Create recognition audio from content
-            audio = speech.RecognitionAudio(content=audio_content)
-            
-            # Create recognition config
-            config = speech.RecognitionConfig(
-                encoding=speech.RecognitionConfig.AudioEncoding.LINEAR16,
-                sample_rate_hertz=16000,
-                language_code=language,
-                enable_automatic_punctuation=True,
-                use_enhanced=True,
-                model="default"
-            )
-            
-            # Perform recognition
-            logger.info(f"Sending recognition request to Google API for {request_id}")
-            response = client.recognize(config=config, audio=audio)
-            
-            # Process all results, following Google's approach
-            full_transcript = ""
-            
-            # Process each result (sequential segments of audio)
-            for i, result in enumerate(response.results):
-                # Get the top alternative for this segment
-                if result.alternatives:
-                    segment_transcript = result.alternatives[0].transcript
-                    logger.info(f"Result {i+1}: {segment_transcript}")
-                    full_transcript += segment_transcript + " "
-            
-            # Trim extra whitespace
-            full_transcript = full_transcript.strip()
-            
-            if full_transcript:
-                logger.info(f"Full transcription: '{full_transcript}'")
-                return TranscriptionResponse(
-                    id=request_id,
-                    transcript=full_transcript,
-                    language=language,
-                    status="completed"
-                )
-            else:
-                logger.warning("No speech detected")
-                return get_demo_transcription(request_id, language)
-                
+            for result in streaming_recognize(audio_chunks, language, interim_results=interim):
+                loop.call_soon_threadsafe(results.put_nowait, result)
+        except SpeechNotConfiguredError as e:
+            loop.call_soon_threadsafe(results.put_nowait, {"error": str(e)})
         except Exception as e:
-            logger.error(f"Error during speech recognition: {str(e)}")
-            return get_demo_transcription(request_id, language)
-                
-    except Exception as e:
-        logger.error(f"Unexpected error in transcription endpoint: {e}")
-        return get_demo_transcription(request_id, language)
+            logger.error(f"Streaming recognition failed: {str(e)}")
+            loop.call_soon_threadsafe(results.put_nowait, {"error": "Streaming recognition failed"})
+        finally:
+            loop.call_soon_threadsafe(results.put_nowait, STREAM_END)
+
+    async def feed_audio():
+        received = 0
+        try:
+            async for chunk in request.stream():
+                if not chunk:
+                    continue
+                received += len(chunk)
+                if received > max_bytes:
+                    logger.warning(f"Streaming audio exceeded {MAX_STREAM_SECONDS}s, closing the stream")
+                    break
+                audio_chunks.put(chunk)
+        except ClientDisconnect:
+            logger.info("Client disconnected during streaming transcription")
+        finally:
+            audio_chunks.put(STREAM_END)
+
+    async def result_stream():
+        worker = loop.run_in_executor(None, recognize)
+        feeder = asyncio.create_task(feed_audio())
+        failed = False
+        try:
+            while True:
+                result = await results.get()
+                if result is STREAM_END:
+                    break
+                yield json.dumps(result, ensure_ascii=False) + "\n"
+        finally:
+            feeder.cancel()
+            # Ends the recognizer's audio, so the worker never outlives the response
+            audio_chunks.put(STREAM_END)
+            try:
+                await worker
+            except Exception as e:
+                logger.error(f"Streaming recognition worker failed: {str(e)}")
+                failed = True
+        # Only reached when the stream wasn't closed early by the client
+        if failed:
+            yield json.dumps({"error": "Streaming recognition failed"}) + "\n"
+
+    return DuplexStreamingResponse(result_stream(), media_type="application/x-ndjson")
 
 # Check server status endpoint
 @router.get("/transcription-status")
@@ -270,13 +412,29 @@ async def transcription_status():
         "google_credentials_available": bool(creds_json),
         "google_credentials_valid_format": creds_valid,
         "credentials_sample": sample,
-        "speech_library_installed": speech_library_installed
+        "speech_library_installed": speech_library_installed,
+        "speech_clients": speech_clients.stats(),
+        "transcription_cache": transcription_cache.stats()
     }
 
 # Function to add these routes to the main FastAPI app
 def setup_improved_speech_routes(app):
-    """Register transcription routes with the main FastAPI app"""
+    """Register transcription routes and the worker pool lifecycle with the main FastAPI app"""
     app.include_router(router, prefix="/api", tags=["speech"])
+    app.add_event_handler("startup", transcription_queue.start)
+    app.add_event_handler("startup", warm_speech_clients)
+    app.add_event_handler("shutdown", transcription_queue.stop)
+
+
+async def warm_speech_clients():
+    """Open the pooled Speech channels before the first clip arrives"""
+    if not os.getenv("GOOGLE_CREDENTIALS_JSON"):
+        logger.info("Google credentials not configured, skipping Speech client warm-up")
+        return
+    try:
+        await run_in_threadpool(speech_clients.warm)
+    except Exception as e:
+        logger.warning(f"Speech client warm-up failed: {e}")
 
 # Replace the get_demo_transcription function in google_speech_service_improved.py
 
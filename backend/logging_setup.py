@@ -0,0 +1,210 @@
+# logging_setup.py - One logging configuration for the app and the CLIs
+#
+# Records are filtered and tagged on the calling thread, then handed to a
+# QueueHandler; a QueueListener thread formats them and does the actual write,
+# so request handlers never block on stdout. Output is one JSON object per line
+# (LOG_FORMAT=text for local reading) carrying the current request id. Below
+# WARNING, each call site may log LOG_RATE_LIMIT records per LOG_RATE_WINDOW
+# seconds; the rest are dropped and counted on the next record that gets out.
+import atexit
+import contextvars
+import copy
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+import uuid
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional
+
+import metrics
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# Per-logger overrides, e.g. "crud=DEBUG,sqlalchemy.engine=INFO"
+LOG_LEVELS = os.getenv("LOG_LEVELS", "")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+LOG_RATE_LIMIT = int(os.getenv("LOG_RATE_LIMIT", "50"))
+LOG_RATE_WINDOW = float(os.getenv("LOG_RATE_WINDOW", "10"))
+
+# Set by RequestIdMiddleware for the duration of each request
+request_id_var: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("request_id", default=None)
+
+# Attributes every LogRecord has; anything else was passed with extra= and is logged as a field
+_RECORD_FIELDS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "request_id", "suppressed"}
+
+_state = {"listener": None, "queue": None}
+
+
+def parse_levels(spec: str) -> Dict[str, str]:
+    levels = {}
+    for part in spec.split(","):
+        name, _, level = part.strip().partition("=")
+        if name and level:
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+class RequestIdFilter(logging.Filter):
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        return True
+
+
+class RateLimitFilter(logging.Filter):
+    """Caps INFO/DEBUG records per call site; warnings and errors always pass"""
+
+    def __init__(self, limit: int = LOG_RATE_LIMIT, window: float = LOG_RATE_WINDOW):
+        super().__init__()
+        self.limit = limit
+        self.window = window
+        self._sites: Dict[tuple, list] = {}  # site -> [window start, count, suppressed]
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if self.limit <= 0 or record.levelno >= logging.WARNING:
+            return True
+        site = (record.name, record.pathname, record.lineno)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._sites.get(site)
+            if entry is None or now - entry[0] >= self.window:
+                suppressed = entry[2] if entry else 0
+                self._sites[site] = [now, 1, 0]
+                if suppressed:
+                    record.suppressed = suppressed
+                return True
+            if entry[1] < self.limit:
+                entry[1] += 1
+                return True
+            entry[2] += 1
+        metrics.increment("logging.suppressed")
+        return False
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        if getattr(record, "suppressed", None):
+            entry["suppressed"] = record.suppressed
+        for key, value in vars(record).items():
+            if key not in _RECORD_FIELDS:
+                entry[key] = value
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s")
+
+
+class _QueueHandler(QueueHandler):
+    def prepare(self, record):
+        # Resolve the message and traceback now, on the caller's thread, but keep
+        # them apart so the formatter on the listener thread can place them
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class RequestIdMiddleware:
+    """Tags each request's log records with X-Request-ID, generating one if absent"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == b"x-request-id":
+                # Bounded so a client can't push arbitrary text into every log line
+                request_id = value.decode("latin-1")[:64]
+                break
+        request_id = request_id or uuid.uuid4().hex
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(b"x-request-id", request_id.encode("latin-1"))]
+            await send(message)
+
+        token = request_id_var.set(request_id)
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            request_id_var.reset(token)
+
+
+def _start_listener():
+    log_queue = queue.SimpleQueue()
+    # stderr like basicConfig did, keeping stdout free for the CLIs' JSON reports
+    output = logging.StreamHandler(sys.stderr)
+    output.setFormatter(TextFormatter() if LOG_FORMAT == "text" else JsonFormatter())
+    listener = QueueListener(log_queue, output, respect_handler_level=False)
+    listener.start()
+    _state["queue"], _state["listener"] = log_queue, listener
+    return log_queue
+
+
+def _restart_in_child():
+    """Forked children (process pools) don't inherit the listener thread"""
+    if _state["listener"] is None:
+        return
+    log_queue = _start_listener()
+    for handler in logging.getLogger().handlers:
+        if isinstance(handler, _QueueHandler):
+            handler.queue = log_queue
+
+
+def configure_logging():
+    """Route all logging through the queue; safe to call more than once"""
+    if _state["listener"] is not None:
+        return
+
+    handler = _QueueHandler(_start_listener())
+    handler.addFilter(RequestIdFilter())
+    handler.addFilter(RateLimitFilter())
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(LOG_LEVEL)
+
+    # uvicorn installs its own stdout handlers; send its records through the queue too
+    for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        uvicorn_logger = logging.getLogger(name)
+        uvicorn_logger.handlers.clear()
+        uvicorn_logger.propagate = True
+
+    for name, level in parse_levels(LOG_LEVELS).items():
+        logging.getLogger(name).setLevel(level)
+
+    atexit.register(shutdown)
+    os.register_at_fork(after_in_child=_restart_in_child)
+
+
+def shutdown():
+    """Flush queued records"""
+    listener = _state["listener"]
+    if listener is not None:
+        _state["listener"] = None
+        listener.stop()
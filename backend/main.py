@@ -1,22 +1,42 @@
-from fastapi import FastAPI, HTTPException, Depends, status
+import logging_setup
+
+# First, so records logged while the modules below import (database connection,
+# storage backends) go through the same handler
+logging_setup.configure_logging()
+
+from fastapi import FastAPI, HTTPException, Depends, Query, Body, Request, status
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.orm import Session
 from sqlalchemy import inspect
-from typing import List, Dict
-import uuid
+from typing import List, Optional
+import asyncio
+import time
 import json, os
-from fastapi.responses import JSONResponse
-from fastapi.encoders import jsonable_encoder
+from fastapi.responses import FileResponse
+from responses import PreencodedJSONResponse, ThaiJSONResponse
 from google_speech_service_improved import setup_improved_speech_routes
 import datetime
 
-import crud, models, schemas
+import crud, models, schemas, serializers
+import answer_tallies
+import answer_validation
+import bulk_loader
+import compression
+import drafts
+import questionnaire_cache
+import questionnaire_snapshots
 from database import engine, get_db
 from db_migration import migrate_database
 
+from audio_upload import router as audio_upload_router
 from auth_routes import router as auth_router
-from fastapi import APIRouter, UploadFile, File, Form
-from firebase_audio import FirebaseAudioService
+from auth_security import require_role
+from survey_bootstrap import router as bootstrap_router
+from fastapi import APIRouter, UploadFile, File
+import audio_storage
+from audio_storage import get_storage_backend
+import metrics
+import playback_urls
 import logging
 
 app = FastAPI()
@@ -29,7 +49,10 @@ setup_improved_speech_routes(app)
 
 app.include_router(auth_router)
 
-logging.basicConfig(level=logging.INFO)
+app.include_router(bootstrap_router)
+
+app.include_router(audio_upload_router)
+
 logger = logging.getLogger("firebase_upload")
 
 # Enable CORS
@@ -40,83 +63,15 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(compression.CompressionMiddleware)
+app.add_middleware(logging_setup.RequestIdMiddleware)
 
 try:
     import google.cloud.speech
     GOOGLE_SPEECH_AVAILABLE = True
 except ImportError:
     GOOGLE_SPEECH_AVAILABLE = False
-    print("WARNING: Google Cloud Speech libraries not installed. Speech-to-text features will be limited.")
-
-def get_firebase_service():
-    """
-    Get a configured Firebase service with improved error handling and logging
-    """
-    import os
-    import logging
-    
-    # Set up logging
-    logger = logging.getLogger("firebase_service")
-    logger.setLevel(logging.INFO)
-    
-    # Define potential paths for the service account file
-    potential_paths = [
-        "./service_accounts/survey-impower-firebase-adminsdk-fbsvc-061ea178c1.json",  # Original path
-        "../service_accounts/survey-impower-firebase-adminsdk-fbsvc-061ea178c1.json", # One directory up
-        "./service-accounts/survey-impower-firebase-adminsdk-fbsvc-061ea178c1.json",  # Alternative path with hyphen
-        os.path.join(os.getcwd(), "service_accounts/survey-impower-firebase-adminsdk-fbsvc-061ea178c1.json"), # Absolute path
-        os.environ.get("FIREBASE_SERVICE_ACCOUNT_PATH", "")  # From environment variable
-    ]
-    
-    # Firebase bucket name
-    bucket_name = os.environ.get("FIREBASE_BUCKET_NAME", "survey-impower.firebasestorage.app")
-    
-    # Try each path
-    for path in potential_paths:
-        if path and os.path.isfile(path):
-            logger.info(f"Found service account file at: {path}")
-            try:
-                # Try to create the service
-                from firebase_audio import FirebaseAudioService
-                service = FirebaseAudioService(path, bucket_name)
-                logger.info(f"Firebase service created successfully with bucket: {bucket_name}")
-                return service
-            except Exception as e:
-                logger.error(f"Failed to create Firebase service with path {path}: {str(e)}")
-    
-    logger.error("No valid service account file found in any of the potential paths")
-    logger.info(f"Current directory: {os.getcwd()}")
-    
-    # Check if service_accounts directory exists
-    if os.path.isdir("./service_accounts"):
-        logger.info("service_accounts directory exists, listing contents:")
-        for file in os.listdir("./service_accounts"):
-            logger.info(f"  - {file}")
-    else:
-        logger.warning("service_accounts directory does not exist")
-        # Try to create it
-        try:
-            os.makedirs("./service_accounts", exist_ok=True)
-            logger.info("Created service_accounts directory")
-        except Exception as dir_error:
-            logger.error(f"Failed to create service_accounts directory: {str(dir_error)}")
-    
-    # Return a dummy service that will log errors but not crash
-    from firebase_audio import FirebaseAudioService
-    logger.warning("Using dummy Firebase service. Uploads will fail but application will continue.")
-    
-    dummy_path = "./service_accounts/dummy.json"
-    # Create a minimal dummy file to avoid crashing
-    if not os.path.exists(dummy_path):
-        try:
-            import json
-            with open(dummy_path, 'w') as f:
-                json.dump({"dummy": True}, f)
-            logger.info("Created dummy service account file")
-        except Exception as write_error:
-            logger.error(f"Failed to create dummy file: {str(write_error)}")
-    
-    return FirebaseAudioService(dummy_path, bucket_name)
+    logger.warning("Google Cloud Speech libraries not installed. Speech-to-text features will be limited.")
 
 @app.get("/api/firebase-test")
 async def firebase_direct_test():
@@ -126,27 +81,19 @@ async def firebase_direct_test():
         test_content = b"This is a test file"
         filename = f"test_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
         
-        # Get Firebase service
-        firebase_service = get_firebase_service()
-        
-        # Get bucket and create blob
-        from firebase_admin import storage
-        bucket = storage.bucket()
-        blob = bucket.blob(f"test/{filename}")
+        # Get the shared storage backend
+        backend = get_storage_backend()
         
         # Upload directly
-        blob.upload_from_string(test_content, content_type="text/plain")
+        import io
+        backend.put_file(io.BytesIO(test_content), f"test/{filename}", "text/plain")
         
         # Generate URL
-        url = blob.generate_signed_url(
-            version="v4",
-            expiration=datetime.timedelta(days=1),
-            method="GET"
-        )
+        url = backend.sign_url(f"test/{filename}", expiration=datetime.timedelta(days=1))
         
         return {
             "success": True,
-            "message": "Direct upload successful",
+            "message": f"Direct upload to {backend.name} storage successful",
             "url": url,
             "path": f"test/{filename}"
         }
@@ -158,51 +105,6 @@ async def firebase_direct_test():
             "traceback": traceback.format_exc()
         }
 
-@app.post("/api/upload-audio")
-async def upload_audio(
-    file: UploadFile = File(...),
-    question_id: str = Form(...),
-    user_id: str = Form("anonymous"),
-):
-    """Upload audio file to Firebase Storage and return the URL"""
-
-    print("=" * 50)
-    print(f"AUDIO UPLOAD ATTEMPT for {question_id} from {user_id}")
-    print(f"Content type: {file.content_type}, Size: {file.size} bytes")
-    print("=" * 50)
-
-    try:
-        print(f"Received audio upload request for question {question_id} from {user_id}")
-        print(f"File content type: {file.content_type}")
-        
-        # Get Firebase service with error handling
-        try:
-            firebase_service = get_firebase_service()
-            print("Firebase service initialized successfully")
-        except Exception as firebase_init_error:
-            error_details = str(firebase_init_error)
-            print(f"Firebase initialization error: {error_details}")
-            return {"success": False, "error": f"Firebase initialization error: {error_details}"}
-        
-        # Upload to Firebase with detailed error handling
-        try:
-            url = await firebase_service.upload_audio(file, user_id, question_id)
-            if url:
-                print(f"Upload successful: {url[:60]}...")
-                return {"success": True, "url": url}
-            else:
-                print("Upload failed - no URL returned")
-                return {"success": False, "error": "Upload failed - no URL returned"}
-        except Exception as upload_error:
-            error_details = str(upload_error)
-            print(f"Firebase upload error: {error_details}")
-            return {"success": False, "error": f"Firebase upload error: {error_details}"}
-            
-    except Exception as e:
-        error_details = str(e)
-        print(f"Unexpected error in upload endpoint: {error_details}")
-        return {"success": False, "error": f"Server error: {error_details}"}
-
 @router.get("/test-firebase")  # Note: no /api prefix for simplicity
 async def test_firebase_connection():
     """Simple endpoint to test Firebase configuration"""
@@ -242,6 +144,25 @@ async def test_firebase_connection():
             "traceback": traceback.format_exc()
         }
 
+@app.get("/api/storage/health")
+def storage_health():
+    """Cached storage health, refreshed in the background"""
+    return audio_storage.get_storage_health()
+
+@app.get("/api/storage/local/{key:path}")
+def local_storage_object(key: str):
+    """Serve recordings when the local storage backend is in use"""
+    backend = get_storage_backend()
+    if not isinstance(backend, audio_storage.LocalStorageBackend):
+        raise HTTPException(status_code=404, detail="Local storage is not enabled")
+    try:
+        path = backend.path_for(key)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid storage key")
+    if not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="Object not found")
+    return FileResponse(path)
+
 @app.get("/api/check-routes")
 def check_routes():
     """Check if all required routes are registered"""
@@ -266,62 +187,12 @@ async def credentials_format():
         "tip": "Format the credentials as a single line in the .env file without surrounding quotes"
     }
     
-class ThaiJSONResponse(JSONResponse):
-    def render(self, content):
-        # Use ensure_ascii=False to properly handle Thai characters
-        return json.dumps(
-            content,
-            ensure_ascii=False,
-            allow_nan=False,
-            indent=None,
-            separators=(",", ":"),
-        ).encode("utf-8")
-
 @app.put("/api/admin/questions/order")
 def admin_update_question_order(order_data: schemas.QuestionOrderUpdate, db: Session = Depends(get_db)):
     """Update the order of questions"""
     updated_questions = crud.update_question_order(db, order_data.questions)
-    return [prepare_question_for_response(q) for q in updated_questions]
-
-def prepare_question_for_response(db_question):
-    """Convert SQLAlchemy Question model to Pydantic Question schema."""
-    if db_question is None:
-        return None
-    
-    # Handle options field
-    options = db_question.options
-    if options and isinstance(options, str):
-        try:
-            options = json.loads(options)
-        except json.JSONDecodeError:
-            options = []
-    
-    # Handle logic field
-    logic = db_question.logic
-    if logic and isinstance(logic, str):
-        try:
-            logic = json.loads(logic)
-        except json.JSONDecodeError:
-            logic = []
-    
-    min_selections = 0
-    if hasattr(db_question, 'min_selections'):
-        min_selections = db_question.min_selections
-    
-    # Create Pydantic model with explicit field mapping
-    return schemas.Question(
-        id=db_question.id,
-        questionType=db_question.question_type,
-        questionText=db_question.question_text,
-        questionSubtext=db_question.question_subtext,
-        options=options,
-        logic=logic,
-        isRequired=db_question.is_required,
-        # Include displayOrder if it exists in your schema
-        displayOrder=getattr(db_question, 'display_order', 0),
-        minSelections=min_selections,
-        maxSelections=db_question.max_selections
-    )
+    questionnaire_cache.publish_changes(db)
+    return [crud.prepare_question_for_response(q) for q in updated_questions]
 
 # Function to check if tables exist and create them if they don't
 def init_db():
@@ -342,10 +213,10 @@ def init_db():
     if tables_to_create:
         # Create only the tables that don't exist
         models.Base.metadata.create_all(bind=engine, tables=tables_to_create)
-        print(f"Created tables: {', '.join(t.name for t in tables_to_create)}")
+        logger.info(f"Created tables: {', '.join(t.name for t in tables_to_create)}")
         return f"Created tables: {', '.join(t.name for t in tables_to_create)}"
     else:
-        print("All tables already exist")
+        logger.info("All tables already exist")
         return "All tables already exist"
 
 # Add an initialization endpoint to create tables
@@ -356,23 +227,42 @@ def initialize_database():
         result = init_db()
         return {"status": "success", "message": result}
     except Exception as e:
-        print(f"Database initialization error: {str(e)}")
+        logger.error(f"Database initialization error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Database initialization failed: {str(e)}")
 
+# start.sh runs init and migrations once before starting the workers and turns
+# this off, so they don't all race through the DDL on startup
+DB_INIT_ON_STARTUP = os.getenv("DB_INIT_ON_STARTUP", "1") == "1"
+
 # Initialize database on startup (optional)
 @app.on_event("startup")
 async def startup_event():
-    try:
-        print("Starting database initialization...")
-        init_db()
-        
-        # Run database migrations
-        print("Running database migrations...")
-        migrate_database(engine)
-        
-        print("Database initialization and migration completed")
-    except Exception as e:
-        print(f"Error during startup database initialization: {str(e)}")
+    if DB_INIT_ON_STARTUP:
+        try:
+            logger.info("Starting database initialization...")
+            init_db()
+
+            # Run database migrations
+            logger.info("Running database migrations...")
+            migrate_database(engine)
+
+            logger.info("Database initialization and migration completed")
+        except Exception as e:
+            logger.error(f"Error during startup database initialization: {str(e)}")
+
+    # Fails fast on a draft store that can't serve this many workers
+    store = drafts.get_draft_store()
+    logger.info(f"Draft store: {store.name}")
+
+    # Resolve storage once and keep its health state fresh in the background
+    await audio_storage.initialize_storage()
+    app.state.storage_health_task = asyncio.create_task(audio_storage.run_health_monitor())
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    task = getattr(app.state, "storage_health_task", None)
+    if task:
+        task.cancel()
 
 @app.post("/api/admin/migrate_db")
 def run_migration():
@@ -388,30 +278,114 @@ def run_migration():
 
 # API endpoints for regular users
 @app.get("/api/questions", response_model=List[schemas.Question])
-def get_questions(db: Session = Depends(get_db)):
+def get_questions(request: Request, db: Session = Depends(get_db)):
     """Get all questions for the survey"""
-    questions = crud.get_questions(db)
-    # Process each question to ensure JSON fields are properly converted
-    processed_questions = [prepare_question_for_response(q) for q in questions]
-    return ThaiJSONResponse(content=jsonable_encoder(processed_questions))
+    # Served from bytes encoded and compressed once per questionnaire version
+    encoding = compression.negotiate(request.headers.get("accept-encoding"))
+    _, body = questionnaire_cache.get_questions_body(db, encoding)
+    return PreencodedJSONResponse(content=body, headers=compression.encoded_headers(encoding))
+
+def store_submission(db: Session, submission: schemas.SubmissionCreate) -> str:
+    """Validate against the current questionnaire snapshot, then write; returns the submission id"""
+    # Checked against the cached questionnaire before anything is written
+    snapshot_id, questions = questionnaire_cache.get_snapshot(db)
+    errors = answer_validation.validate_submission(answer_validation.get_rules(snapshot_id, questions), submission)
+    if errors:
+        metrics.increment("submissions.rejected")
+        raise HTTPException(status_code=422, detail=errors)
+    try:
+        return crud.create_submission(db, submission, snapshot_id=snapshot_id).id
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/api/submit")
 def submit_survey(submission: schemas.SubmissionCreate, db: Session = Depends(get_db)):
     """Submit survey responses"""
+    submission_id = store_submission(db, submission)
+    return ThaiJSONResponse(content={"status": "success", "submission_id": submission_id})
+
+# Autosave: answers are PATCHed into a draft as the respondent goes, and the
+# final submit only carries what changed since the last save
+@app.post("/api/drafts", status_code=status.HTTP_201_CREATED)
+def create_draft():
+    """Start a draft for a new respondent session"""
+    return {"draft_id": drafts.create_draft(), "expires_in": drafts.DRAFT_TTL_SECONDS}
+
+@app.get("/api/drafts/{draft_id}")
+def get_draft(draft_id: str):
+    """Saved answers, for resuming a dropped session"""
+    draft = drafts.load(draft_id)
+    if draft is None:
+        raise HTTPException(status_code=404, detail="Draft not found or expired")
+    return ThaiJSONResponse(content={"draft_id": draft_id, **draft})
+
+def _save_draft(db: Session, draft_id: str, update: schemas.DraftUpdate):
+    answers = {question_id: answer for question_id, answer in update.answers.items() if answer is not None}
+    if answers:
+        # Same per-answer checks as the final submit, so bad answers are refused while they're cheap to fix
+        snapshot_id, questions = questionnaire_cache.get_snapshot(db)
+        errors = answer_validation.validate_answers(answer_validation.get_rules(snapshot_id, questions), answers)
+        if errors:
+            raise HTTPException(status_code=422, detail=errors)
+    audio = {
+        question_id: recording.model_dump() if recording is not None else None
+        for question_id, recording in update.audio.items()
+    }
     try:
-        db_submission = crud.create_submission(db, submission)
-        return ThaiJSONResponse(content={"status": "success", "submission_id": db_submission.id})
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        saved = drafts.save(draft_id, update.answers, audio)
+    except drafts.DraftTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    if not saved:
+        raise HTTPException(status_code=404, detail="Draft not found or expired")
+
+@app.patch("/api/drafts/{draft_id}")
+def update_draft(draft_id: str, update: schemas.DraftUpdate, db: Session = Depends(get_db)):
+    """Save changed answers; a null answer or recording removes it from the draft"""
+    _save_draft(db, draft_id, update)
+    return {"status": "saved", "saved": len(update.answers) + len(update.audio)}
+
+@app.post("/api/drafts/{draft_id}/submit")
+def submit_draft(draft_id: str, update: Optional[schemas.DraftUpdate] = Body(None), db: Session = Depends(get_db)):
+    """Apply any last changes and promote the draft to a submission in one write"""
+    # Claimed before anything is stored, so a double click or a retry can't promote it twice
+    try:
+        draft = drafts.claim(draft_id)
+    except drafts.DraftClaimedError as e:
+        if e.submission_id is None:
+            raise HTTPException(status_code=409, detail="Draft is already being submitted")
+        # Retry of a submit that went through
+        return ThaiJSONResponse(content={"status": "success", "submission_id": e.submission_id})
+    if draft is None:
+        raise HTTPException(status_code=404, detail="Draft not found or expired")
+    try:
+        if update is not None:
+            # Applied to the claimed copy only; store_submission validates the answers
+            for question_id, answer in update.answers.items():
+                if answer is None:
+                    draft["answers"].pop(question_id, None)
+                else:
+                    draft["answers"][question_id] = answer
+            for question_id, recording in update.audio.items():
+                if recording is None:
+                    draft["audio"].pop(question_id, None)
+                else:
+                    draft["audio"][question_id] = recording.model_dump()
+        submission_id = store_submission(db, schemas.SubmissionCreate(**draft))
+    except Exception:
+        # Give the draft back so the respondent can fix it and submit again
+        drafts.release(draft_id)
+        raise
+    drafts.mark_submitted(draft_id, submission_id)
+    metrics.increment("drafts.promoted")
+    return ThaiJSONResponse(content={"status": "success", "submission_id": submission_id})
 
 # Admin API endpoints
 @app.get("/api/admin/questions", response_model=List[schemas.Question])
 def admin_get_questions(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
     """Get all questions for admin"""
     questions = crud.get_questions(db, skip=skip, limit=limit)
-    # Process each question to ensure JSON fields are properly converted
-    processed_questions = [prepare_question_for_response(q) for q in questions]
-    return ThaiJSONResponse(content=jsonable_encoder(processed_questions))
+    # Rows go straight to JSON-ready dicts, no per-row schema validation
+    return ThaiJSONResponse(content=serializers.questions_to_list(questions))
 
 @app.get("/api/admin/questions/{question_id}", response_model=schemas.Question)
 def admin_get_question(question_id: str, db: Session = Depends(get_db)):
@@ -419,7 +393,7 @@ def admin_get_question(question_id: str, db: Session = Depends(get_db)):
     db_question = crud.get_question(db, question_id=question_id)
     if db_question is None:
         raise HTTPException(status_code=404, detail="Question not found")
-    return prepare_question_for_response(db_question)
+    return crud.prepare_question_for_response(db_question)
 
 @app.post("/api/admin/questions", response_model=schemas.Question)
 def admin_create_question(question: schemas.QuestionCreate, db: Session = Depends(get_db)):
@@ -430,7 +404,8 @@ def admin_create_question(question: schemas.QuestionCreate, db: Session = Depend
         raise HTTPException(status_code=400, detail="Question ID already exists")
     
     new_question = crud.create_question(db=db, question=question)
-    return prepare_question_for_response(new_question)
+    questionnaire_cache.publish_changes(db)
+    return crud.prepare_question_for_response(new_question)
 
 @app.put("/api/admin/questions/{question_id}", response_model=schemas.Question)
 def admin_update_question(question_id: str, question: schemas.QuestionUpdate, db: Session = Depends(get_db)):
@@ -438,7 +413,8 @@ def admin_update_question(question_id: str, question: schemas.QuestionUpdate, db
     db_question = crud.update_question(db, question_id=question_id, question=question)
     if db_question is None:
         raise HTTPException(status_code=404, detail="Question not found")
-    return prepare_question_for_response(db_question)
+    questionnaire_cache.publish_changes(db)
+    return crud.prepare_question_for_response(db_question)
 
 @app.delete("/api/admin/questions/{question_id}")
 def admin_delete_question(question_id: str, db: Session = Depends(get_db)):
@@ -446,13 +422,15 @@ def admin_delete_question(question_id: str, db: Session = Depends(get_db)):
     success = crud.delete_question(db, question_id=question_id)
     if not success:
         raise HTTPException(status_code=404, detail="Question not found")
+    questionnaire_cache.publish_changes(db)
     return {"status": "success", "message": "Question deleted successfully"}
 
 @app.put("/api/admin/questions/order")
 def admin_update_question_order(questions: List[schemas.Question], db: Session = Depends(get_db)):
     """Update the order of questions"""
     updated_questions = crud.update_question_order(db, questions)
-    return [prepare_question_for_response(q) for q in updated_questions]
+    questionnaire_cache.publish_changes(db)
+    return [crud.prepare_question_for_response(q) for q in updated_questions]
 
 @app.get("/api/admin/responses")
 def admin_get_responses(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
@@ -464,8 +442,26 @@ def admin_get_responses(skip: int = 0, limit: int = 100, db: Session = Depends(g
     for submission in submissions:
         response_data.append(crud.format_submission_for_api(submission))
     
+    # Voice answers get playable URLs, signed together in one batch
+    playback_urls.attach_playback_urls(response_data)
     return ThaiJSONResponse(content=response_data)
 
+# Declared before /api/admin/responses/{submission_id} so "search" isn't taken as an id
+@app.get("/api/admin/responses/search")
+def admin_search_responses(
+    q: str = Query(..., min_length=1),
+    question_id: Optional[str] = None,
+    skip: int = 0,
+    limit: int = Query(50, le=500),
+    db: Session = Depends(get_db),
+):
+    """Search open-ended answers and voice transcripts by substring"""
+    started = time.perf_counter()
+    results = crud.search_responses(db, q, question_id=question_id, skip=skip, limit=limit)
+    took_ms = (time.perf_counter() - started) * 1000
+    metrics.observe("responses.search.ms", took_ms)
+    return ThaiJSONResponse(content={"query": q, "took_ms": round(took_ms, 2), "results": results})
+
 @app.get("/api/admin/responses/{submission_id}")
 def admin_get_response(submission_id: str, db: Session = Depends(get_db)):
     """Get a specific survey response"""
@@ -473,7 +469,65 @@ def admin_get_response(submission_id: str, db: Session = Depends(get_db)):
     if not submission:
         raise HTTPException(status_code=404, detail="Response not found")
     
-    return ThaiJSONResponse(content=crud.format_submission_for_api(submission))
+    response_data = crud.format_submission_for_api(submission)
+    playback_urls.attach_playback_urls([response_data])
+    return ThaiJSONResponse(content=response_data)
+
+@app.get("/api/admin/snapshots")
+def admin_list_snapshots(db: Session = Depends(get_db)):
+    """Recorded questionnaire snapshots, newest first"""
+    return ThaiJSONResponse(content=questionnaire_snapshots.list_snapshots(db))
+
+@app.get("/api/admin/snapshots/{snapshot_id}")
+def admin_get_snapshot(snapshot_id: str, db: Session = Depends(get_db)):
+    """The questions of one snapshot; a snapshot never changes, so clients may cache it for good"""
+    questions = questionnaire_snapshots.get_questions(db, snapshot_id)
+    if questions is None:
+        raise HTTPException(status_code=404, detail="Snapshot not found")
+    return ThaiJSONResponse(
+        content={"id": snapshot_id, "questions": questions},
+        headers={"Cache-Control": "private, max-age=31536000, immutable"},
+    )
+
+@app.get("/api/admin/tallies")
+def admin_get_tallies(db: Session = Depends(get_db)):
+    """Answer counts per choice question, recomputed at most every TALLY_CACHE_TTL seconds"""
+    body, age = answer_tallies.get_tallies_body(db)
+    return PreencodedJSONResponse(content=body, headers={"Age": str(int(age))})
+
+@app.post("/api/admin/recordings/playback-urls")
+def admin_playback_urls(keys: List[str] = Body(..., embed=True, max_length=1000)):
+    """Fresh playback URLs for up to 1000 recording keys, reused from cache when possible"""
+    try:
+        return {"urls": playback_urls.get_playback_urls(keys)}
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Could not sign playback URLs: {str(e)}")
+
+# Creates logins, so unlike the other admin routes it needs an admin token
+@app.post("/api/admin/bulk-load/{entity}", dependencies=[Depends(require_role("admin"))])
+def admin_bulk_load(
+    entity: str,
+    file: UploadFile = File(...),
+    batch_size: int = bulk_loader.DEFAULT_BATCH_SIZE,
+):
+    """Stream a CRM export (CSV or NDJSON) into customers, auth_credentials or purchases"""
+    if entity not in bulk_loader.TABLE_SPECS:
+        raise HTTPException(status_code=404, detail=f"Unknown entity: {entity}")
+    try:
+        fmt = bulk_loader.detect_format(file.filename or "")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        stats = bulk_loader.load_stream(entity, file.file, fmt, batch_size=batch_size)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Bulk load failed: {str(e)}")
+    return ThaiJSONResponse(content=stats.as_dict())
+
+@app.get("/api/metrics")
+def get_metrics():
+    """In-process performance metrics (upload throughput, stage latencies, queue depths)"""
+    return metrics.snapshot()
 
 @app.get("/health")
 def direct_health_check():
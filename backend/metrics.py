@@ -0,0 +1,91 @@
+# metrics.py - Lightweight in-process metrics (counters, gauges, timings)
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict
+
+# Number of recent samples kept per timing for percentile calculation
+SAMPLE_WINDOW = 2048
+
+_lock = threading.Lock()
+_counters: Dict[str, float] = {}
+_gauges: Dict[str, float] = {}
+_samples: Dict[str, deque] = {}
+_totals: Dict[str, list] = {}  # name -> [count, sum]
+
+
+def increment(name: str, value: float = 1):
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def set_gauge(name: str, value: float):
+    with _lock:
+        _gauges[name] = value
+
+
+def observe(name: str, value: float):
+    """Record one sample (a duration in seconds, a size, a rate...)"""
+    with _lock:
+        samples = _samples.get(name)
+        if samples is None:
+            samples = _samples[name] = deque(maxlen=SAMPLE_WINDOW)
+            _totals[name] = [0, 0.0]
+        samples.append(value)
+        totals = _totals[name]
+        totals[0] += 1
+        totals[1] += value
+
+
+@contextmanager
+def timed(name: str):
+    """Observe the wall-clock duration of the block under the given name"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start)
+
+
+def percentile(sorted_values, fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarize(values) -> Dict[str, float]:
+    ordered = sorted(values)
+    return {
+        "p50": percentile(ordered, 0.50),
+        "p95": percentile(ordered, 0.95),
+        "p99": percentile(ordered, 0.99),
+        "max": ordered[-1] if ordered else 0.0,
+    }
+
+
+def snapshot() -> Dict:
+    """Current values of every metric, timings summarised over the sample window"""
+    with _lock:
+        counters = dict(_counters)
+        gauges = dict(_gauges)
+        samples = {name: list(values) for name, values in _samples.items()}
+        totals = {name: list(values) for name, values in _totals.items()}
+
+    timings = {}
+    for name, values in samples.items():
+        count, total = totals[name]
+        summary = summarize(values)
+        summary.update({"count": count, "mean": total / count if count else 0.0})
+        timings[name] = summary
+
+    return {"counters": counters, "gauges": gauges, "timings": timings}
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _gauges.clear()
+        _samples.clear()
+        _totals.clear()
@@ -29,6 +29,8 @@ class Response(Base):
     question_id = Column(String, ForeignKey("questions.id"))
     submission_id = Column(String, ForeignKey("submissions.id"))
     answer_data = Column(Text)  # Store answer as Text
+    transcript = Column(Text, nullable=True)  # Speech recognition output for voice answers
+    audio_key = Column(String, nullable=True)  # Storage key of the recording, e.g. recordings/<sha256>.webm
     
     # Relationships
     question = relationship("Question", back_populates="responses")
@@ -39,10 +41,19 @@ class Submission(Base):
 
     id = Column(String, primary_key=True, index=True)
     timestamp = Column(DateTime, default=datetime.utcnow)
+    snapshot_id = Column(String, ForeignKey("questionnaire_snapshots.id"), nullable=True, index=True)  # Questionnaire answered
     
     # Relationships
     responses = relationship("Response", back_populates="submission")
 
+class QuestionnaireSnapshot(Base):
+    __tablename__ = "questionnaire_snapshots"
+
+    id = Column(String, primary_key=True)  # sha256 of the encoded question list
+    questions = Column(Text, nullable=False)  # The /api/questions body, never updated
+    question_count = Column(Integer, nullable=False)
+    created_at = Column(TIMESTAMP, server_default=func.now())
+
 class Customer(Base):
     __tablename__ = "customers"
     
@@ -93,4 +104,13 @@ class Purchase(Base):
     created_at = Column(TIMESTAMP, server_default=func.now())
     
     # Relationship
-    customer = relationship("Customer", back_populates="purchases")
\ No newline at end of file
+    customer = relationship("Customer", back_populates="purchases")
+
+class TranscriptionCacheEntry(Base):
+    __tablename__ = "transcription_cache"
+
+    cache_key = Column(String, primary_key=True)  # audio sha256:language:config fingerprint
+    language = Column(String, nullable=False)
+    transcript = Column(Text, nullable=False)
+    segments = Column(JSON, nullable=True)
+    created_at = Column(TIMESTAMP, server_default=func.now())
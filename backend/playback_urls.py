@@ -0,0 +1,92 @@
+# playback_urls.py - Cached, batch-signed playback URLs for stored recordings
+import datetime
+import os
+import threading
+import time
+import logging
+from collections import OrderedDict
+from typing import Dict, Iterable, List
+
+import metrics
+from audio_storage import get_storage_backend
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Lifetime of URLs handed to admins for playback
+PLAYBACK_URL_EXPIRATION = datetime.timedelta(seconds=int(os.getenv("PLAYBACK_URL_EXPIRATION_SECONDS", str(24 * 3600))))
+# Cached URLs are re-signed once they have less than this left
+PLAYBACK_URL_REFRESH_MARGIN = float(os.getenv("PLAYBACK_URL_REFRESH_MARGIN_SECONDS", "3600"))
+PLAYBACK_URL_CACHE_SIZE = int(os.getenv("PLAYBACK_URL_CACHE_SIZE", "20000"))
+
+_lock = threading.Lock()
+# key -> (url, monotonic expiry)
+_urls: "OrderedDict[str, tuple]" = OrderedDict()
+
+
+def get_playback_urls(keys: Iterable[str]) -> Dict[str, str]:
+    """
+    Playback URLs for keys. Fresh cached URLs are reused; the rest are signed
+    in one batch by the storage backend. Blocking, call from a worker thread.
+    """
+    wanted = list(dict.fromkeys(key for key in keys if key))
+    now = time.monotonic()
+    found: Dict[str, str] = {}
+    missing: List[str] = []
+
+    with _lock:
+        for key in wanted:
+            cached = _urls.get(key)
+            if cached and cached[1] - now > PLAYBACK_URL_REFRESH_MARGIN:
+                _urls.move_to_end(key)
+                found[key] = cached[0]
+            else:
+                missing.append(key)
+
+    metrics.increment("playback_urls.cache_hits", len(found))
+    if not missing:
+        return found
+
+    metrics.increment("playback_urls.signed", len(missing))
+    with metrics.timed("playback_urls.sign_batch.seconds"):
+        signed = get_storage_backend().sign_urls(missing, PLAYBACK_URL_EXPIRATION)
+    expires = time.monotonic() + PLAYBACK_URL_EXPIRATION.total_seconds()
+
+    with _lock:
+        for key, url in signed.items():
+            _urls[key] = (url, expires)
+            _urls.move_to_end(key)
+        while len(_urls) > PLAYBACK_URL_CACHE_SIZE:
+            _urls.popitem(last=False)
+
+    found.update(signed)
+    return found
+
+
+def attach_playback_urls(submissions: List[Dict]) -> List[Dict]:
+    """
+    Add a "url" to every audio entry of formatted submissions (see
+    crud.format_submission_for_api), signing all of them in one batch.
+    """
+    entries = [
+        entry
+        for submission in submissions
+        for entry in submission.get("audio", {}).values()
+        if entry.get("key")
+    ]
+    if not entries:
+        return submissions
+
+    try:
+        urls = get_playback_urls(entry["key"] for entry in entries)
+    except Exception as e:
+        logger.warning(f"Could not sign playback URLs: {e}")
+        urls = {}
+    for entry in entries:
+        entry["url"] = urls.get(entry["key"])
+    return submissions
+
+
+def clear():
+    with _lock:
+        _urls.clear()
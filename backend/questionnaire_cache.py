@@ -0,0 +1,149 @@
+# questionnaire_cache.py - Process-wide cache of the serialized questionnaire
+#
+# With several workers (shared_cache.SHARED_CACHE_ENABLED) the encoded bodies
+# live in a shared snapshot kept fresh by cache_refresher.py; each worker only
+# parses the question list once per published version. Every version loaded
+# from the database is also recorded as an immutable questionnaire snapshot.
+import os
+import threading
+import time
+import logging
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+import compression
+import crud
+import questionnaire_snapshots
+import shared_cache
+from responses import dumps, loads
+from serializers import questions_to_list
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Admin writes in this process invalidate immediately; the TTL bounds how long
+# another process can serve questions that were edited elsewhere.
+CACHE_TTL_SECONDS = float(os.getenv("QUESTIONNAIRE_CACHE_TTL", "60"))
+
+_lock = threading.Lock()
+_state = {
+    "version": 0,
+    "entry": None,  # (version, questions, {encoding or "identity": body}, snapshot id)
+    "loaded_at": 0.0,
+}
+
+shared = shared_cache.SharedSnapshot("questionnaire")
+
+
+def _is_fresh() -> bool:
+    return _state["entry"] is not None and time.monotonic() - _state["loaded_at"] < CACHE_TTL_SECONDS
+
+
+def get_questions(db: Session) -> Tuple[int, List[Dict]]:
+    """
+    Return (version, questions) where questions are the JSON-ready dicts served
+    by /api/questions. The list is shared between requests and must not be
+    mutated by callers; copy the individual questions that need changes.
+    """
+    version, questions, _, _ = _current(db)
+    return version, questions
+
+
+def get_snapshot(db: Session) -> Tuple[str, List[Dict]]:
+    """(snapshot id, questions) for the questionnaire currently being served"""
+    _, questions, _, snapshot_id = _current(db)
+    return snapshot_id, questions
+
+
+def get_questions_body(db: Session, encoding: Optional[str] = None) -> Tuple[int, bytes]:
+    """
+    (version, questions) with the list already encoded as the /api/questions
+    body, compressed with encoding (gzip/br) or plain when encoding is None
+    """
+    version, _, bodies, _ = _current(db)
+    return version, bodies[encoding or "identity"]
+
+
+def _load(db: Session) -> List[Dict]:
+    logger.info("Loading questionnaire into cache")
+    return questions_to_list(crud.get_questions(db, limit=None))
+
+
+def _encode(questions: List[Dict]) -> Dict[str, bytes]:
+    # Compressed once per version, so each request only copies bytes
+    variants = compression.precompress(dumps(questions))
+    return {encoding or "identity": body for encoding, body in variants.items()}
+
+
+def _build(db: Session) -> Tuple[List[Dict], Dict[str, bytes], str]:
+    questions = _load(db)
+    bodies = _encode(questions)
+    snapshot_id = questionnaire_snapshots.ensure(db, bodies["identity"], questions)
+    return questions, bodies, snapshot_id
+
+
+def publish(db: Session):
+    """Reload the shared snapshot from the database (run by cache_refresher)"""
+    return shared.refresh(lambda: _build(db)[1])
+
+
+def _current(db: Session):
+    if shared_cache.SHARED_CACHE_ENABLED:
+        return _current_shared(db)
+
+    # Read once so a concurrent invalidate() can't hand back a half-cleared entry
+    entry = _state["entry"]
+    if entry is not None and _is_fresh():
+        return entry
+
+    with _lock:
+        # Another thread may have reloaded while we waited for the lock
+        if _is_fresh():
+            return _state["entry"]
+
+        serialized, bodies, snapshot_id = _build(db)
+        _state["version"] += 1
+        _state["entry"] = (_state["version"], serialized, bodies, snapshot_id)
+        _state["loaded_at"] = time.monotonic()
+        return _state["entry"]
+
+
+def _current_shared(db: Session):
+    snapshot = shared.read()
+    if snapshot is None or snapshot.age() >= CACHE_TTL_SECONDS:
+        # The refresher is late or not running: one worker reloads for all of them
+        snapshot = shared.refresh(lambda: _build(db)[1], max_age=CACHE_TTL_SECONDS)
+
+    entry = _state["entry"]
+    if entry is not None and entry[0] == snapshot.version:
+        return entry
+    with _lock:
+        entry = _state["entry"]
+        if entry is None or entry[0] != snapshot.version:
+            # Bodies stay in the shared mapping, only the list is parsed per worker.
+            # The process that loaded this version stored its snapshot row already,
+            # so this is one primary key lookup per version.
+            body = snapshot.part("identity")
+            questions = loads(body)
+            entry = (snapshot.version, questions, snapshot, questionnaire_snapshots.ensure(db, body, questions))
+            _state["entry"] = entry
+        return entry
+
+
+def invalidate():
+    """Drop the cached questionnaire after an admin change"""
+    if shared_cache.SHARED_CACHE_ENABLED:
+        # Every worker reloads on its next read, the version moves on if the content changed
+        shared.expire()
+        return
+    with _lock:
+        _state["entry"] = None
+        _state["loaded_at"] = 0.0
+
+
+def publish_changes(db: Session) -> str:
+    """After an admin change: drop the cached questionnaire and record the new snapshot"""
+    invalidate()
+    snapshot_id, _ = get_snapshot(db)
+    return snapshot_id
@@ -0,0 +1,91 @@
+# questionnaire_snapshots.py - Immutable, content-addressed copies of the questionnaire
+#
+# A snapshot's id is the sha256 of the encoded /api/questions body, so the same
+# questionnaire always maps to the same row and any edit produces a new one.
+# Submissions record the snapshot they were answered against; since a snapshot
+# never changes, anything derived from it can be cached for good.
+import hashlib
+import os
+import threading
+import logging
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+import models
+from responses import loads
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_CACHE_SIZE = int(os.getenv("SNAPSHOT_CACHE_SIZE", "16"))
+
+_lock = threading.Lock()
+# snapshot id -> questions; ids already known to be stored map to their list too
+_questions: "OrderedDict[str, List[Dict]]" = OrderedDict()
+
+
+def snapshot_id_for(body: bytes) -> str:
+    return hashlib.sha256(body).hexdigest()
+
+
+def _remember(snapshot_id: str, questions: List[Dict]):
+    with _lock:
+        _questions[snapshot_id] = questions
+        _questions.move_to_end(snapshot_id)
+        while len(_questions) > SNAPSHOT_CACHE_SIZE:
+            _questions.popitem(last=False)
+
+
+def ensure(db: Session, body: bytes, questions: List[Dict]) -> str:
+    """Store the snapshot for body unless it exists already; returns its id"""
+    snapshot_id = snapshot_id_for(body)
+    if snapshot_id in _questions:
+        return snapshot_id
+    if db.get(models.QuestionnaireSnapshot, snapshot_id) is None:
+        db.add(models.QuestionnaireSnapshot(
+            id=snapshot_id,
+            questions=body.decode("utf-8"),
+            question_count=len(questions),
+        ))
+        try:
+            db.commit()
+            logger.info(f"Recorded questionnaire snapshot {snapshot_id[:12]} ({len(questions)} questions)")
+        except IntegrityError:
+            # Another worker stored the same content first
+            db.rollback()
+    _remember(snapshot_id, questions)
+    return snapshot_id
+
+
+def get_questions(db: Session, snapshot_id: str) -> Optional[List[Dict]]:
+    """The questions of a stored snapshot, None when there is no such snapshot"""
+    with _lock:
+        questions = _questions.get(snapshot_id)
+        if questions is not None:
+            _questions.move_to_end(snapshot_id)
+            return questions
+    row = db.get(models.QuestionnaireSnapshot, snapshot_id)
+    if row is None:
+        return None
+    questions = loads(row.questions)
+    _remember(snapshot_id, questions)
+    return questions
+
+
+def list_snapshots(db: Session) -> List[Dict]:
+    rows = (
+        db.query(
+            models.QuestionnaireSnapshot.id,
+            models.QuestionnaireSnapshot.question_count,
+            models.QuestionnaireSnapshot.created_at,
+        )
+        .order_by(models.QuestionnaireSnapshot.created_at.desc())
+        .all()
+    )
+    return [
+        {"id": row.id, "question_count": row.question_count, "created_at": row.created_at.isoformat() if row.created_at else None}
+        for row in rows
+    ]
@@ -0,0 +1,171 @@
+# recognition.py - Google Speech recognition for short, long and live audio
+import os
+import json
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import metrics
+from audio_processing import PREPROCESS_SETTINGS, SAMPLE_RATE, split_at_silence
+from speech_client import SpeechNotConfiguredError, speech_clients
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Synchronous recognize accepts about a minute of audio; stay safely below it
+SYNC_RECOGNIZE_MAX_SECONDS = float(os.getenv("SYNC_RECOGNIZE_MAX_SECONDS", "55"))
+# Segments are cut at the quietest point between these lengths
+MIN_SEGMENT_SECONDS = float(os.getenv("MIN_SEGMENT_SECONDS", "20"))
+# Segment recognitions in flight across the whole process
+RECOGNITION_FANOUT = int(os.getenv("RECOGNITION_FANOUT", "8"))
+
+_recognition_executor = ThreadPoolExecutor(max_workers=RECOGNITION_FANOUT, thread_name_prefix="recognize")
+
+# Everything besides the language that changes what a clip is transcribed to
+RECOGNITION_SETTINGS = {
+    "sample_rate_hertz": SAMPLE_RATE,
+    "enable_automatic_punctuation": True,
+    "use_enhanced": True,
+    "model": "default",
+}
+
+
+def recognition_fingerprint() -> str:
+    """Short hash of the recognition, segmentation and preprocessing settings, for cache keys"""
+    settings = dict(
+        RECOGNITION_SETTINGS,
+        sync_max_seconds=SYNC_RECOGNIZE_MAX_SECONDS,
+        min_segment_seconds=MIN_SEGMENT_SECONDS,
+        preprocess=PREPROCESS_SETTINGS,
+    )
+    return hashlib.sha256(json.dumps(settings, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def recognition_config(language: str):
+    from google.cloud import speech
+    return speech.RecognitionConfig(
+        encoding=speech.RecognitionConfig.AudioEncoding.LINEAR16,
+        language_code=language,
+        **RECOGNITION_SETTINGS
+    )
+
+
+def recognize_linear16(audio_content: bytes, language: str, request_id: str) -> Optional[str]:
+    """Send LINEAR16 audio to Google Speech API, None if unavailable or nothing recognised"""
+    try:
+        from google.cloud import speech
+    except ImportError:
+        logger.error("Google Cloud Speech library not installed")
+        return None
+
+    # Create recognition audio from content
+    audio = speech.RecognitionAudio(content=audio_content)
+    config = recognition_config(language)
+
+    # Perform recognition on a pooled client
+    logger.info(f"Sending recognition request to Google API for {request_id}")
+    try:
+        response = speech_clients.call(lambda client: client.recognize(config=config, audio=audio))
+    except SpeechNotConfiguredError as e:
+        logger.error(str(e))
+        return None
+
+    # Process each result (sequential segments of audio), top alternative only
+    segments = []
+    for i, result in enumerate(response.results):
+        if result.alternatives:
+            segment_transcript = result.alternatives[0].transcript
+            logger.info(f"Result {i+1}: {segment_transcript}")
+            segments.append(segment_transcript)
+
+    return " ".join(segments).strip() or None
+
+
+def recognize_pcm(
+    pcm: bytes,
+    language: str,
+    request_id: str,
+    recognize_segment: Callable[[bytes, str, str], Optional[str]] = recognize_linear16,
+) -> Tuple[Optional[str], List[Dict], int]:
+    """
+    Recognise a clip of any length. Clips within the synchronous limit go in
+    one request; longer ones are split at pauses, the segments recognised
+    concurrently on the shared fan-out pool and stitched back in order.
+
+    Returns (transcript, segments, failed) where each segment carries its
+    start and end offsets in seconds and failed counts the segments whose
+    request raised; their speech is missing from the transcript.
+    """
+    duration = len(pcm) / 2 / SAMPLE_RATE
+    if duration <= SYNC_RECOGNIZE_MAX_SECONDS:
+        transcript = recognize_segment(pcm, language, request_id)
+        segments = [{"start": 0.0, "end": round(duration, 2), "transcript": transcript}] if transcript else []
+        return transcript, segments, 0
+
+    bounds = split_at_silence(pcm, SYNC_RECOGNIZE_MAX_SECONDS, MIN_SEGMENT_SECONDS)
+    metrics.increment("recognition.long_clips")
+    metrics.observe("recognition.segments_per_clip", len(bounds))
+    logger.info(f"{request_id}: {duration:.1f}s clip split into {len(bounds)} segments")
+
+    futures = [
+        _recognition_executor.submit(recognize_segment, pcm[start * 2:end * 2], language, f"{request_id}_{i}")
+        for i, (start, end) in enumerate(bounds)
+    ]
+
+    segments = []
+    failed = 0
+    for (start, end), future in zip(bounds, futures):
+        try:
+            transcript = future.result()
+        except Exception as e:
+            # One failed segment shouldn't discard the rest of the answer
+            logger.error(f"{request_id}: segment at {start / SAMPLE_RATE:.1f}s failed: {e}")
+            metrics.increment("recognition.segment_errors")
+            failed += 1
+            continue
+        if transcript:
+            segments.append({
+                "start": round(start / SAMPLE_RATE, 2),
+                "end": round(end / SAMPLE_RATE, 2),
+                "transcript": transcript,
+            })
+
+    transcript = " ".join(segment["transcript"] for segment in segments).strip() or None
+    return transcript, segments, failed
+
+
+# Streaming recognition for live capture. The caller feeds raw LINEAR16 chunks
+# into audio_chunks, a queue.Queue (None ends the stream), and receives result dicts.
+STREAM_END = None
+
+
+def streaming_recognize(audio_chunks, language: str, interim_results: bool = True) -> Iterator[Dict]:
+    """Blocking generator over streaming_recognize results for the queued audio"""
+    from google.cloud import speech
+
+    def requests():
+        while True:
+            chunk = audio_chunks.get()
+            if chunk is STREAM_END:
+                return
+            yield speech.StreamingRecognizeRequest(audio_content=chunk)
+
+    streaming_config = speech.StreamingRecognitionConfig(
+        config=recognition_config(language),
+        interim_results=interim_results,
+    )
+
+    # No automatic retry here: the request iterator can't be replayed
+    _, client = speech_clients.get()
+    metrics.increment("recognition.streams")
+    for response in client.streaming_recognize(config=streaming_config, requests=requests()):
+        for result in response.results:
+            if not result.alternatives:
+                continue
+            end_offset = result.result_end_time
+            yield {
+                "transcript": result.alternatives[0].transcript,
+                "is_final": result.is_final,
+                "end": round(end_offset.total_seconds(), 2) if end_offset else None,
+            }
@@ -0,0 +1,47 @@
+import datetime
+import json
+from fastapi.responses import JSONResponse, Response
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _default(value):
+    # Match orjson/jsonable_encoder for dates, fall back to str for the rest
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    return str(value)
+
+
+def dumps(content) -> bytes:
+    """
+    Compact UTF-8 JSON with Thai text left unescaped. Uses orjson when it's
+    installed (it never escapes non-ASCII and handles datetimes natively),
+    otherwise the stdlib encoder.
+    """
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(
+        content,
+        ensure_ascii=False,
+        allow_nan=False,
+        indent=None,
+        separators=(",", ":"),
+        default=_default,
+    ).encode("utf-8")
+
+
+def loads(data):
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+
+class ThaiJSONResponse(JSONResponse):
+    def render(self, content):
+        return dumps(content)
+
+
+class PreencodedJSONResponse(Response):
+    """JSON body that was serialized ahead of time, e.g. the cached questionnaire"""
+    media_type = "application/json"
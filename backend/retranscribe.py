@@ -0,0 +1,257 @@
+# retranscribe.py - Offline batch re-transcription of stored recordings
+#
+# Enumerates recordings through the configured storage backend, converts and
+# recognises them on a process pool and writes the transcripts back to the
+# transcription_cache table in bulk. Progress is checkpointed to a JSONL file
+# so an interrupted run picks up where it stopped.
+#
+#   cd backend && python retranscribe.py --workers 8 --language th-TH
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Dict, Iterable, List, Optional, Set
+
+import logging_setup
+from audio_storage import RECORDINGS_PREFIX
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+DEFAULT_WORKERS = os.cpu_count() or 4
+DEFAULT_BATCH_SIZE = 200
+DEFAULT_CHECKPOINT = "retranscribe_checkpoint.jsonl"
+MAX_REPORTED_ERRORS = 20
+
+
+def transcribe_key(key: str, language: str) -> Dict:
+    """Worker: download, convert, preprocess and recognise one recording"""
+    from audio_conversion import to_linear16
+    from audio_processing import preprocess
+    from audio_storage import get_storage_backend
+    from recognition import recognize_pcm
+    from transcription_cache import cache_key
+
+    result = {"key": key, "language": language}
+    started = time.perf_counter()
+    try:
+        content = get_storage_backend().get_bytes(key)
+        audio = preprocess(to_linear16(content))
+        transcript, segments, failed = recognize_pcm(audio.pcm, language, os.path.basename(key))
+        if failed:
+            # Left out of the checkpoint so the next run retries the clip
+            raise RuntimeError(f"{failed} segments failed recognition")
+        if not transcript:
+            raise ValueError("No speech recognised")
+        result.update({
+            "cache_key": cache_key(content, language),
+            "transcript": transcript,
+            "segments": [
+                dict(segment, start=audio.to_original(segment["start"]), end=audio.to_original(segment["end"]))
+                for segment in segments
+            ],
+            "audio_seconds": round(audio.original_seconds, 2),
+        })
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    result["seconds"] = round(time.perf_counter() - started, 3)
+    return result
+
+
+def _init_worker():
+    # Workers only need warnings; per-clip INFO logs from many processes drown the progress lines
+    logging.getLogger().setLevel(logging.WARNING)
+
+
+def load_checkpoint(path: str) -> Set[str]:
+    """Keys already written back by a previous run; failures are retried"""
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                entry = json.loads(line)
+                if entry.get("ok"):
+                    done.add(entry["key"])
+    return done
+
+
+def write_results(results: List[Dict]):
+    """Upsert a batch of transcripts into transcription_cache in one statement"""
+    from database import DIALECT, engine
+    if DIALECT == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        from sqlalchemy.dialects.postgresql import insert
+    from models import TranscriptionCacheEntry
+
+    # Identical recordings under different keys share a cache_key, and one
+    # INSERT ... ON CONFLICT can't update the same row twice; the last one wins
+    rows = {
+        result["cache_key"]: {
+            "cache_key": result["cache_key"],
+            "language": result["language"],
+            "transcript": result["transcript"],
+            "segments": result["segments"],
+        }
+        for result in results if "error" not in result
+    }
+    if not rows:
+        return
+    statement = insert(TranscriptionCacheEntry.__table__).values(list(rows.values()))
+    statement = statement.on_conflict_do_update(
+        index_elements=["cache_key"],
+        set_={"transcript": statement.excluded.transcript, "segments": statement.excluded.segments},
+    )
+    with engine.begin() as connection:
+        connection.execute(statement)
+
+
+class RunStats:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.completed = 0
+        self.failed = 0
+        self.skipped = 0
+        self.audio_seconds = 0.0
+        self.error_kinds = Counter()
+        self.errors: List[Dict] = []
+
+    def record(self, result: Dict):
+        if "error" in result:
+            self.failed += 1
+            self.error_kinds[result["error"].split(":", 1)[0]] += 1
+            if len(self.errors) < MAX_REPORTED_ERRORS:
+                self.errors.append({"key": result["key"], "error": result["error"]})
+        else:
+            self.completed += 1
+            self.audio_seconds += result.get("audio_seconds", 0)
+
+    @property
+    def clips_per_minute(self) -> float:
+        elapsed = time.perf_counter() - self.started
+        return (self.completed + self.failed) / elapsed * 60 if elapsed else 0.0
+
+    def as_dict(self) -> Dict:
+        return {
+            "completed": self.completed,
+            "failed": self.failed,
+            "skipped_from_checkpoint": self.skipped,
+            "elapsed_seconds": round(time.perf_counter() - self.started, 2),
+            "clips_per_minute": round(self.clips_per_minute, 1),
+            "audio_minutes": round(self.audio_seconds / 60, 1),
+            "errors_by_type": dict(self.error_kinds),
+            "errors": self.errors,
+        }
+
+
+def run(
+    keys: Iterable[str],
+    language: str,
+    workers: int = DEFAULT_WORKERS,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    checkpoint: str = DEFAULT_CHECKPOINT,
+    output: Optional[str] = None,
+    write_db: bool = True,
+) -> RunStats:
+    """
+    Re-transcribe keys on a process pool. Results are flushed in batches:
+    database first, then the optional JSONL output, then the checkpoint, so a
+    key is only marked done once its transcript is safely written.
+    """
+    stats = RunStats()
+    done = load_checkpoint(checkpoint)
+    pending_results: List[Dict] = []
+    output_file = open(output, "a", encoding="utf-8") if output else None
+    checkpoint_file = open(checkpoint, "a", encoding="utf-8")
+
+    def flush():
+        if not pending_results:
+            return
+        if write_db:
+            write_results(pending_results)
+        for result in pending_results:
+            if output_file:
+                output_file.write(json.dumps(result, ensure_ascii=False) + "\n")
+            checkpoint_file.write(json.dumps({"key": result["key"], "ok": "error" not in result}) + "\n")
+        if output_file:
+            output_file.flush()
+        checkpoint_file.flush()
+        pending_results.clear()
+        logger.info(
+            f"{stats.completed} done, {stats.failed} failed, {stats.clips_per_minute:.1f} clips/min"
+        )
+
+    # Keep only a bounded window of futures in flight so huge buckets don't
+    # turn into millions of queued tasks
+    max_in_flight = workers * 2
+    in_flight = set()
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+            for key in keys:
+                if key in done:
+                    stats.skipped += 1
+                    continue
+                in_flight.add(pool.submit(transcribe_key, key, language))
+                if len(in_flight) >= max_in_flight:
+                    finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        result = future.result()
+                        stats.record(result)
+                        pending_results.append(result)
+                    if len(pending_results) >= batch_size:
+                        flush()
+
+            for future in wait(in_flight).done:
+                result = future.result()
+                stats.record(result)
+                pending_results.append(result)
+            flush()
+    finally:
+        checkpoint_file.close()
+        if output_file:
+            output_file.close()
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Re-transcribe stored recordings in bulk")
+    parser.add_argument("--prefix", default=RECORDINGS_PREFIX, help="Storage prefix to enumerate")
+    parser.add_argument("--language", default="th-TH")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Worker processes")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Results per bulk write")
+    parser.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT, help="Progress file used to resume")
+    parser.add_argument("--output", help="Also append every result to this JSONL file")
+    parser.add_argument("--limit", type=int, help="Stop after this many recordings")
+    parser.add_argument("--no-db", action="store_true", help="Don't write transcripts to the database")
+    args = parser.parse_args(argv)
+    logging_setup.configure_logging()
+
+    from itertools import islice
+    from audio_storage import get_storage_backend
+
+    keys = get_storage_backend().list_keys(args.prefix)
+    if args.limit:
+        keys = islice(keys, args.limit)
+
+    stats = run(
+        keys,
+        args.language,
+        workers=args.workers,
+        batch_size=args.batch_size,
+        checkpoint=args.checkpoint,
+        output=args.output,
+        write_db=not args.no_db,
+    )
+    print(json.dumps(stats.as_dict(), indent=2, ensure_ascii=False))
+    return 0 if stats.failed == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -108,12 +108,23 @@ class Response(ResponseBase):
         from_attributes = True  # Updated from orm_mode = True
 
 # Submission schemas
+class AudioAnswer(BaseModel):
+    key: Optional[str] = None  # storage key returned by /api/upload-audio
+    url: Optional[str] = None  # playback URL, used to find the key when it's missing
+    transcript: Optional[str] = None
+
 class SubmissionCreate(BaseModel):
     answers: Dict[str, Any]  # question_id -> answer
+    audio: Dict[str, AudioAnswer] = {}  # question_id -> recording for voice answers
+
+class DraftUpdate(BaseModel):
+    answers: Dict[str, Any] = {}  # question_id -> answer, null removes it
+    audio: Dict[str, Optional[AudioAnswer]] = {}  # question_id -> recording, null removes it
 
 class Submission(BaseModel):
     id: str
     timestamp: datetime
+    snapshot_id: Optional[str] = None
     responses: List[Response] = []
     
     class Config:
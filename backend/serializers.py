@@ -0,0 +1,51 @@
+# serializers.py - Straight from ORM rows to JSON-ready dicts for the hot endpoints
+#
+# Each function produces exactly what jsonable_encoder(<pydantic schema>) would,
+# without validating and re-dumping a model per row.
+import json
+from typing import Any, Dict, List, Optional
+
+
+def _json_field(value, default):
+    """Options/logic may be stored as JSON text by older rows"""
+    if value and isinstance(value, str):
+        try:
+            return json.loads(value)
+        except json.JSONDecodeError:
+            return default
+    return value
+
+
+def _options(options: Optional[List[Dict[str, Any]]]):
+    if options is None:
+        return None
+    return [{"value": option["value"], "label": option["label"]} for option in options]
+
+
+def _logic(rules: Optional[List[Dict[str, Any]]]):
+    if rules is None:
+        return None
+    return [
+        {"condition": rule["condition"], "value": rule["value"], "jumpToQuestion": rule["jumpToQuestion"]}
+        for rule in rules
+    ]
+
+
+def question_to_dict(db_question) -> Dict[str, Any]:
+    """Same output as jsonable_encoder(crud.prepare_question_for_response(db_question))"""
+    return {
+        "questionType": db_question.question_type,
+        "questionText": db_question.question_text,
+        "questionSubtext": db_question.question_subtext,
+        "options": _options(_json_field(db_question.options, [])),
+        "logic": _logic(_json_field(db_question.logic, [])),
+        "isRequired": db_question.is_required,
+        "minSelections": getattr(db_question, "min_selections", 0),
+        "maxSelections": db_question.max_selections,
+        "id": db_question.id,
+        "displayOrder": getattr(db_question, "display_order", 0),
+    }
+
+
+def questions_to_list(db_questions) -> List[Dict[str, Any]]:
+    return [question_to_dict(q) for q in db_questions]
@@ -0,0 +1,178 @@
+# shared_cache.py - Read-mostly snapshots shared by all worker processes
+#
+# A snapshot is one file holding a small JSON header and a set of named byte
+# parts (e.g. the questionnaire body in each encoding). Publishers write a new
+# file and os.replace() it into place, so readers never see a partial write.
+# Every process keeps the current file mmap'd and remaps only when a new one
+# appears; the pages themselves live once in the page cache (tmpfs under
+# /dev/shm) no matter how many workers read them.
+import fcntl
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+
+def _default_directory() -> str:
+    base = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    return os.path.join(base, "survey_cache")
+
+
+SHARED_CACHE_DIR = os.getenv("SHARED_CACHE_DIR") or _default_directory()
+# uvicorn reads WEB_CONCURRENCY as its default --workers too
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+# Shared snapshots replace the per-process caches whenever there is more than one worker
+SHARED_CACHE_ENABLED = os.getenv("SHARED_CACHE", "1" if WEB_CONCURRENCY > 1 else "0") == "1"
+
+_MAGIC = b"SSC1"
+_PREFIX = struct.Struct("<4sI")  # magic, header length
+
+
+class Snapshot:
+    """One published version. part() copies the bytes out of the shared mapping."""
+
+    def __init__(self, header: Dict, buffer: mmap.mmap, base: int):
+        self.version = header["version"]
+        self.published_at = header["published_at"]
+        self.digest = header["digest"]
+        self._parts = {name: (base + offset, length) for name, (offset, length) in header["parts"].items()}
+        self._buffer = buffer
+
+    def part(self, name: str) -> bytes:
+        offset, length = self._parts[name]
+        return self._buffer[offset:offset + length]
+
+    __getitem__ = part
+
+    def names(self):
+        return list(self._parts)
+
+    def age(self) -> float:
+        return time.time() - self.published_at
+
+
+class SharedSnapshot:
+    def __init__(self, name: str, directory: Optional[str] = None):
+        self.name = name
+        self.directory = directory or SHARED_CACHE_DIR
+        self.path = os.path.join(self.directory, f"{name}.snapshot")
+        self._mapped = None  # (file identity, Snapshot)
+        self._map_lock = threading.Lock()
+
+    def read(self) -> Optional[Snapshot]:
+        """Current snapshot, or None if nothing has been published yet"""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        mapped = self._mapped
+        if mapped is not None and mapped[0] == _identity(stat):
+            return mapped[1]
+
+        with self._map_lock:
+            mapped = self._mapped
+            if mapped is not None and mapped[0] == _identity(stat):
+                return mapped[1]
+            try:
+                self._mapped = self._map()
+            except FileNotFoundError:
+                return None
+            return self._mapped[1]
+
+    def _map(self):
+        with open(self.path, "rb") as f:
+            # Identity of the file actually opened, it may have been replaced since the stat
+            identity = _identity(os.fstat(f.fileno()))
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, header_length = _PREFIX.unpack_from(buffer, 0)
+        if magic != _MAGIC:
+            raise ValueError(f"{self.path} is not a shared cache snapshot")
+        header = json.loads(buffer[_PREFIX.size:_PREFIX.size + header_length])
+        return identity, Snapshot(header, buffer, _PREFIX.size + header_length)
+
+    @contextmanager
+    def _publish_lock(self):
+        """Cross-process lock, so concurrent publishers can't both bump the version"""
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.path + ".lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def refresh(self, load: Callable[[], Dict[str, bytes]], max_age: Optional[float] = None) -> Snapshot:
+        """
+        Publish the parts returned by load(). With max_age, a snapshot that
+        another process published while we waited for the lock is kept
+        instead, so a stale cache is reloaded once rather than once per worker.
+        The version only changes when the content does.
+        """
+        with self._publish_lock():
+            current = self.read()
+            if current is not None and max_age is not None and current.age() < max_age:
+                return current
+            parts = load()
+            digest = _digest(parts)
+            if current is not None and current.digest == digest:
+                version = current.version
+            else:
+                version = (current.version if current else 0) + 1
+                logger.info(f"Publishing shared snapshot {self.name} v{version}")
+            self._write(parts, version, digest, time.time())
+        return self.read()
+
+    def expire(self):
+        """Mark the current snapshot stale so the next reader reloads it"""
+        with self._publish_lock():
+            current = self.read()
+            if current is not None:
+                parts = {name: current.part(name) for name in current.names()}
+                self._write(parts, current.version, current.digest, 0.0)
+
+    def _write(self, parts: Dict[str, bytes], version: int, digest: str, published_at: float):
+        layout, offset = {}, 0
+        for name, data in parts.items():
+            layout[name] = [offset, len(data)]
+            offset += len(data)
+        header = json.dumps({
+            "version": version,
+            "published_at": published_at,
+            "digest": digest,
+            "parts": layout,
+        }).encode("utf-8")
+
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, prefix=f".{self.name}.")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(_PREFIX.pack(_MAGIC, len(header)))
+                f.write(header)
+                for data in parts.values():
+                    f.write(data)
+            os.replace(temp_path, self.path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+
+
+def _identity(stat: os.stat_result):
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+
+def _digest(parts: Dict[str, bytes]) -> str:
+    digest = hashlib.sha256()
+    for name in sorted(parts):
+        digest.update(name.encode("utf-8"))
+        digest.update(parts[name])
+    return digest.hexdigest()
@@ -0,0 +1,151 @@
+# speech_client.py - Process-wide pool of reusable Google Speech clients
+import hashlib
+import json
+import os
+import threading
+import logging
+from typing import Callable, List, Optional
+
+import metrics
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# "google" (default) or "fake" for the local stand-in in fake_services
+SPEECH_BACKEND = os.getenv("SPEECH_BACKEND", "google").lower()
+# gRPC channels are thread-safe, a few are enough to spread load across connections
+SPEECH_CLIENT_POOL_SIZE = int(os.getenv("SPEECH_CLIENT_POOL_SIZE", "2"))
+# Seconds to wait for each channel to connect when warming up
+WARMUP_TIMEOUT = float(os.getenv("SPEECH_CLIENT_WARMUP_TIMEOUT", "10"))
+
+
+class SpeechNotConfiguredError(RuntimeError):
+    """GOOGLE_CREDENTIALS_JSON is missing or the Speech library isn't installed"""
+
+
+def _is_channel_error(error: Exception) -> bool:
+    """Errors after which the client's channel or credentials should be rebuilt"""
+    try:
+        from google.api_core import exceptions as api_exceptions
+        from google.auth import exceptions as auth_exceptions
+    except ImportError:
+        return False
+    return isinstance(error, (
+        api_exceptions.ServiceUnavailable,
+        api_exceptions.Unauthenticated,
+        auth_exceptions.RefreshError,
+        auth_exceptions.TransportError,
+    ))
+
+
+class SpeechClientPool:
+    """
+    Creates SpeechClients once and hands them out round-robin. Credentials are
+    parsed once per distinct GOOGLE_CREDENTIALS_JSON value, so rotating the
+    variable rebuilds the pool; token refresh itself is handled by google-auth.
+    """
+
+    def __init__(self, size: int = SPEECH_CLIENT_POOL_SIZE):
+        self.size = max(1, size)
+        self._lock = threading.Lock()
+        self._clients: List[Optional[object]] = [None] * self.size
+        self._next = 0
+        self._credentials = None
+        self._credentials_fingerprint = None
+
+    def _load_credentials(self):
+        creds_json = os.getenv("GOOGLE_CREDENTIALS_JSON", "")
+        if not creds_json:
+            raise SpeechNotConfiguredError("Google credentials not found in environment")
+
+        fingerprint = hashlib.sha256(creds_json.encode()).hexdigest()
+        if fingerprint != self._credentials_fingerprint:
+            from google.oauth2 import service_account
+            creds_info = json.loads(creds_json)
+            self._credentials = service_account.Credentials.from_service_account_info(creds_info)
+            if self._credentials_fingerprint is not None:
+                logger.info("Google credentials changed, rebuilding Speech clients")
+                self._clients = [None] * self.size
+            self._credentials_fingerprint = fingerprint
+        return self._credentials
+
+    def _create_client(self):
+        if SPEECH_BACKEND == "fake":
+            from fake_services import FakeSpeechClient
+            metrics.increment("speech.client.created")
+            return FakeSpeechClient()
+        try:
+            from google.cloud import speech
+        except ImportError:
+            raise SpeechNotConfiguredError("google-cloud-speech is not installed")
+        client = speech.SpeechClient(credentials=self._load_credentials())
+        metrics.increment("speech.client.created")
+        return client
+
+    def get(self):
+        """Next client in round-robin order, created on first use"""
+        with self._lock:
+            if SPEECH_BACKEND != "fake":
+                self._load_credentials()
+            index = self._next
+            self._next = (self._next + 1) % self.size
+            client = self._clients[index]
+            if client is None:
+                client = self._clients[index] = self._create_client()
+            else:
+                metrics.increment("speech.client.reused")
+            return index, client
+
+    def discard(self, index: int, client):
+        """Drop a client whose channel failed so the slot reconnects next time"""
+        with self._lock:
+            if self._clients[index] is client:
+                self._clients[index] = None
+                metrics.increment("speech.client.discarded")
+        try:
+            client.transport.close()
+        except Exception:
+            pass
+
+    def call(self, func: Callable):
+        """Run func(client), reconnecting and retrying once after a channel error"""
+        index, client = self.get()
+        try:
+            return func(client)
+        except Exception as e:
+            if not _is_channel_error(e):
+                raise
+            logger.warning(f"Speech channel error ({type(e).__name__}: {e}), reconnecting")
+            metrics.increment("speech.client.reconnects")
+            self.discard(index, client)
+            index, client = self.get()
+            return func(client)
+
+    def warm(self, timeout: float = WARMUP_TIMEOUT) -> int:
+        """Create every client and wait for its channel to connect; returns clients ready"""
+        import grpc
+
+        ready = 0
+        for _ in range(self.size):
+            index, client = self.get()
+            try:
+                grpc.channel_ready_future(client.transport.grpc_channel).result(timeout=timeout)
+                ready += 1
+            except Exception as e:
+                logger.warning(f"Speech client {index} did not connect during warm-up: {e}")
+        logger.info(f"Speech client pool warmed: {ready}/{self.size} channels ready")
+        return ready
+
+    def stats(self):
+        counters = metrics.snapshot()["counters"]
+        return {
+            "pool_size": self.size,
+            "clients_open": sum(1 for client in self._clients if client is not None),
+            "clients_created": counters.get("speech.client.created", 0),
+            "client_reuses": counters.get("speech.client.reused", 0),
+            "reconnects": counters.get("speech.client.reconnects", 0),
+        }
+
+
+# Shared by request handlers and transcription workers
+speech_clients = SpeechClientPool()
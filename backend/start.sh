@@ -7,6 +7,11 @@ pip install psycopg2-binary
 PORT="${PORT:-8080}"
 echo "Application will listen on port $PORT"
 
+# Worker processes (uvicorn reads WEB_CONCURRENCY as its default --workers).
+# The database connection budget in database.py is split between them.
+export WEB_CONCURRENCY="${WEB_CONCURRENCY:-1}"
+echo "Starting $WEB_CONCURRENCY worker(s)"
+
 echo "Testing database connection..."
 python << END
 import os
@@ -14,7 +19,13 @@ import sys
 import time
 import psycopg2
 
+database_url = os.getenv("DATABASE_URL", "")
+if database_url and not database_url.startswith("postgres"):
+    print("DATABASE_URL is not PostgreSQL, skipping the connection test")
+    sys.exit(0)
+
 # Get database connection details
+db_sslmode = os.getenv("DB_SSLMODE", "require")
 db_user = os.getenv("DB_USER", "doadmin")
 db_password = os.getenv("DB_PASSWORD", "")
 db_host = os.getenv("DB_HOST", "localhost")
@@ -31,7 +42,8 @@ while attempt < max_attempts:
     attempt += 1
     try:
         # For DigitalOcean, this connection string format often works better
-        conn_string = f"host={db_host} port={db_port} dbname={db_name} user={db_user} password={db_password} sslmode=require"
+        conn_string = database_url.replace("postgresql+psycopg2://", "postgresql://") or \
+            f"host={db_host} port={db_port} dbname={db_name} user={db_user} password={db_password} sslmode={db_sslmode}"
         
         print(f"Attempt {attempt}: Connecting with conn_string...")
         conn = psycopg2.connect(conn_string)
@@ -65,5 +77,14 @@ python -c "from database import Base, engine; from models import *; Base.metadat
 echo "Running database migrations..."
 python -c "from db_migration import migrate_database; from database import engine; migrate_database(engine)" || true
 
+# Initialization and migrations ran once above, the workers skip them
+export DB_INIT_ON_STARTUP=0
+
+if [ "$WEB_CONCURRENCY" -gt 1 ]; then
+    # One process keeps the shared questionnaire and tally snapshots fresh for all workers
+    echo "Starting the shared cache refresher..."
+    python cache_refresher.py &
+fi
+
 echo "Starting the application on port $PORT..."
-exec uvicorn main:app --host 0.0.0.0 --port $PORT
\ No newline at end of file
+exec uvicorn main:app --host 0.0.0.0 --port $PORT --workers "$WEB_CONCURRENCY"
\ No newline at end of file
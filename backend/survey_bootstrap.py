@@ -0,0 +1,151 @@
+# survey_bootstrap.py - Single round-trip survey start for respondents
+import asyncio
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+
+import auth_crud
+import questionnaire_cache
+from auth_security import get_token_from_request, verify_token
+from database import SessionLocal
+from responses import ThaiJSONResponse
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+router = APIRouter(
+    prefix="/api/survey",
+    tags=["survey"],
+    responses={401: {"description": "Unauthorized"}},
+)
+
+# Provinces treated as Bangkok for the D1 screening logic (mirrors the frontend)
+BANGKOK_AREA_PROVINCES = {
+    "Bangkok", "Nakhon Pathom", "Pathum Thani", "Nonthaburi", "Samut Prakan", "Samut Sakhon"
+}
+
+# Purchases older than this make the respondent a lapser
+LAPSER_AFTER_YEARS = 2
+
+THAI_MONTHS = [
+    "มกราคม", "กุมภาพันธ์", "มีนาคม", "เมษายน", "พฤษภาคม", "มิถุนายน",
+    "กรกฎาคม", "สิงหาคม", "กันยายน", "ตุลาคม", "พฤศจิกายน", "ธันวาคม",
+]
+
+
+def format_thai_date(value: datetime) -> str:
+    """Format like toLocaleDateString('th-TH', long month): Buddhist era year"""
+    return f"{value.day} {THAI_MONTHS[value.month - 1]} {value.year + 543}"
+
+
+def get_user_status(latest_purchase: Optional[Dict], now: Optional[datetime] = None) -> str:
+    if not latest_purchase or not latest_purchase.get("purchase_date"):
+        return "No Purchase"
+    now = now or datetime.now()
+    try:
+        cutoff = now.replace(year=now.year - LAPSER_AFTER_YEARS)
+    except ValueError:
+        # 29 February
+        cutoff = now.replace(year=now.year - LAPSER_AFTER_YEARS, day=28)
+    return "User" if latest_purchase["purchase_date"] >= cutoff else "Lapser"
+
+
+def apply_prefill_piping(questions: List[Dict], survey_data: Dict) -> List[Dict]:
+    """
+    Apply the piping that only depends on customer prefill data. Answer-dependent
+    piping still happens on the client as answers come in. Only the questions
+    that change are copied, the rest are shared with the questionnaire cache.
+    Piped questions are flagged prefillPiped so the client doesn't pipe them again.
+    """
+    purchase = survey_data.get("latest_purchase")
+    if not purchase:
+        return questions
+
+    formatted_date = format_thai_date(purchase["purchase_date"])
+    piped = []
+    for question in questions:
+        if question["id"] == "P9a":
+            question = dict(question, prefillPiped=True)
+            question["questionText"] = question["questionText"].replace(
+                "most recent purchase",
+                f"purchase of {purchase['product_type']} on {formatted_date}"
+            )
+            if question.get("questionSubtext") and purchase["brand"] == "Mc Jeans":
+                question["questionSubtext"] = question["questionSubtext"].replace(
+                    "ร้านแม๊ค ยีนส์ ครั้งล่าสุด",
+                    f"ร้านแม๊ค ยีนส์ ครั้งล่าสุดเมื่อ {formatted_date}"
+                )
+        piped.append(question)
+    return piped
+
+
+def _run_query(func, *args):
+    """Run one lookup on its own session so lookups can proceed concurrently"""
+    db = SessionLocal()
+    try:
+        return func(db, *args)
+    finally:
+        db.close()
+
+
+@router.get("/bootstrap")
+async def survey_bootstrap(token: Optional[str] = Depends(get_token_from_request)):
+    """
+    Everything the survey needs to start in one response: the principal, the
+    customer prefill data and the questionnaire with prefill piping applied
+    """
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    if not token:
+        raise credentials_exception
+    token_data = verify_token(token, credentials_exception)
+
+    customer_id = token_data.customer_id
+    if customer_id:
+        auth_cred, customer, latest_purchase, (version, questions) = await asyncio.gather(
+            run_in_threadpool(_run_query, auth_crud.get_auth_credential, token_data.username),
+            run_in_threadpool(_run_query, auth_crud.get_customer_by_id, customer_id),
+            run_in_threadpool(_run_query, auth_crud.get_latest_purchase, customer_id),
+            run_in_threadpool(_run_query, questionnaire_cache.get_questions),
+        )
+    else:
+        # Older tokens carry only the username
+        auth_cred, (version, questions) = await asyncio.gather(
+            run_in_threadpool(_run_query, auth_crud.get_auth_credential, token_data.username),
+            run_in_threadpool(_run_query, questionnaire_cache.get_questions),
+        )
+        customer_id = auth_cred.customer_id if auth_cred else None
+        customer, latest_purchase = await asyncio.gather(
+            run_in_threadpool(_run_query, auth_crud.get_customer_by_id, customer_id),
+            run_in_threadpool(_run_query, auth_crud.get_latest_purchase, customer_id),
+        )
+
+    if auth_cred is None or customer is None or auth_cred.customer_id != customer.customer_id:
+        raise credentials_exception
+    if auth_cred.active is False:
+        raise credentials_exception
+
+    survey_data = auth_crud.build_customer_survey_data(customer, auth_cred, latest_purchase)
+    user_status = get_user_status(survey_data["latest_purchase"])
+
+    # ThaiJSONResponse encodes the datetimes in survey_data itself
+    return ThaiJSONResponse(content={
+        "principal": {
+            "username": auth_cred.username,
+            "customer_id": customer.customer_id,
+            "role": auth_cred.role or "user",
+        },
+        "customer": survey_data,
+        "survey_context": {
+            "user_status": user_status,
+            "is_bangkok_area": customer.province in BANGKOK_AREA_PROVINCES,
+        },
+        "questionnaire_version": version,
+        "questions": apply_prefill_piping(questions, survey_data),
+    })
@@ -0,0 +1,125 @@
+# transcription_cache.py - Transcripts keyed by audio content, language and recognition config
+import hashlib
+import os
+import threading
+import logging
+from collections import OrderedDict
+from typing import Dict, Optional
+
+import metrics
+from recognition import recognition_fingerprint
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Entries kept in memory, least recently used evicted first
+TRANSCRIPTION_CACHE_SIZE = int(os.getenv("TRANSCRIPTION_CACHE_SIZE", "2048"))
+# Also keep transcripts in the transcription_cache table so they survive restarts
+# and are shared between processes
+TRANSCRIPTION_CACHE_PERSIST = os.getenv("TRANSCRIPTION_CACHE_PERSIST", "false").lower() in ("1", "true", "yes")
+
+
+def cache_key(content: bytes, language: str) -> str:
+    return f"{hashlib.sha256(content).hexdigest()}:{language}:{recognition_fingerprint()}"
+
+
+class TranscriptionCache:
+    """
+    Thread-safe LRU of finished transcriptions with an optional database tier.
+    Values are {"language", "transcript", "segments"} dicts; only real
+    recognitions are stored, never demo fallbacks.
+    """
+
+    def __init__(self, max_entries: int = TRANSCRIPTION_CACHE_SIZE, persist: bool = TRANSCRIPTION_CACHE_PERSIST):
+        self.max_entries = max(1, max_entries)
+        self.persist = persist
+        self._entries: "OrderedDict[str, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _remember(self, key: str, value: Dict):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                metrics.increment("transcription.cache.evictions")
+
+    def get(self, key: str, count_miss: bool = True) -> Optional[Dict]:
+        """
+        Cached value for key; blocks on the database when persistence is on.
+        Pre-checks that fall through to a worker which looks again pass
+        count_miss=False so each request is counted once.
+        """
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+
+        if value is None and self.persist:
+            value = self._load(key)
+            if value is not None:
+                self._remember(key, value)
+
+        if value is not None:
+            metrics.increment("transcription.cache.hits")
+        elif count_miss:
+            metrics.increment("transcription.cache.misses")
+        return value
+
+    def put(self, key: str, language: str, transcript: str, segments=None):
+        value = {"language": language, "transcript": transcript, "segments": segments or []}
+        self._remember(key, value)
+        if self.persist:
+            self._store(key, value)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _load(self, key: str) -> Optional[Dict]:
+        from database import SessionLocal
+        from models import TranscriptionCacheEntry
+
+        db = SessionLocal()
+        try:
+            entry = db.get(TranscriptionCacheEntry, key)
+            if entry is None:
+                return None
+            return {"language": entry.language, "transcript": entry.transcript, "segments": entry.segments or []}
+        except Exception as e:
+            logger.warning(f"Transcription cache lookup failed: {e}")
+            return None
+        finally:
+            db.close()
+
+    def _store(self, key: str, value: Dict):
+        from database import SessionLocal
+        from models import TranscriptionCacheEntry
+
+        db = SessionLocal()
+        try:
+            db.merge(TranscriptionCacheEntry(cache_key=key, **value))
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.warning(f"Could not persist cached transcription: {e}")
+        finally:
+            db.close()
+
+    def stats(self) -> Dict:
+        counters = metrics.snapshot()["counters"]
+        hits = counters.get("transcription.cache.hits", 0)
+        misses = counters.get("transcription.cache.misses", 0)
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "persistent": self.persist,
+            "hits": hits,
+            "misses": misses,
+            "evictions": counters.get("transcription.cache.evictions", 0),
+            "hit_ratio": round(hits / (hits + misses), 4) if hits + misses else None,
+        }
+
+
+# Shared by the transcription endpoints and workers
+transcription_cache = TranscriptionCache()
@@ -0,0 +1,289 @@
+# transcription_jobs.py - Bounded job queue and worker pool for transcription
+#
+# Jobs run in the worker process that accepted them. With several workers a
+# status poll can land on any of them, so job statuses are also published to
+# a store they all share (TRANSCRIPTION_JOB_BACKEND):
+#
+#   memory  statuses stay in the accepting process (default, single worker)
+#   redis   statuses are mirrored to REDIS_URL (default with WEB_CONCURRENCY > 1)
+import asyncio
+import os
+import time
+import uuid
+import logging
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, Optional
+
+from fastapi.encoders import jsonable_encoder
+
+import metrics
+from responses import dumps, loads
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Number of clips converted and recognised at the same time
+TRANSCRIPTION_CONCURRENCY = int(os.getenv("TRANSCRIPTION_CONCURRENCY", "4"))
+# Jobs waiting beyond this are refused with 503 instead of piling up
+TRANSCRIPTION_QUEUE_SIZE = int(os.getenv("TRANSCRIPTION_QUEUE_SIZE", "64"))
+# Finished jobs stay pollable for this long
+JOB_RETENTION_SECONDS = float(os.getenv("TRANSCRIPTION_JOB_RETENTION", "600"))
+MAX_RETAINED_JOBS = int(os.getenv("TRANSCRIPTION_MAX_RETAINED_JOBS", "5000"))
+
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+TRANSCRIPTION_JOB_BACKEND = (os.getenv("TRANSCRIPTION_JOB_BACKEND") or ("redis" if WEB_CONCURRENCY > 1 else "memory")).lower()
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+# How often a worker re-reads a status another worker is running the job for
+SHARED_POLL_SECONDS = float(os.getenv("TRANSCRIPTION_SHARED_POLL_SECONDS", "0.5"))
+
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+
+
+class QueueFullError(Exception):
+    """Raised by submit() when the queue is at capacity"""
+
+    def __init__(self, message: str, retry_after: int = 5):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TranscriptionJob:
+    def __init__(self, content: bytes, language: str):
+        self.id = f"job_{uuid.uuid4().hex[:12]}"
+        self.content = content
+        self.language = language
+        self.status = QUEUED
+        self.result = None
+        self.error: Optional[str] = None
+        self.created_at = datetime.utcnow()
+        self.finished_at: Optional[datetime] = None
+        self.enqueued = time.perf_counter()
+        self.finished_monotonic: Optional[float] = None
+        self.done = asyncio.Event()
+
+    def status_payload(self) -> Dict:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "language": self.language,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+class RedisJobStatusStore:
+    """Job status payloads in Redis, kept for the job retention period"""
+
+    def __init__(self, url: str = REDIS_URL, ttl: float = JOB_RETENTION_SECONDS):
+        # Imported lazily so single-worker deployments work without redis installed
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+        self.ttl = int(ttl)
+
+    @staticmethod
+    def _key(job_id: str) -> str:
+        return f"transcription:job:{job_id}"
+
+    def publish(self, payload: Dict):
+        self.client.set(self._key(payload["job_id"]), dumps(jsonable_encoder(payload)), ex=self.ttl)
+
+    def fetch(self, job_id: str) -> Optional[Dict]:
+        value = self.client.get(self._key(job_id))
+        return loads(value) if value is not None else None
+
+
+def create_status_store() -> Optional[RedisJobStatusStore]:
+    """The shared status store, None when statuses stay in this process"""
+    if TRANSCRIPTION_JOB_BACKEND == "memory":
+        if WEB_CONCURRENCY > 1:
+            # A poll on another worker would never find the job
+            raise RuntimeError(
+                f"TRANSCRIPTION_JOB_BACKEND=memory can't serve {WEB_CONCURRENCY} workers; use redis"
+            )
+        return None
+    if TRANSCRIPTION_JOB_BACKEND == "redis":
+        return RedisJobStatusStore()
+    raise RuntimeError(f"Unknown TRANSCRIPTION_JOB_BACKEND '{TRANSCRIPTION_JOB_BACKEND}', expected memory or redis")
+
+
+class TranscriptionQueue:
+    """
+    asyncio queue in front of a thread pool. Requests only enqueue and await;
+    ffmpeg and the blocking Speech client run on the pool's threads, so a slow
+    clip occupies one worker instead of the event loop.
+    """
+
+    def __init__(
+        self,
+        handler: Callable,
+        concurrency: int = TRANSCRIPTION_CONCURRENCY,
+        max_queue: int = TRANSCRIPTION_QUEUE_SIZE,
+    ):
+        # handler(content, language, job_id) -> result, blocking
+        self.handler = handler
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self.jobs: "OrderedDict[str, TranscriptionJob]" = OrderedDict()
+        self._queue: Optional[asyncio.Queue] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._workers = []
+        self._busy = 0
+        self.status_store: Optional[RedisJobStatusStore] = None
+        # One thread, so a job's status writes reach the store in order
+        self._publisher: Optional[ThreadPoolExecutor] = None
+
+    @property
+    def running(self) -> bool:
+        return self._queue is not None
+
+    async def start(self):
+        if self.running:
+            return
+        self.status_store = create_status_store()
+        if self.status_store is not None:
+            self._publisher = ThreadPoolExecutor(max_workers=1, thread_name_prefix="job-status")
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="transcribe")
+        self._workers = [asyncio.create_task(self._worker(i)) for i in range(self.concurrency)]
+        logger.info(f"Transcription queue started: {self.concurrency} workers, capacity {self.max_queue}")
+
+    async def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        if self._executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        if self._publisher:
+            self._publisher.shutdown(wait=True)
+        self._executor = None
+        self._publisher = None
+        self._queue = None
+
+    def _publish(self, job: TranscriptionJob):
+        """Mirror the job's current status to the shared store, without blocking the loop"""
+        if self._publisher is None:
+            return
+        payload = job.status_payload()
+
+        def publish():
+            try:
+                self.status_store.publish(payload)
+            except Exception as e:
+                metrics.increment("transcription.jobs.publish_errors")
+                logger.error(f"Could not publish status of job {payload['job_id']}: {e}")
+
+        self._publisher.submit(publish)
+
+    def _update_depth(self):
+        metrics.set_gauge("transcription.queue.depth", self._queue.qsize() if self._queue else 0)
+
+    def _prune(self):
+        now = time.perf_counter()
+        while self.jobs:
+            job_id, job = next(iter(self.jobs.items()))
+            expired = job.finished_monotonic is not None and now - job.finished_monotonic > JOB_RETENTION_SECONDS
+            if not expired and len(self.jobs) <= MAX_RETAINED_JOBS:
+                break
+            if job.finished_monotonic is None:
+                # Never drop unfinished jobs, even over the retention cap
+                break
+            self.jobs.pop(job_id)
+
+    def submit(self, content: bytes, language: str) -> TranscriptionJob:
+        """Enqueue a clip, raising QueueFullError when at capacity (backpressure)"""
+        if not self.running:
+            raise RuntimeError("Transcription queue is not running")
+        self._prune()
+
+        job = TranscriptionJob(content, language)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            metrics.increment("transcription.queue.rejected")
+            raise QueueFullError(f"Transcription queue is full ({self.max_queue} jobs waiting)")
+
+        self.jobs[job.id] = job
+        metrics.increment("transcription.jobs.submitted")
+        self._update_depth()
+        self._publish(job)
+        return job
+
+    def get(self, job_id: str) -> Optional[TranscriptionJob]:
+        return self.jobs.get(job_id)
+
+    async def lookup(self, job_id: str, wait: float = 0) -> Optional[Dict]:
+        """
+        Status payload of a job accepted by this worker or, through the shared
+        store, by another one; None if neither knows it. With wait > 0, waits
+        up to that long for the job to finish.
+        """
+        job = self.get(job_id)
+        if job is not None:
+            if wait > 0:
+                await self.wait(job, timeout=wait)
+            return job.status_payload()
+        if self.status_store is None:
+            return None
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + wait
+        while True:
+            payload = await loop.run_in_executor(None, self.status_store.fetch, job_id)
+            remaining = deadline - loop.time()
+            if payload is None or payload["status"] in (COMPLETED, FAILED) or remaining <= 0:
+                return payload
+            await asyncio.sleep(min(SHARED_POLL_SECONDS, remaining))
+
+    async def wait(self, job: TranscriptionJob, timeout: Optional[float] = None) -> bool:
+        """Wait for a job to finish, True if it did within the timeout"""
+        try:
+            await asyncio.wait_for(job.done.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return job.done.is_set()
+
+    async def _worker(self, index: int):
+        loop = asyncio.get_running_loop()
+        while True:
+            job = await self._queue.get()
+            self._update_depth()
+            metrics.observe("transcription.stage.queue_wait.seconds", time.perf_counter() - job.enqueued)
+            self._busy += 1
+            metrics.set_gauge("transcription.workers.busy", self._busy)
+            job.status = RUNNING
+            self._publish(job)
+            started = time.perf_counter()
+            try:
+                job.result = await loop.run_in_executor(
+                    self._executor, self.handler, job.content, job.language, job.id
+                )
+                job.status = COMPLETED
+                metrics.increment("transcription.jobs.completed")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Transcription job {job.id} failed: {e}")
+                job.status = FAILED
+                job.error = str(e)
+                metrics.increment("transcription.jobs.failed")
+            finally:
+                self._busy -= 1
+                metrics.set_gauge("transcription.workers.busy", self._busy)
+                metrics.observe("transcription.stage.process.seconds", time.perf_counter() - started)
+                metrics.observe("transcription.job.seconds", time.perf_counter() - job.enqueued)
+                # Release the audio as soon as the job is done
+                job.content = None
+                job.finished_at = datetime.utcnow()
+                job.finished_monotonic = time.perf_counter()
+                job.done.set()
+                self._publish(job)
+                self._queue.task_done()
@@ -11,7 +11,7 @@ import './components/AttributeBrandMatcher.css';
 import './App.css';
 
 function App() {
-  const { isAuthenticated, getSurveyData, loading: authLoading } = useAuth();
+  const { isAuthenticated, currentUser, getSurveyData, loading: authLoading } = useAuth();
   const [p11StatementsCompleted, setP11StatementsCompleted] = useState(false);
   const [questions, setQuestions] = useState([]);
   const [originalQuestions, setOriginalQuestions] = useState([]);
@@ -23,6 +23,9 @@ function App() {
   const [error, setError] = useState(null);
   const [loading, setLoading] = useState(true);
   const p11VisitedRef = useRef(false);
+  const draftIdRef = useRef(null);
+  const savedDraftRef = useRef({ answers: {}, audio: {} });
+  const draftSaveRef = useRef(Promise.resolve());
 
   const debugQuestionFlow = () => {
     if (!questions.length) return;
@@ -127,7 +130,9 @@ function App() {
         }
         });
         
-        setAnswers(initialAnswers);
+        // Pick up where a dropped session left off
+        const restoredAnswers = await restoreDraft(data);
+        setAnswers({ ...initialAnswers, ...restoredAnswers });
         
         // Initialize active questions - only the first question is active at start
         if (data.length > 0) {
@@ -383,9 +388,10 @@ function App() {
           day: 'numeric'
         });
         
-        // Find and update the P9a question text
+        // Find and update the P9a question text, unless the bootstrap
+        // response already did (prefillPiped)
         const p9aIndex = questionsToProcess.findIndex(q => q.id === 'P9a');
-        if (p9aIndex !== -1) {
+        if (p9aIndex !== -1 && !questionsToProcess[p9aIndex].prefillPiped) {
           // Replace placeholders in question text
           const originalText = questionsToProcess[p9aIndex].questionText;
           const originalSubtext = questionsToProcess[p9aIndex].questionSubtext;
@@ -549,6 +555,7 @@ function App() {
     
     // If we have a next question, go to it
     if (nextIndex > currentQuestionIndex) {
+      saveDraft();
       setCurrentQuestionIndex(nextIndex);
     } else {
       // If at the end of all questions, submit
@@ -561,82 +568,231 @@ function App() {
     setCurrentQuestionIndex(prevIndex);
   };
 
-  const handleSubmit = async () => {
-    try {
-      setIsSubmitting(true);
+  // Answers in the form the backend stores: option labels instead of values,
+  // P11 combined into one string and recordings listed separately
+  const buildSubmission = () => {
+    // Create a copy of the answers with values converted to labels
+    const labelAnswers = {};
+    
+    // Create a separate object to store audio URLs that won't be sent directly
+    const audioURLsCollection = {};
+    
+    // Process each answer to convert values to labels
+    for (const questionId in answers) {
+      // Skip audio URLs, we'll handle them separately
+      if (questionId.endsWith('_audio')) {
+        // Store them in a separate collection but don't include in labelAnswers
+        const relatedQuestionId = questionId.replace('_audio', '');
+        audioURLsCollection[relatedQuestionId] = answers[questionId];
+        continue;
+      }
       
-      // Create a copy of the answers with values converted to labels
-      const labelAnswers = {};
+      // Skip P11 for now, we'll handle it specially
+      if (questionId === 'P11') continue;
+  
+      const question = questions.find(q => q.id === questionId);
+      if (!question) {
+        labelAnswers[questionId] = answers[questionId];
+        continue;
+      }
       
-      // Create a separate object to store audio URLs that won't be sent directly
-      const audioURLsCollection = {};
+      // For multiple-choice questions
+      if (question.questionType === 'MA' && Array.isArray(answers[questionId])) {
+        const answerLabels = answers[questionId].map(value => {
+          // Find the matching option to get its label
+          const option = question.options?.find(opt => String(opt.value) === String(value));
+          return option ? option.label : value;
+        });
+        labelAnswers[questionId] = answerLabels;
+      }
+      // For single-choice questions
+      else if (question.questionType === 'SA' && question.options) {
+        const value = answers[questionId];
+        const option = question.options.find(opt => String(opt.value) === String(value));
+        labelAnswers[questionId] = option ? option.label : value;
+      }
+      // For open-ended questions or any other type
+      else {
+        labelAnswers[questionId] = answers[questionId];
+      }
+    }
+    
+    // Special handling for P11 - combine all attributes into a single JSON string
+    if (answers.P11) {
+      // Create a string representation of the P11 data
+      // Format: "a:1,5,6|b:3,1|c:6,3" etc.
+      const p11Parts = [];
       
-      // Process each answer to convert values to labels
-      for (const questionId in answers) {
-        // Skip audio URLs, we'll handle them separately
-        if (questionId.endsWith('_audio')) {
-          // Store them in a separate collection but don't include in labelAnswers
-          const relatedQuestionId = questionId.replace('_audio', '');
-          audioURLsCollection[relatedQuestionId] = answers[questionId];
-          continue;
+      Object.keys(answers.P11).forEach(attrKey => {
+        const brandValues = answers.P11[attrKey];
+        if (Array.isArray(brandValues) && brandValues.length > 0) {
+          p11Parts.push(`${attrKey}:${brandValues.join(',')}`);
         }
-        
-        // Skip P11 for now, we'll handle it specially
-        if (questionId === 'P11') continue;
+      });
+      
+      // Join all parts with a separator
+      const p11Combined = p11Parts.join('|');
+      
+      // Add to labelAnswers as a single P11 answer
+      labelAnswers['P11'] = p11Combined;
+    }
     
-        const question = questions.find(q => q.id === questionId);
-        if (!question) {
-          labelAnswers[questionId] = answers[questionId];
-          continue;
-        }
-        
-        // For multiple-choice questions
-        if (question.questionType === 'MA' && Array.isArray(answers[questionId])) {
-          const answerLabels = answers[questionId].map(value => {
-            // Find the matching option to get its label
-            const option = question.options?.find(opt => String(opt.value) === String(value));
-            return option ? option.label : value;
-          });
-          labelAnswers[questionId] = answerLabels;
-        }
-        // For single-choice questions
-        else if (question.questionType === 'SA' && question.options) {
-          const value = answers[questionId];
-          const option = question.options.find(opt => String(opt.value) === String(value));
-          labelAnswers[questionId] = option ? option.label : value;
+    console.log('Original answers:', answers);
+    console.log('Label answers for submission:', labelAnswers);
+    console.log('Audio URLs:', audioURLsCollection);
+    
+    // Recordings go alongside the answers so the backend can store their
+    // storage keys and transcripts in structured columns
+    const audioAnswers = {};
+    Object.keys(audioURLsCollection).forEach(questionId => {
+      audioAnswers[questionId] = {
+        url: audioURLsCollection[questionId],
+        transcript: typeof answers[questionId] === 'string' ? answers[questionId] : null
+      };
+    });
+
+    return { labelAnswers, audioAnswers };
+  };
+
+  // Autosave: answers are saved to a server-side draft as the respondent moves
+  // on, so a dropped session keeps its progress and the final submit is small.
+  // Empty answers are saved too, so a promoted draft stores the same rows as
+  // a direct /api/submit.
+
+  // What differs from the last saved draft; null removes an answer
+  const draftChanges = (labelAnswers, audioAnswers) => {
+    const diff = (current, saved) => {
+      const changes = {};
+      Object.keys(current).forEach(key => {
+        if (JSON.stringify(current[key]) !== JSON.stringify(saved[key])) {
+          changes[key] = current[key] ?? null;
         }
-        // For open-ended questions or any other type
-        else {
-          labelAnswers[questionId] = answers[questionId];
+      });
+      Object.keys(saved).forEach(key => {
+        if (!(key in current)) {
+          changes[key] = null;
         }
+      });
+      return changes;
+    };
+    return {
+      answers: diff(labelAnswers, savedDraftRef.current.answers),
+      audio: diff(audioAnswers, savedDraftRef.current.audio)
+    };
+  };
+
+  // The draft id survives reloads, kept per respondent
+  const draftStorageKey = () => `survey_draft_${currentUser?.customer_id || 'anonymous'}`;
+
+  // Saved draft answers turned back into the form the survey keeps them in:
+  // option values instead of labels, P11 per attribute, recordings under
+  // <question id>_audio
+  const restoreDraft = async (questionList) => {
+    const draftId = localStorage.getItem(draftStorageKey());
+    if (!draftId) return {};
+
+    let draft;
+    try {
+      draft = await questionService.getDraft(draftId);
+    } catch (err) {
+      if (err.response?.status === 404) {
+        localStorage.removeItem(draftStorageKey());
       }
-      
-      // Special handling for P11 - combine all attributes into a single JSON string
-      if (answers.P11) {
-        // Create a string representation of the P11 data
-        // Format: "a:1,5,6|b:3,1|c:6,3" etc.
-        const p11Parts = [];
-        
-        Object.keys(answers.P11).forEach(attrKey => {
-          const brandValues = answers.P11[attrKey];
-          if (Array.isArray(brandValues) && brandValues.length > 0) {
-            p11Parts.push(`${attrKey}:${brandValues.join(',')}`);
-          }
+      console.error('Error loading draft:', err);
+      return {};
+    }
+
+    const toValue = (question, label) => {
+      const option = question?.options?.find(opt => String(opt.label) === String(label));
+      return option ? option.value : label;
+    };
+
+    const restored = {};
+    Object.entries(draft.answers).forEach(([questionId, answer]) => {
+      const question = questionList.find(q => q.id === questionId);
+      if (questionId === 'P11') {
+        // "a:1,5|b:3" back to { a: ['1', '5'], b: ['3'] }
+        if (typeof answer !== 'string' || !answer) return;
+        const p11 = {};
+        answer.split('|').forEach(part => {
+          const [attrKey, brandValues] = part.split(':');
+          p11[attrKey] = brandValues ? brandValues.split(',') : [];
         });
-        
-        // Join all parts with a separator
-        const p11Combined = p11Parts.join('|');
-        
-        // Add to labelAnswers as a single P11 answer
-        labelAnswers['P11'] = p11Combined;
+        restored.P11 = p11;
+      } else if (question?.questionType === 'MA' && Array.isArray(answer)) {
+        restored[questionId] = answer.map(label => toValue(question, label));
+      } else if (question?.questionType === 'SA' && question.options) {
+        restored[questionId] = toValue(question, answer);
+      } else {
+        restored[questionId] = answer;
+      }
+    });
+
+    const savedAudio = {};
+    Object.entries(draft.audio).forEach(([questionId, recording]) => {
+      if (!recording?.url) return;
+      restored[`${questionId}_audio`] = recording.url;
+      savedAudio[questionId] = { url: recording.url, transcript: recording.transcript };
+    });
+
+    console.log(`Restored draft ${draftId}:`, restored);
+    draftIdRef.current = draftId;
+    savedDraftRef.current = { answers: draft.answers, audio: savedAudio };
+    return restored;
+  };
+
+  const saveDraft = () => {
+    // Saves run one after another so the draft is only created once
+    draftSaveRef.current = draftSaveRef.current.then(async () => {
+      const { labelAnswers, audioAnswers } = buildSubmission();
+      const changes = draftChanges(labelAnswers, audioAnswers);
+      if (!Object.keys(changes.answers).length && !Object.keys(changes.audio).length) return;
+      try {
+        if (!draftIdRef.current) {
+          draftIdRef.current = (await questionService.createDraft()).draft_id;
+          localStorage.setItem(draftStorageKey(), draftIdRef.current);
+        }
+        await questionService.saveDraft(draftIdRef.current, changes.answers, changes.audio);
+        savedDraftRef.current = { answers: labelAnswers, audio: audioAnswers };
+      } catch (err) {
+        if (err.response?.status === 404) {
+          // Draft expired, the next save starts a new one with everything
+          resetDraft();
+        }
+        console.error('Error saving draft:', err);
       }
+    });
+    return draftSaveRef.current;
+  };
+
+  const resetDraft = () => {
+    draftIdRef.current = null;
+    savedDraftRef.current = { answers: {}, audio: {} };
+    localStorage.removeItem(draftStorageKey());
+  };
+
+  const handleSubmit = async () => {
+    try {
+      setIsSubmitting(true);
       
-      console.log('Original answers:', answers);
-      console.log('Label answers for submission:', labelAnswers);
-      console.log('Audio URLs (for reference only):', audioURLsCollection);
+      // Let a save that is still in flight finish first
+      await draftSaveRef.current;
+      const { labelAnswers, audioAnswers } = buildSubmission();
       
-      // Submit only the labelAnswers, not including the audioURLs as a separate question
-      await questionService.submitSurvey(labelAnswers);
+      if (draftIdRef.current) {
+        // Only what changed since the last autosave goes with the submit
+        const changes = draftChanges(labelAnswers, audioAnswers);
+        try {
+          await questionService.submitDraft(draftIdRef.current, changes.answers, changes.audio);
+        } catch (draftError) {
+          if (draftError.response?.status !== 404) throw draftError;
+          // Draft expired, send everything in one go instead
+          await questionService.submitSurvey(labelAnswers, audioAnswers);
+        }
+        resetDraft();
+      } else {
+        await questionService.submitSurvey(labelAnswers, audioAnswers);
+      }
       
       setIsCompleted(true);
     } catch (err) {
@@ -661,6 +817,7 @@ function App() {
     // Reset active questions to only the first question
     setActiveQuestionIndices([0]);
     
+    resetDraft();
     setIsCompleted(false);
   };
   
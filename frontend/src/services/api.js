@@ -75,6 +75,17 @@ const surveyAPI = {
     }
   },
   
+  // Principal, prefill data and piped questions in a single round trip
+  bootstrap: async () => {
+    try {
+      const response = await apiClient.get('/api/survey/bootstrap');
+      return response.data;
+    } catch (error) {
+      console.error('Error bootstrapping survey:', error);
+      throw error;
+    }
+  },
+  
   // Get all questions for the survey
   getQuestions: async () => {
     try {
@@ -87,9 +98,9 @@ const surveyAPI = {
   },
   
   // Submit survey responses
-  submitSurvey: async (answers) => {
+  submitSurvey: async (answers, audio = {}) => {
     try {
-      const response = await apiClient.post('/api/submit', { answers });
+      const response = await apiClient.post('/api/submit', { answers, audio });
       return response.data;
     } catch (error) {
       console.error('Error submitting survey:', error);
@@ -97,6 +108,32 @@ const surveyAPI = {
     }
   },
   
+  // Autosave: start a draft, save changed answers, then submit what's left
+  createDraft: async () => {
+    const response = await apiClient.post('/api/drafts');
+    return response.data;
+  },
+
+  saveDraft: async (draftId, answers, audio = {}) => {
+    const response = await apiClient.patch(`/api/drafts/${draftId}`, { answers, audio });
+    return response.data;
+  },
+
+  getDraft: async (draftId) => {
+    const response = await apiClient.get(`/api/drafts/${draftId}`);
+    return response.data;
+  },
+
+  submitDraft: async (draftId, answers = {}, audio = {}) => {
+    try {
+      const response = await apiClient.post(`/api/drafts/${draftId}/submit`, { answers, audio });
+      return response.data;
+    } catch (error) {
+      console.error('Error submitting draft:', error);
+      throw error;
+    }
+  },
+  
   // Unified transcription endpoint - this is the NEW main function for transcription
   transcribeAudio: async (audioBlob, language = 'th-TH') => {
     try {
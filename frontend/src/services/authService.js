@@ -5,6 +5,9 @@ import api from './api';
 let currentUserData = null;
 let isAuthenticated = false;
 
+// Questions preloaded by the bootstrap request, consumed by the first fetch
+let bootstrapQuestions = null;
+
 // Add event listener for auth events
 window.addEventListener('auth:logout', () => {
   authService.logout();
@@ -124,25 +127,32 @@ const authService = {
     return currentUserData;
   },
   
+  // Take the questions delivered with the bootstrap response (only once)
+  takeBootstrapQuestions: () => {
+    const questions = bootstrapQuestions;
+    bootstrapQuestions = null;
+    return questions;
+  },
+  
   // Initialize authentication on app load
   initAuth: async () => {
     try {
-      // Validate session first
-      const isValid = await authService.validateSession();
+      // One request validates the session and loads user data and questions
+      const data = await api.survey.bootstrap();
       
-      if (isValid) {
-        // If session is valid, fetch user data
-        await authService.fetchUserData();
-        
-        // Check if redirection is needed based on role
-        authService.redirectBasedOnRole();
-      }
+      currentUserData = { ...data.customer, role: data.principal.role };
+      bootstrapQuestions = data.questions;
+      isAuthenticated = true;
       
-      return isValid;
+      // Check if redirection is needed based on role
+      authService.redirectBasedOnRole();
+      
+      return true;
     } catch (error) {
       console.error('Auth initialization failed:', error);
       isAuthenticated = false;
       currentUserData = null;
+      bootstrapQuestions = null;
       return false;
     }
   }
@@ -1,5 +1,6 @@
 // src/services/questionService.js
 import api from './api';
+import authService from './authService';
 
 // Public API - ALWAYS uses the backend API
 const questionService = {
@@ -7,6 +8,10 @@ const questionService = {
   getQuestions: async () => {
     console.log("Fetching questions from backend API");
     try {
+      const preloaded = authService.takeBootstrapQuestions();
+      if (preloaded) {
+        return preloaded;
+      }
       return await api.survey.getQuestions();
     } catch (error) {
       console.error("Error fetching questions from API:", error);
@@ -70,16 +75,34 @@ const questionService = {
   },
   
   // Submit survey answers
-  submitSurvey: async (answers) => {
+  submitSurvey: async (answers, audio = {}) => {
     console.log("Submitting survey via backend API", answers);
     try {
-      return await api.survey.submitSurvey(answers);
+      return await api.survey.submitSurvey(answers, audio);
     } catch (error) {
       console.error("Error submitting survey:", error);
       throw error;
     }
   },
   
+  // Autosave drafts
+  createDraft: async () => {
+    return await api.survey.createDraft();
+  },
+
+  saveDraft: async (draftId, answers, audio = {}) => {
+    return await api.survey.saveDraft(draftId, answers, audio);
+  },
+
+  getDraft: async (draftId) => {
+    return await api.survey.getDraft(draftId);
+  },
+
+  submitDraft: async (draftId, answers = {}, audio = {}) => {
+    console.log("Submitting draft via backend API", draftId, answers);
+    return await api.survey.submitDraft(draftId, answers, audio);
+  },
+  
   // Get all survey responses
   getResponses: async () => {
     console.log("Fetching responses from backend API");